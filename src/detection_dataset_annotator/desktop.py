@@ -100,6 +100,33 @@ def create_desktop_menu(directory_name = "ResearchTools",
             f.write(desktop_entry)
         print(f"File {path} created.")
 
+def ensure_desktop_integration(program_name=None):
+    """
+    Cria os atalhos do menu (sem sobrescrever) só na primeira execução de
+    cada versão instalada: a versão fica anotada num arquivo em
+    ~/.config/<pacote>/, e as execuções seguintes não tocam em nada nem
+    rodam o update-desktop-database.
+    """
+    if program_name is None:
+        program_name = about.__program_name__
+    stamp_path = os.path.join("~",".config",about.__package__,f"{program_name}.desktop-version")
+    stamp_path = os.path.expanduser(stamp_path)
+    try:
+        with open(stamp_path, "r") as f:
+            if f.read().strip() == about.__version__:
+                return False
+    except OSError:
+        pass
+
+    create_desktop_directory()
+    create_desktop_menu()
+    create_desktop_file(os.path.join("~",".local","share","applications"), program_name=program_name)
+
+    os.makedirs(os.path.dirname(stamp_path), exist_ok=True)
+    with open(stamp_path, "w") as f:
+        f.write(about.__version__ + "\n")
+    return True
+
 if __name__ == '__main__':
     create_desktop_menu()
     create_desktop_directory()
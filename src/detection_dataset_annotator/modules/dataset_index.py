@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+import os
+import json
+
+from detection_dataset_annotator.modules.project_paths import project_cache_dir
+
+
+def scan_directory(root, rel=""):
+    """
+    Percorre `root` com os.scandir e retorna {caminho_relativo: (tamanho, mtime_ns)}
+    dos arquivos, e {caminho_relativo: mtime_ns} dos diretórios visitados.
+    """
+    files = {}
+    dirs = {}
+    stack = [rel]
+    while stack:
+        current = stack.pop()
+        path = os.path.join(root, current) if current else root
+        try:
+            dirs[current] = os.stat(path).st_mtime_ns
+            entries = list(os.scandir(path))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            name = os.path.join(current, entry.name) if current else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(name)
+            elif entry.is_file():
+                st = entry.stat()
+                files[name] = (st.st_size, st.st_mtime_ns)
+    return files, dirs
+
+
+class DatasetIndex:
+    """
+    Índice dos arquivos de images/ e labels/ do dataset.
+
+    É montado com uma varredura os.scandir e salvo em
+    <dataset>/.annotator/index.json junto com o mtime de cada diretório.
+    Em refresh() só os diretórios cujo mtime mudou são varridos de novo,
+    então consultas de existência não tocam o sistema de arquivos. Os
+    arquivos também ficam agrupados por diretório (montado na primeira
+    varredura parcial), para que cada diretório revarrido troque só o seu
+    grupo, sem percorrer o índice inteiro.
+    """
+    VERSION = 1
+
+    def __init__(self, dataset_path):
+        self.dataset_path = dataset_path
+        self.cache_path = os.path.join(project_cache_dir(dataset_path), "index.json")
+        self.images = {}
+        self.labels = {}
+        self._dirs = {"images": {}, "labels": {}}
+        self._by_dir = {"images": None, "labels": None}
+
+    def _buckets(self, part, files):
+        """
+        {diretório: conjunto de arquivos diretamente nele} de images/ ou labels/.
+        """
+        buckets = self._by_dir[part]
+        if buckets is None:
+            buckets = self._by_dir[part] = {}
+            for name in files:
+                buckets.setdefault(os.path.dirname(name), set()).add(name)
+        return buckets
+
+    @classmethod
+    def load(cls, dataset_path):
+        """
+        Carrega o índice salvo (se houver) e atualiza o que mudou.
+        """
+        index = cls(dataset_path)
+        if os.path.exists(index.cache_path):
+            try:
+                with open(index.cache_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == cls.VERSION:
+                    index.images = {k: tuple(v) for k, v in data["images"].items()}
+                    index.labels = {k: tuple(v) for k, v in data["labels"].items()}
+                    index._dirs = data["dirs"]
+            except (ValueError, KeyError):
+                pass
+        index.refresh()
+        return index
+
+    def refresh(self):
+        """
+        Revarre só os diretórios com mtime diferente do salvo, e os novos
+        subdiretórios encontrados neles. Retorna True se algo mudou.
+        """
+        changed = False
+        for part, files in (("images", self.images), ("labels", self.labels)):
+            root = os.path.join(self.dataset_path, part)
+            known = self._dirs[part]
+            if not known:
+                found, dirs = scan_directory(root)
+                files.clear()
+                files.update(found)
+                known.update(dirs)
+                self._by_dir[part] = None
+                changed = True
+                continue
+
+            stale = []
+            for rel, mtime in list(known.items()):
+                path = os.path.join(root, rel) if rel else root
+                try:
+                    current = os.stat(path).st_mtime_ns
+                except FileNotFoundError:
+                    current = None
+                if current != mtime:
+                    stale.append(rel)
+
+            buckets = self._buckets(part, files) if stale else None
+            for rel in stale:
+                changed = True
+                prefix = rel + os.sep if rel else ""
+                # arquivos diretamente neste diretório
+                for name in buckets.pop(rel, ()):
+                    files.pop(name, None)
+                known.pop(rel, None)
+                path = os.path.join(root, rel) if rel else root
+                if not os.path.isdir(path):
+                    for sub in [d for d in known if d.startswith(prefix)]:
+                        known.pop(sub)
+                        for name in buckets.pop(sub, ()):
+                            files.pop(name, None)
+                    continue
+                known[rel] = os.stat(path).st_mtime_ns
+                bucket = buckets[rel] = set()
+                for entry in os.scandir(path):
+                    name = prefix + entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if name not in known:
+                            found, dirs = scan_directory(root, name)
+                            files.update(found)
+                            known.update(dirs)
+                            for found_name in found:
+                                buckets.setdefault(os.path.dirname(found_name), set()).add(found_name)
+                    elif entry.is_file():
+                        st = entry.stat()
+                        files[name] = (st.st_size, st.st_mtime_ns)
+                        bucket.add(name)
+        if changed:
+            self.save()
+        return changed
+
+    def save(self):
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "images": self.images,
+                       "labels": self.labels, "dirs": self._dirs}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    @staticmethod
+    def label_name(img_name):
+        nome_base, _ = os.path.splitext(img_name)
+        return nome_base + ".txt"
+
+    def has_image(self, img_name):
+        return os.path.normpath(img_name) in self.images
+
+    def has_label(self, img_name):
+        return os.path.normpath(self.label_name(img_name)) in self.labels
+
+    def has_label_dir(self, img_name):
+        return os.path.dirname(os.path.normpath(self.label_name(img_name))) in self._dirs["labels"]
+
+    def image_stat(self, img_name):
+        return self.images.get(os.path.normpath(img_name))
+
+    def set_label(self, img_name):
+        """
+        Registra que o rótulo da imagem foi escrito pelo próprio programa.
+        Se a escrita ainda estiver na fila, o próximo refresh() corrige o stat.
+        """
+        path = os.path.join(self.dataset_path, "labels", self.label_name(img_name))
+        try:
+            st = os.stat(path)
+            stat = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            stat = (0, 0)
+        name = os.path.normpath(self.label_name(img_name))
+        self.labels[name] = stat
+        if self._by_dir["labels"] is not None:
+            self._by_dir["labels"].setdefault(os.path.dirname(name), set()).add(name)
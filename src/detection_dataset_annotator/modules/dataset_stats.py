@@ -0,0 +1,185 @@
+#!/usr/bin/python3
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from detection_dataset_annotator.modules.yolo_labels import read_yolo_files
+from detection_dataset_annotator.modules.dataset_index import DatasetIndex
+from detection_dataset_annotator.modules.dimension_index import load_dimensions
+from detection_dataset_annotator.modules.project_store import open_project_store
+
+SIZE_BINS = np.linspace(0.0, 1.0, 21)
+ASPECT_BINS = 2.0 ** np.arange(-5, 6)  # 1/32 ... 32
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# problemas que fazem o validate falhar (imagens sem rótulo são só informativas)
+FAILING_ISSUES = ("invalid_lines", "orphan_labels", "degenerate_boxes",
+                  "out_of_bounds_boxes", "duplicate_boxes")
+
+
+def xywh_to_xyxy(boxes):
+    cx, cy, w, h = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    return np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+
+def pairwise_iou(xyxy):
+    """
+    Matriz (N, N) de IoU entre as caixas (x1, y1, x2, y2), calculada de uma vez.
+    """
+    x1 = np.maximum(xyxy[:, None, 0], xyxy[None, :, 0])
+    y1 = np.maximum(xyxy[:, None, 1], xyxy[None, :, 1])
+    x2 = np.minimum(xyxy[:, None, 2], xyxy[None, :, 2])
+    y2 = np.minimum(xyxy[:, None, 3], xyxy[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+    union = area[:, None] + area[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def _stats_chunk(labels_dir, names, num_classes, dims, iou_threshold, min_box_pixels, tolerance):
+    """
+    Trabalho de um processo: lê e analisa um lote de arquivos de rótulo.
+    dims é {arquivo de rótulo: (largura, altura)} das imagens conhecidas.
+    """
+    labels = read_yolo_files(labels_dir, names, num_classes, max_workers=1)
+    boxes = labels.boxes.astype(np.float64)
+    xyxy = xywh_to_xyxy(boxes)
+
+    # tamanho em pixels quando as dimensões da imagem são conhecidas
+    counts = np.diff(labels.offsets)
+    wh = np.array([dims.get(name, (0, 0)) for name in names], dtype=np.float64).reshape(-1, 2)
+    box_wh = np.repeat(wh, counts, axis=0)
+    known = box_wh[:, 0] > 0
+    px_w = boxes[:, 2] * np.where(known, box_wh[:, 0], 1.0)
+    px_h = boxes[:, 3] * np.where(known, box_wh[:, 1], 1.0)
+
+    out_of_bounds = ((xyxy[:, :2] < -tolerance) | (xyxy[:, 2:] > 1 + tolerance)).any(axis=1)
+    degenerate = known & ((px_w < min_box_pixels) | (px_h < min_box_pixels))
+    file_of_box = np.repeat(np.arange(len(names)), counts)
+
+    duplicates = []
+    for fid in np.flatnonzero(counts > 1):
+        start, end = labels.offsets[fid], labels.offsets[fid + 1]
+        iou = pairwise_iou(xyxy[start:end])
+        same = labels.classes[start:end, None] == labels.classes[None, start:end]
+        i, j = np.nonzero(np.triu((iou >= iou_threshold) & same, k=1))
+        duplicates.extend((names[fid], int(a) + 1, int(b) + 1, round(float(iou[a, b]), 4))
+                          for a, b in zip(i, j))
+
+    return {
+        "names": names,
+        "boxes_per_file": counts,
+        "classes": labels.classes,
+        "size": np.sqrt(boxes[:, 2] * boxes[:, 3]).astype(np.float32),
+        "aspect": (px_w / px_h).astype(np.float32),
+        "invalid_lines": [list(e) for e in labels.errors],
+        "degenerate_boxes": [[names[f], int(k - labels.offsets[f]) + 1]
+                             for k, f in zip(np.flatnonzero(degenerate), file_of_box[degenerate])],
+        "out_of_bounds_boxes": [[names[f], int(k - labels.offsets[f]) + 1]
+                                for k, f in zip(np.flatnonzero(out_of_bounds), file_of_box[out_of_bounds])],
+        "duplicate_boxes": [list(d) for d in duplicates],
+    }
+
+
+def _distribution(values, bins):
+    # counts[0] fica abaixo de bins[0], counts[i] em [bins[i-1], bins[i]) e o último acima de bins[-1]
+    counts, edges = np.histogram(values, bins=np.concatenate([[-np.inf], bins, [np.inf]]))
+    result = {"bins": [float(b) for b in bins], "counts": counts.tolist()}
+    if len(values):
+        result["percentiles"] = {f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+    return result
+
+
+def _issue(items, max_examples):
+    return {"count": len(items), "examples": items[:max_examples]}
+
+
+def compute_stats(dataset_path, valid_exts, backend="json", max_workers=None, chunk_size=2000,
+                  iou_threshold=0.9, min_box_pixels=2, tolerance=1e-3, max_examples=100, progress=None):
+    """
+    Estatísticas e validação do dataset num dicionário pronto para JSON.
+
+    Os arquivos de labels/ são divididos em lotes analisados num pool de
+    processos (um por núcleo por padrão); as dimensões das imagens vêm do
+    índice de cabeçalhos, sem decodificar nenhuma imagem.
+    progress(lotes concluídos, total de lotes) é chamado a cada lote.
+    """
+    store = open_project_store(dataset_path, backend=backend)
+    try:
+        classes = list(store.classes)
+        users = {}
+        for user in store.users():
+            total = store.count(user)
+            approved = store.count(user, approved=True)
+            users[user] = {"assigned": total, "approved": approved,
+                           "progress": round(approved / total, 4) if total else 0.0}
+    finally:
+        store.close()
+
+    index = DatasetIndex.load(dataset_path)
+    dims = load_dimensions(dataset_path, index, valid_exts)
+    ext_set = {ext.lower() for ext in valid_exts}
+    image_of_label = {}
+    for name in index.images:
+        if os.path.splitext(name)[1].lower() in ext_set:
+            image_of_label[DatasetIndex.label_name(name)] = name
+    label_names = sorted(name for name in index.labels if name.endswith(".txt"))
+
+    label_dims = {}
+    for label in label_names:
+        image = image_of_label.get(label)
+        size = dims.size_of(image) if image else None
+        if size:
+            label_dims[label] = size
+
+    labels_dir = os.path.join(dataset_path, "labels")
+    chunks = [label_names[i:i + chunk_size] for i in range(0, len(label_names), chunk_size)]
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        futures = [pool.submit(_stats_chunk, labels_dir, chunk, len(classes) or None,
+                               {name: label_dims[name] for name in chunk if name in label_dims},
+                               iou_threshold, min_box_pixels, tolerance)
+                   for chunk in chunks]
+        for done, future in enumerate(futures, 1):
+            results.append(future.result())
+            if progress:
+                progress(done, len(futures))
+
+    def merged(key):
+        return [item for r in results for item in r[key]]
+
+    all_classes = np.concatenate([r["classes"] for r in results]) if results else np.zeros(0, np.int32)
+    sizes = np.concatenate([r["size"] for r in results]) if results else np.zeros(0, np.float32)
+    aspects = np.concatenate([r["aspect"] for r in results]) if results else np.zeros(0, np.float32)
+    class_counts = np.bincount(all_classes, minlength=len(classes))
+
+    empty_files = {name for r in results for name, n in zip(r["names"], r["boxes_per_file"]) if n == 0}
+    orphans = [name for name in label_names if name not in image_of_label]
+    unlabeled = sorted(image for label, image in image_of_label.items()
+                       if label not in index.labels or label in empty_files)
+
+    issues = {
+        "invalid_lines": _issue(merged("invalid_lines"), max_examples),
+        "orphan_labels": _issue(orphans, max_examples),
+        "unlabeled_images": _issue(unlabeled, max_examples),
+        "degenerate_boxes": _issue(merged("degenerate_boxes"), max_examples),
+        "out_of_bounds_boxes": _issue(merged("out_of_bounds_boxes"), max_examples),
+        "duplicate_boxes": _issue(merged("duplicate_boxes"), max_examples),
+    }
+    return {
+        "dataset": os.path.abspath(dataset_path),
+        "images": len(image_of_label),
+        "label_files": len(label_names),
+        "boxes": int(len(all_classes)),
+        "classes": {(classes[i] if i < len(classes) else str(i)): int(n) for i, n in enumerate(class_counts)},
+        # tamanho relativo sqrt(w*h) e razão largura/altura em pixels
+        "box_size": _distribution(sizes, SIZE_BINS),
+        "aspect_ratio": _distribution(aspects, ASPECT_BINS),
+        "users": users,
+        "issues": issues,
+    }
+
+
+def validation_failed(stats):
+    return any(stats["issues"][key]["count"] for key in FAILING_ISSUES)
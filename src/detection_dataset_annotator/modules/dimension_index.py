@@ -0,0 +1,163 @@
+#!/usr/bin/python3
+import os
+import json
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from detection_dataset_annotator.modules.project_paths import project_cache_dir
+
+# marcadores SOF do JPEG que trazem altura e largura (exclui DHT, JPG e DAC)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg_size(f):
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue  # marcadores sem segmento
+        if marker == 0xD9:
+            return None
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if marker in _JPEG_SOF:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            h, w = struct.unpack(">HH", data[1:5])
+            return w, h
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def read_image_size(path):
+    """
+    Lê (largura, altura) só do cabeçalho de um PNG, JPEG ou BMP, sem
+    decodificar os pixels. Retorna None para formatos desconhecidos ou
+    arquivos inválidos.
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(26)
+            if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            if head[:2] == b"\xff\xd8":
+                return _jpeg_size(f)
+            if head[:2] == b"BM" and len(head) >= 26:
+                header_size = struct.unpack("<I", head[14:18])[0]
+                if header_size == 12:  # BITMAPCOREHEADER
+                    w, h = struct.unpack("<HH", head[18:22])
+                else:
+                    w, h = struct.unpack("<ii", head[18:26])
+                return abs(w), abs(h)
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+class DimensionIndex:
+    """
+    Índice (largura, altura) das imagens do dataset lido só dos cabeçalhos.
+
+    Fica em <dataset>/.annotator/dimensions.json; cada entrada guarda o
+    tamanho e o mtime do arquivo e é relida quando eles mudam. Os
+    (tamanho, mtime) vêm do DatasetIndex, então validar não custa um stat.
+    """
+    VERSION = 1
+
+    def __init__(self, dataset_path):
+        self.dataset_path = dataset_path
+        self.cache_path = os.path.join(project_cache_dir(dataset_path), "dimensions.json")
+        self.entries = {}
+        self.modified = False
+
+    @classmethod
+    def load(cls, dataset_path):
+        index = cls(dataset_path)
+        if os.path.exists(index.cache_path):
+            try:
+                with open(index.cache_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == cls.VERSION:
+                    index.entries = data["images"]
+            except (ValueError, KeyError):
+                pass
+        return index
+
+    def _read(self, img_name):
+        return read_image_size(os.path.join(self.dataset_path, "images", img_name))
+
+    def size_of(self, img_name, stat=None):
+        """
+        (largura, altura) da imagem, ou None. stat é o (tamanho, mtime_ns)
+        atual do arquivo (ex.: DatasetIndex.image_stat); sem ele a entrada
+        em cache é usada como está.
+        """
+        entry = self.entries.get(img_name)
+        if entry is not None and (stat is None or tuple(entry[:2]) == tuple(stat)):
+            return tuple(entry[2:]) if entry[2] is not None else None
+        if stat is None:
+            try:
+                st = os.stat(os.path.join(self.dataset_path, "images", img_name))
+            except OSError:
+                return None
+            stat = (st.st_size, st.st_mtime_ns)
+        size = self._read(img_name)
+        self.entries[img_name] = list(stat) + (list(size) if size else [None, None])
+        self.modified = True
+        return size
+
+    def update(self, image_stats, max_workers=8, progress=None):
+        """
+        Atualiza o índice para {imagem: (tamanho, mtime_ns)} (ex.:
+        DatasetIndex.images), lendo em paralelo só os cabeçalhos que mudaram.
+        Entradas de imagens que não existem mais são removidas.
+        Retorna o número de cabeçalhos lidos.
+        """
+        stale = [name for name, stat in image_stats.items()
+                 if tuple(self.entries.get(name, (None, None))[:2]) != tuple(stat)]
+        removed = [name for name in self.entries if name not in image_stats]
+        for name in removed:
+            del self.entries[name]
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            for i, (name, size) in enumerate(zip(stale, pool.map(self._read, stale))):
+                self.entries[name] = list(image_stats[name]) + (list(size) if size else [None, None])
+                if progress and (i + 1) % 1000 == 0:
+                    progress(i + 1, len(stale))
+        if stale or removed:
+            self.modified = True
+        return len(stale)
+
+    def save(self):
+        if not self.modified:
+            return
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "images": self.entries}, f)
+        os.replace(tmp_path, self.cache_path)
+        self.modified = False
+
+
+def load_dimensions(dataset_path, dataset_index, valid_exts=None, max_workers=8, progress=None):
+    """
+    Carrega e atualiza o índice de dimensões para as imagens de um
+    DatasetIndex (opcionalmente só as extensões em valid_exts) e o salva.
+    """
+    stats = dataset_index.images
+    if valid_exts is not None:
+        ext_set = {ext.lower() for ext in valid_exts}
+        stats = {name: stat for name, stat in stats.items()
+                 if os.path.splitext(name)[1].lower() in ext_set}
+    index = DimensionIndex.load(dataset_path)
+    index.update(stats, max_workers=max_workers, progress=progress)
+    index.save()
+    return index
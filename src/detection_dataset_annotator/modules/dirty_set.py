@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+import os
+
+from detection_dataset_annotator.modules.project_paths import project_cache_dir
+
+
+class DirtySet:
+    """
+    Conjunto de arquivos do dataset alterados desde o último commit.
+
+    Os caminhos (relativos ao dataset) também são anexados a um arquivo,
+    para que um commit depois de reabrir o programa ainda os encontre.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.paths = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.paths = {line.rstrip("\n") for line in f if line.strip()}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def add(self, rel_path):
+        if rel_path in self.paths:
+            return
+        self.paths.add(rel_path)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(rel_path + "\n")
+
+    def update(self, rel_paths):
+        new = [p for p in dict.fromkeys(rel_paths) if p not in self.paths]
+        if not new:
+            return
+        self.paths.update(new)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(p + "\n" for p in new)
+
+    def write_pathspec(self, pathspec_path, extra=()):
+        """
+        Escreve os caminhos (mais `extra`) num arquivo para git add --pathspec-from-file.
+        """
+        with open(pathspec_path, "w", encoding="utf-8") as f:
+            for rel_path in sorted(self.paths) + list(extra):
+                f.write(rel_path + "\n")
+        return pathspec_path
+
+    def stage(self, repo, pathspec_path, extra=(), chunk_size=1000):
+        """
+        git add dos caminhos (mais `extra`): um único comando com
+        --pathspec-from-file no git 2.25 ou mais novo; nas versões anteriores,
+        que não têm a opção, vários git add com até chunk_size caminhos cada.
+        """
+        if repo.git.version_info >= (2, 25):
+            self.write_pathspec(pathspec_path, extra)
+            repo.git.add(f"--pathspec-from-file={pathspec_path}")
+            return
+        rel_paths = sorted(self.paths) + list(extra)
+        for start in range(0, len(rel_paths), chunk_size):
+            repo.git.add("--", *rel_paths[start:start + chunk_size])
+
+    def clear(self):
+        self.paths.clear()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def dirty_labels_of(dataset_path):
+    """
+    DirtySet dos rótulos do dataset, compartilhado pelo anotador e pelo importador.
+    """
+    return DirtySet(os.path.join(project_cache_dir(dataset_path), "dirty_labels.txt"))
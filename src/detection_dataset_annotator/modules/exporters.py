@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+import os
+import json
+import shutil
+import tempfile
+import datetime
+from collections import deque
+from xml.sax.saxutils import escape
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+from detection_dataset_annotator.modules.yolo_labels import read_yolo_file
+from detection_dataset_annotator.modules.project_paths import label_path_of
+from detection_dataset_annotator.modules.dataset_index import DatasetIndex
+from detection_dataset_annotator.modules.dimension_index import load_dimensions
+from detection_dataset_annotator.modules.project_store import open_project_store
+
+
+def iter_project_images(store, users=None, approved=None, page_size=10000):
+    """
+    Gera (usuário, imagem) das listas images_<user>, página a página.
+    approved: True (só aprovadas), False (só pendentes) ou None (todas).
+    """
+    for user in (users if users is not None else store.users()):
+        offset = 0
+        while True:
+            rows = store.images(user, approved=approved, offset=offset, limit=page_size)
+            for image, _ in rows:
+                yield user, image
+            if len(rows) < page_size:
+                break
+            offset += page_size
+
+
+def _pixel_boxes(labels, size, class_ids):
+    """
+    Converte os rótulos normalizados em (ids, x1, y1, x2, y2) em pixels,
+    mantendo só as classes em class_ids (None = todas).
+    """
+    keep = np.ones(len(labels.classes), dtype=bool) if class_ids is None else np.isin(labels.classes, class_ids)
+    boxes = labels.boxes[keep].astype(np.float64)
+    w, h = size
+    x1 = (boxes[:, 0] - boxes[:, 2] / 2) * w
+    y1 = (boxes[:, 1] - boxes[:, 3] / 2) * h
+    x2 = (boxes[:, 0] + boxes[:, 2] / 2) * w
+    y2 = (boxes[:, 1] + boxes[:, 3] / 2) * h
+    return labels.classes[keep], np.stack([x1, y1, x2, y2], axis=1)
+
+
+class _ExportSource:
+    """
+    Imagens selecionadas do projeto com as dimensões já resolvidas.
+    """
+    def __init__(self, dataset_path, valid_exts, backend="json", users=None, approved=True, classes=None):
+        self.dataset_path = dataset_path
+        store = open_project_store(dataset_path, backend=backend)
+        try:
+            self.classes = list(store.classes)
+            unknown = [u for u in (users or []) if u not in store.users()]
+            if unknown:
+                raise ValueError("unknown users: " + ", ".join(unknown))
+            self.items = list(dict.fromkeys(img for _, img in iter_project_images(store, users, approved)))
+        finally:
+            store.close()
+        if classes:
+            unknown = [c for c in classes if c not in self.classes]
+            if unknown:
+                raise ValueError("unknown classes: " + ", ".join(unknown))
+            self.class_ids = [self.classes.index(c) for c in classes]
+        else:
+            self.class_ids = None
+        self.dimensions = load_dimensions(dataset_path, DatasetIndex.load(dataset_path), valid_exts)
+
+    def selected_classes(self):
+        ids = range(len(self.classes)) if self.class_ids is None else sorted(self.class_ids)
+        return [(i, self.classes[i]) for i in ids]
+
+    def read(self, img_name):
+        labels = read_yolo_file(label_path_of(self.dataset_path, img_name), len(self.classes))
+        return img_name, self.dimensions.size_of(img_name), labels
+
+
+def _read_in_order(read, items, workers, window_per_worker=4):
+    """
+    Gera read(item) na ordem de items, com no máximo workers*window_per_worker
+    leituras em andamento: ao contrário de Executor.map, que agenda tudo de
+    uma vez, os resultados não se acumulam quando quem consome é mais lento.
+    """
+    window = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for item in items:
+            if len(window) >= workers * window_per_worker:
+                yield window.popleft().result()
+            window.append(pool.submit(read, item))
+        while window:
+            yield window.popleft().result()
+
+
+def export_coco(dataset_path, output_path, valid_exts, backend="json", users=None, approved=True,
+                classes=None, max_workers=8, progress=None):
+    """
+    Exporta o projeto em COCO JSON escrevendo o documento em fluxo.
+
+    A lista "images" vai direto para o arquivo e as anotações para um
+    arquivo temporário que é anexado no fim, então nenhuma das duas listas
+    fica inteira na memória. Os rótulos são lidos por um pool de threads,
+    com uma janela limitada de leituras adiantadas.
+    Retorna (imagens, anotações) exportadas.
+    """
+    source = _ExportSource(dataset_path, valid_exts, backend, users, approved, classes)
+    info = {"description": os.path.basename(os.path.abspath(dataset_path)),
+            "date_created": datetime.datetime.now().isoformat(timespec="seconds")}
+    categories = [{"id": i + 1, "name": name, "supercategory": ""} for i, name in source.selected_classes()]
+
+    tmp_path = output_path + ".tmp"
+    n_images = 0
+    n_annotations = 0
+    with open(tmp_path, "w", encoding="utf-8") as out, \
+            tempfile.TemporaryFile("w+", encoding="utf-8", dir=os.path.dirname(os.path.abspath(output_path))) as ann:
+        out.write('{"info": ' + json.dumps(info) + ', "licenses": [], "categories": ' +
+                  json.dumps(categories, ensure_ascii=False) + ', "images": [')
+        for img_name, size, labels in _read_in_order(source.read, source.items, max(1, max_workers)):
+            if size is None:
+                continue
+            n_images += 1
+            image_id = n_images
+            out.write(("" if image_id == 1 else ", ") + json.dumps(
+                {"id": image_id, "file_name": img_name.replace(os.sep, "/"),
+                 "width": size[0], "height": size[1]}, ensure_ascii=False))
+            cls, xyxy = _pixel_boxes(labels, size, source.class_ids)
+            for c, (x1, y1, x2, y2) in zip(cls.tolist(), xyxy.tolist()):
+                n_annotations += 1
+                w, h = x2 - x1, y2 - y1
+                ann.write(("" if n_annotations == 1 else ", ") + json.dumps(
+                    {"id": n_annotations, "image_id": image_id, "category_id": c + 1,
+                     "bbox": [round(x1, 2), round(y1, 2), round(w, 2), round(h, 2)],
+                     "area": round(w * h, 2), "iscrowd": 0}))
+            if progress and n_images % 1000 == 0:
+                progress(n_images, len(source.items))
+        out.write('], "annotations": [')
+        ann.seek(0)
+        shutil.copyfileobj(ann, out)
+        out.write("]}\n")
+    os.replace(tmp_path, output_path)
+    return n_images, n_annotations
+
+
+def _voc_xml(folder, img_name, size, classes, cls, xyxy):
+    objects = []
+    w, h = size
+    for c, (x1, y1, x2, y2) in zip(cls.tolist(), xyxy.tolist()):
+        # coordenadas VOC inteiras, 1-based, limitadas à imagem
+        xmin, ymin = max(1, int(round(x1)) + 1), max(1, int(round(y1)) + 1)
+        xmax, ymax = min(w, int(round(x2))), min(h, int(round(y2)))
+        objects.append(
+            "\t<object>\n"
+            f"\t\t<name>{escape(classes[c])}</name>\n"
+            "\t\t<pose>Unspecified</pose>\n\t\t<truncated>0</truncated>\n\t\t<difficult>0</difficult>\n"
+            "\t\t<bndbox>\n"
+            f"\t\t\t<xmin>{xmin}</xmin>\n\t\t\t<ymin>{ymin}</ymin>\n"
+            f"\t\t\t<xmax>{xmax}</xmax>\n\t\t\t<ymax>{ymax}</ymax>\n"
+            "\t\t</bndbox>\n"
+            "\t</object>\n")
+    return ("<annotation>\n"
+            f"\t<folder>{escape(folder)}</folder>\n"
+            f"\t<filename>{escape(os.path.basename(img_name))}</filename>\n"
+            f"\t<path>{escape(img_name.replace(os.sep, '/'))}</path>\n"
+            f"\t<size>\n\t\t<width>{w}</width>\n\t\t<height>{h}</height>\n\t\t<depth>3</depth>\n\t</size>\n"
+            "\t<segmented>0</segmented>\n" + "".join(objects) + "</annotation>\n")
+
+
+def _voc_chunk(dataset_path, output_dir, items, classes, class_ids):
+    """
+    Trabalho de um processo: escreve o XML de cada (imagem, (largura, altura)).
+    """
+    folder = os.path.basename(os.path.abspath(dataset_path))
+    written = 0
+    for img_name, size in items:
+        labels = read_yolo_file(label_path_of(dataset_path, img_name), len(classes))
+        cls, xyxy = _pixel_boxes(labels, size, class_ids)
+        xml_path = os.path.join(output_dir, os.path.splitext(img_name)[0] + ".xml")
+        os.makedirs(os.path.dirname(xml_path), exist_ok=True)
+        with open(xml_path, "w", encoding="utf-8") as f:
+            f.write(_voc_xml(folder, img_name, size, classes, cls, xyxy))
+        written += 1
+    return written
+
+
+def export_voc(dataset_path, output_dir, valid_exts, backend="json", users=None, approved=True,
+               classes=None, max_workers=None, chunk_size=500, progress=None):
+    """
+    Exporta um XML Pascal VOC por imagem em output_dir (mesma árvore de
+    images/), com os lotes de imagens escritos num pool de processos.
+    Retorna o número de arquivos escritos.
+    """
+    source = _ExportSource(dataset_path, valid_exts, backend, users, approved, classes)
+    items = [(img, source.dimensions.size_of(img)) for img in source.items]
+    items = [(img, size) for img, size in items if size is not None]
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    os.makedirs(output_dir, exist_ok=True)
+    written = 0
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        futures = [pool.submit(_voc_chunk, dataset_path, output_dir, chunk, source.classes, source.class_ids)
+                   for chunk in chunks]
+        for future in futures:
+            written += future.result()
+            if progress:
+                progress(written, len(items))
+    return written
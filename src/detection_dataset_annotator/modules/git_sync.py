@@ -0,0 +1,324 @@
+#!/usr/bin/python3
+import os
+import re
+from collections import deque
+
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal
+
+from detection_dataset_annotator.modules.instrumentation import tracer
+
+# erros que não adianta repetir: precisam de intervenção do usuário
+NOT_RETRYABLE = re.compile(r"CONFLICT|could not apply|non-fast-forward|rejected|unmerged|"
+                           r"unstaged changes|would be overwritten|[Aa]uthentication failed|[Pp]ermission denied")
+
+
+class SyncCancelled(Exception):
+    pass
+
+
+class StashPopFailed(Exception):
+    """
+    O stash feito antes do rebase não pôde ser reaplicado: as alterações do
+    usuário continuam em refs/stash. rebase_error é o erro do rebase, se
+    ele também falhou.
+    """
+    def __init__(self, pop_error, rebase_error=None):
+        super().__init__(str(pop_error))
+        self.pop_error = pop_error
+        self.rebase_error = rebase_error
+
+
+_progress_class = None
+
+
+def _make_progress(callback):
+    """
+    RemoteProgress do GitPython que repassa (operação, atual, total) a
+    callback. A classe só é criada no primeiro uso, para que o GitPython
+    não seja importado na abertura do programa.
+    """
+    global _progress_class
+    if _progress_class is None:
+        from git import RemoteProgress
+
+        op_names = {
+            RemoteProgress.COUNTING: "Counting objects",
+            RemoteProgress.COMPRESSING: "Compressing objects",
+            RemoteProgress.WRITING: "Writing objects",
+            RemoteProgress.RECEIVING: "Receiving objects",
+            RemoteProgress.RESOLVING: "Resolving deltas",
+            RemoteProgress.FINDING_SOURCES: "Finding sources",
+            RemoteProgress.CHECKING_OUT: "Checking out files",
+        }
+
+        class _Progress(RemoteProgress):
+            def __init__(self, callback):
+                super().__init__()
+                self.callback = callback
+
+            def update(self, op_code, cur_count, max_count=None, message=""):
+                name = op_names.get(op_code & RemoteProgress.OP_MASK, "Git")
+                self.callback(name, int(cur_count or 0), int(max_count or 0))
+
+        _progress_class = _Progress
+    return _progress_class(callback)
+
+
+def _stash_head(repo):
+    from git import GitCommandError
+
+    try:
+        return repo.git.rev_parse("--verify", "--quiet", "refs/stash")
+    except GitCommandError:
+        # sem nenhum stash
+        return ""
+
+
+def _rebase_in_progress(repo):
+    return any(os.path.exists(os.path.join(repo.git_dir, name)) for name in ("rebase-merge", "rebase-apply"))
+
+
+class GitSyncWorker(QThread):
+    """
+    Executa um job de sincronização ("pull" ou "push") numa thread própria.
+
+    Os comandos de rede (fetch e push) rodam como processos filhos com
+    --progress; a saída de erro é lida em pedaços e passada ao
+    RemoteProgress do GitPython. cancel() só encerra o processo nessas
+    fases: durante o rebase local ele apenas marca o cancelamento, que vale
+    assim que o rebase termina, para nunca deixar o repositório no meio de
+    um rebase com as alterações do usuário guardadas no stash.
+
+    writer (ex.: WriteBehindQueue) é pausado entre o stash e o stash pop,
+    para que nenhum rótulo seja gravado na pasta de trabalho no meio do
+    rebase; stash_message é a mensagem mostrada quando o stash não pode ser
+    reaplicado.
+    """
+    progress = pyqtSignal(str, int, int)
+    done = pyqtSignal(str, bool, str, bool)  # kind, ok, mensagem, pode repetir
+
+    def __init__(self, repo_path, kind, branch, remote="origin", writer=None, stash_message="", parent=None):
+        super().__init__(parent)
+        self.repo_path = repo_path
+        self.kind = kind
+        self.branch = branch
+        self.remote = remote
+        self.writer = writer
+        self.stash_message = stash_message
+        self._proc = None
+        self._cancelled = False
+        self._cancellable = False
+
+    def cancel(self):
+        self._cancelled = True
+        proc = self._proc
+        if self._cancellable and proc is not None and proc.proc is not None:
+            proc.proc.terminate()
+
+    def _run_git(self, repo, *args):
+        from git import GitCommandError
+
+        if self._cancelled:
+            raise SyncCancelled()
+        progress = _make_progress(lambda name, cur, total: self.progress.emit(name, cur, total))
+        handler = progress.new_message_handler()
+        proc = repo.git.execute(["git"] + list(args), as_process=True, with_stdout=False)
+        self._proc = proc
+        self._cancellable = True
+        lines = []
+        buffer = b""
+        # o git separa as linhas de progresso com \r
+        while True:
+            chunk = proc.proc.stderr.read1(4096)
+            if not chunk:
+                break
+            buffer += chunk
+            parts = re.split(rb"[\r\n]", buffer)
+            buffer = parts.pop()
+            for part in parts:
+                line = part.decode("utf-8", errors="replace")
+                if line:
+                    lines.append(line)
+                    handler(line)
+        if buffer:
+            lines.append(buffer.decode("utf-8", errors="replace"))
+        stderr = "\n".join(l for l in lines if not progress.re_op_relative.match(l)
+                           and not progress.re_op_absolute.match(l))
+        try:
+            proc.wait(stderr=stderr.encode("utf-8"))
+        except GitCommandError:
+            if self._cancelled:
+                raise SyncCancelled()
+            raise
+        finally:
+            self._cancellable = False
+            self._proc = None
+        return stderr
+
+    def _rebase(self, repo):
+        """
+        Rebase do branch local sobre o FETCH_HEAD, sem cancelamento. As
+        alterações não commitadas vão para o stash antes e voltam depois;
+        se o rebase falhar ele é desfeito (rebase --abort) antes do stash pop.
+        Se o stash pop falhar levanta StashPopFailed, com o erro do rebase
+        (se houver) preservado.
+        """
+        from git import GitCommandError
+
+        if self.writer is not None:
+            self.writer.pause()
+        try:
+            stash_before = _stash_head(repo)
+            repo.git.stash("push", "--message", "detection_dataset_annotator: sync")
+            stashed = _stash_head(repo) != stash_before
+            rebase_error = None
+            try:
+                repo.git.rebase("FETCH_HEAD")
+            except GitCommandError as e:
+                rebase_error = e
+                if _rebase_in_progress(repo):
+                    repo.git.rebase("--abort")
+            if stashed:
+                try:
+                    repo.git.stash("pop")
+                except GitCommandError as e:
+                    raise StashPopFailed(e, rebase_error)
+            if rebase_error is not None:
+                raise rebase_error
+        finally:
+            if self.writer is not None:
+                self.writer.resume()
+
+    def run(self):
+        from git import Repo, GitCommandError
+
+        try:
+            repo = Repo(self.repo_path)
+            messages = []
+            # fetch + rebase em vez de pull --rebase: só o fetch pode ser cancelado;
+            # o stash do rebase deixa o usuário continuar anotando durante a sincronização
+            with tracer.span("git_pull"):
+                messages.append(self._run_git(repo, "fetch", "--progress", self.remote, self.branch))
+                self._rebase(repo)
+            if self._cancelled:
+                raise SyncCancelled()
+            if self.kind == "push":
+                with tracer.span("git_push", remote=self.remote):
+                    messages.append(self._run_git(repo, "push", "--progress", "--set-upstream",
+                                                  self.remote, f"{self.branch}:{self.branch}"))
+            self.done.emit(self.kind, True, "\n".join(m for m in messages if m.strip()), False)
+        except SyncCancelled:
+            self.done.emit(self.kind, False, "", False)
+        except StashPopFailed as e:
+            # nunca repetido sozinho: um novo stash ficaria por cima do que não voltou
+            parts = [str(e.rebase_error)] if e.rebase_error is not None else []
+            parts += [self.stash_message, str(e.pop_error)]
+            self.done.emit(self.kind, False, "\n\n".join(p for p in parts if p), False)
+        except GitCommandError as e:
+            stderr = e.stderr if isinstance(e.stderr, str) else str(e.stderr or "")
+            self.done.emit(self.kind, False, str(e), not NOT_RETRYABLE.search(stderr))
+        except Exception as e:
+            # repositório inválido, erro de E/S...: o job precisa terminar de qualquer jeito
+            self.done.emit(self.kind, False, f"{type(e).__name__}: {e}", False)
+
+
+class GitSyncEngine(QObject):
+    """
+    Fila de jobs de sincronização Git executados fora da thread da GUI.
+
+    Todos os jobs buscam de e enviam para o mesmo remoto (`remote`). Um
+    push que falhar por erro transitório (rede, servidor) é reenfileirado
+    automaticamente com espera crescente, até `max_retries` tentativas.
+    """
+    progress = pyqtSignal(str, int, int)
+    started = pyqtSignal(str)
+    finished = pyqtSignal(str, bool, str)  # kind, ok, mensagem
+    cancelled = pyqtSignal(str)
+    retry_scheduled = pyqtSignal(int)
+
+    def __init__(self, retry_seconds=30, max_retries=5, remote="origin", writer=None, stash_message="",
+                 parent=None):
+        super().__init__(parent)
+        self.repo_path = ""
+        self.remote = remote
+        self.writer = writer
+        self.stash_message = stash_message
+        self.retry_seconds = retry_seconds
+        self.max_retries = max_retries
+        self._queue = deque()
+        self._worker = None
+        self._retries = 0
+        self._retry_timer = QTimer(self)
+        self._retry_timer.setSingleShot(True)
+        self._retry_timer.timeout.connect(self._retry)
+        self._retry_branch = None
+
+    def set_repository(self, repo_path):
+        self.repo_path = repo_path
+
+    def is_busy(self):
+        return self._worker is not None
+
+    def has_pending_retry(self):
+        return self._retry_timer.isActive()
+
+    def pull(self, branch):
+        self._enqueue("pull", branch)
+
+    def push(self, branch):
+        # um push novo substitui a tentativa pendente
+        self._retry_timer.stop()
+        self._retries = 0
+        self._enqueue("push", branch)
+
+    def cancel(self):
+        self._queue.clear()
+        self._retry_timer.stop()
+        if self._worker is not None:
+            self._worker.cancel()
+
+    def wait(self):
+        if self._worker is not None:
+            self._worker.wait()
+
+    def _enqueue(self, kind, branch):
+        if (kind, branch) not in self._queue:
+            self._queue.append((kind, branch))
+        self._start_next()
+
+    def _start_next(self):
+        if self._worker is not None or not self._queue:
+            return
+        kind, branch = self._queue.popleft()
+        self._worker = GitSyncWorker(self.repo_path, kind, branch, remote=self.remote, writer=self.writer,
+                                     stash_message=self.stash_message, parent=self)
+        self._worker.progress.connect(self.progress)
+        self._worker.done.connect(self._on_done)
+        self.started.emit(kind)
+        self._worker.start()
+
+    def _on_done(self, kind, ok, message, retryable):
+        worker = self._worker
+        self._worker = None
+        if worker is not None:
+            worker.wait()
+            worker.deleteLater()
+
+        if not ok and not message:
+            self.cancelled.emit(kind)
+        elif not ok and kind == "push" and retryable and self._retries < self.max_retries:
+            self._retries += 1
+            delay = self.retry_seconds * (2 ** (self._retries - 1))
+            self._retry_branch = worker.branch if worker is not None else None
+            self._retry_timer.start(delay * 1000)
+            self.finished.emit(kind, ok, message)
+            self.retry_scheduled.emit(delay)
+        else:
+            if ok and kind == "push":
+                self._retries = 0
+            self.finished.emit(kind, ok, message)
+        self._start_next()
+
+    def _retry(self):
+        if self._retry_branch:
+            self._enqueue("push", self._retry_branch)
@@ -0,0 +1,276 @@
+#!/usr/bin/python3
+import os
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader
+
+from detection_dataset_annotator.modules.yolo_labels import read_yolo_file, empty_labels
+from detection_dataset_annotator.modules.project_paths import label_path_of
+from detection_dataset_annotator.modules.instrumentation import tracer
+
+
+def decode_image(img_path, max_size=None):
+    """
+    Decodifica a imagem num QImage já no formato usado pelo QPixmap,
+    para que a conversão na thread da GUI seja só uma cópia.
+
+    Se max_size (QSize) for dado e a imagem for maior, ela é decodificada
+    já reduzida com QImageReader.setScaledSize; no JPEG isso usa a escala
+    DCT do libjpeg e evita decodificar todos os pixels.
+
+    Retorna (image, size), onde size é o tamanho original da imagem.
+    """
+    reader = QImageReader(img_path)
+    size = reader.size()
+    if (max_size is not None and size.isValid() and
+            (size.width() > max_size.width() or size.height() > max_size.height())):
+        reader.setScaledSize(size.scaled(max_size, Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return image, size
+    if not size.isValid():
+        size = image.size()
+    if image.hasAlphaChannel():
+        return image.convertToFormat(QImage.Format_ARGB32_Premultiplied), size
+    return image.convertToFormat(QImage.Format_RGB32), size
+
+
+class CacheEntry:
+    __slots__ = ("image", "size", "labels", "nbytes")
+
+    def __init__(self, image, size, labels):
+        self.image = image
+        self.size = size
+        self.labels = labels
+        self.nbytes = image.sizeInBytes()
+
+    @property
+    def full(self):
+        return self.image.size() == self.size
+
+
+class _DecodeSignals(QObject):
+    done = pyqtSignal(int, str, bool, object, object, object)  # geração, imagem, pedido completo, ...
+
+
+class _DecodeTask(QRunnable):
+    def __init__(self, generation, dataset_path, img_name, max_size, has_label, num_classes, signals):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.generation = generation
+        self.dataset_path = dataset_path
+        self.img_name = img_name
+        self.max_size = max_size
+        self.has_label = has_label
+        self.num_classes = num_classes
+        self.signals = signals
+
+    def run(self):
+        with tracer.span("image_decode_background", full=self.max_size is None):
+            image, size = decode_image(os.path.join(self.dataset_path, "images", self.img_name),
+                                       self.max_size)
+        labels = empty_labels()
+        if self.has_label:
+            labels = read_yolo_file(label_path_of(self.dataset_path, self.img_name), self.num_classes)
+        self.signals.done.emit(self.generation, self.img_name, self.max_size is None, image, size, labels)
+
+
+class ImageCache(QObject):
+    """
+    Cache LRU de imagens decodificadas (QImage) e seus rótulos YOLO (YoloLabels).
+
+    As imagens vizinhas da linha selecionada são decodificadas em threads
+    de trabalho, seguindo a direção em que o usuário navega na tabela.
+    O cache é limitado por um orçamento em bytes.
+
+    As imagens são decodificadas primeiro na resolução da tela
+    (preview_size); a resolução completa é pedida com request_full e
+    anunciada pelo sinal full_ready.
+    """
+    full_ready = pyqtSignal(str)
+
+    def __init__(self, max_bytes, prefetch=3, max_threads=2, parent=None):
+        super().__init__(parent)
+        self.max_bytes = max_bytes
+        self.prefetch_count = prefetch
+        self.preview_size = None
+        self.dataset_path = ""
+        self.has_label = None
+        self.num_classes = None
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._pending_full = {}
+        self._generation = 0
+        self._last_row = None
+
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max(1, max_threads))
+        self._signals = _DecodeSignals()
+        self._signals.done.connect(self._on_decoded)
+
+    def set_dataset(self, dataset_path, has_label=None, num_classes=None):
+        """
+        has_label(img_name), se dado, evita procurar rótulos que não existem.
+        Com num_classes, linhas com id de classe fora do projeto são rejeitadas.
+        """
+        self.dataset_path = dataset_path
+        self.has_label = has_label
+        self.num_classes = num_classes
+        self.clear()
+
+    def _has_label(self, img_name):
+        return True if self.has_label is None else self.has_label(img_name)
+
+    def clear(self):
+        self._generation += 1
+        for task in list(self._pending.values()) + list(self._pending_full.values()):
+            self._pool.tryTake(task)
+        self._pending.clear()
+        self._pending_full.clear()
+        self._entries.clear()
+        self.total_bytes = 0
+        self._last_row = None
+
+    def set_preview_size(self, size):
+        """
+        Define o tamanho máximo (QSize) das decodificações de pré-visualização.
+        """
+        self.preview_size = size
+
+    def get(self, img_name):
+        """
+        Retorna o CacheEntry da imagem. Em caso de miss, decodifica na hora
+        na resolução de pré-visualização.
+        """
+        entry = self._entries.get(img_name)
+        if entry is not None:
+            self._entries.move_to_end(img_name)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        task = self._pending.pop(img_name, None)
+        if task is not None:
+            self._pool.tryTake(task)
+
+        with tracer.span("image_decode"):
+            image, size = decode_image(os.path.join(self.dataset_path, "images", img_name),
+                                       self.preview_size)
+        labels = empty_labels()
+        if self._has_label(img_name):
+            with tracer.span("label_parse"):
+                labels = read_yolo_file(label_path_of(self.dataset_path, img_name), self.num_classes)
+        entry = CacheEntry(image, size, labels)
+        # imagem ilegível: devolvida, mas não guardada, para ser tentada de novo
+        if not image.isNull():
+            self._insert(img_name, entry)
+        return entry
+
+    def request_full(self, img_name):
+        """
+        Agenda a decodificação em resolução completa. Retorna True se ela
+        já estiver no cache; caso contrário full_ready será emitido depois.
+        """
+        entry = self._entries.get(img_name)
+        if entry is not None and entry.full:
+            return True
+        if img_name not in self._pending_full:
+            task = _DecodeTask(self._generation, self.dataset_path, img_name, None,
+                               self._has_label(img_name), self.num_classes, self._signals)
+            self._pending_full[img_name] = task
+            self._pool.start(task, 1)
+        return False
+
+    def update_labels(self, img_name, labels):
+        entry = self._entries.get(img_name)
+        if entry is not None:
+            entry.labels = labels
+
+    def discard(self, img_name):
+        entry = self._entries.pop(img_name, None)
+        if entry is not None:
+            self.total_bytes -= entry.nbytes
+
+    def prefetch_around(self, row, name_at):
+        """
+        Agenda a decodificação das linhas vizinhas de `row`.
+
+        name_at(r) deve retornar o nome da imagem na linha r, ou None se a
+        linha não existir. São pré-carregadas `prefetch` linhas na direção
+        do movimento e uma na direção oposta.
+        """
+        if self.prefetch_count <= 0:
+            return
+        direction = -1 if (self._last_row is not None and row < self._last_row) else 1
+        self._last_row = row
+
+        wanted = []
+        for k in range(1, self.prefetch_count + 1):
+            wanted.append(row + direction * k)
+        wanted.append(row - direction)
+
+        names = []
+        for r in wanted:
+            if r < 0:
+                continue
+            name = name_at(r)
+            if name:
+                names.append(name)
+
+        # cancela o que saiu da janela e ainda não começou
+        for name in list(self._pending):
+            if name not in names and self._pool.tryTake(self._pending[name]):
+                del self._pending[name]
+
+        for name in names:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+                continue
+            if name in self._pending:
+                continue
+            task = _DecodeTask(self._generation, self.dataset_path, name,
+                               self.preview_size, self._has_label(name), self.num_classes, self._signals)
+            self._pending[name] = task
+            self._pool.start(task)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes
+        }
+
+    def _on_decoded(self, generation, img_name, full_request, image, size, labels):
+        if generation != self._generation:
+            return
+        # sai do mapa do pedido que terminou, mesmo se a leitura falhou
+        (self._pending_full if full_request else self._pending).pop(img_name, None)
+        if image.isNull():
+            return
+        entry = CacheEntry(image, size, labels)
+
+        old = self._entries.get(img_name)
+        if old is not None:
+            if old.full or not entry.full:
+                return
+            # os rótulos podem ter sido atualizados depois do pedido
+            entry.labels = old.labels
+        self._insert(img_name, entry)
+        if entry.full:
+            self.full_ready.emit(img_name)
+
+    def _insert(self, img_name, entry):
+        self.discard(img_name)
+        self._entries[img_name] = entry
+        self.total_bytes += entry.nbytes
+        # mantém sempre a entrada mais recente, mesmo se ela sozinha estourar o orçamento
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            self.total_bytes -= old.nbytes
@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+from array import array
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class ImageIndex:
+    """
+    Lista de nomes de imagens em ordem natural (natsort), calculada uma vez.
+    Cada imagem é identificada pela sua posição nessa lista.
+    """
+    def __init__(self, names):
+        self.names = []
+        if names:
+            # natsort só é importado quando há uma lista para ordenar
+            from natsort import natsort_keygen
+            self.names = sorted(names, key=natsort_keygen())
+        self.position = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+
+class ImageListModel(QAbstractTableModel):
+    """
+    Modelo de uma coluna sobre um subconjunto das imagens de um ImageIndex.
+
+    O subconjunto é um vetor de marcas (uma por posição do índice) somado
+    numa árvore de Fenwick: a linha de uma imagem é o número de marcadas
+    antes dela e a imagem de uma linha é achada descendo a árvore, ambos em
+    O(log n). Mover uma imagem entre modelos só troca a sua marca e atualiza
+    O(log n) nós, sem deslocar a lista. O texto de cada linha só é montado
+    quando a view pede (linhas visíveis).
+    Com set_thumbnails, a miniatura entra como ícone da linha, pedida ao
+    ThumbnailCache também só para as linhas visíveis.
+    """
+    def __init__(self, header="Image", parent=None):
+        super().__init__(parent)
+        self.header = header
+        self.image_index = ImageIndex([])
+        self.member = bytearray()
+        self.tree = array("l", [0])
+        self.count = 0
+        self._top_bit = 0
+        self.thumbnails = None
+
+    def set_images(self, image_index, positions):
+        self.beginResetModel()
+        self.image_index = image_index
+        n = len(image_index)
+        self.member = bytearray(n)
+        for pos in positions:
+            self.member[pos] = 1
+        # construção em O(n): cada nó repassa a sua soma ao pai
+        tree = array("l", [0])
+        tree.extend(self.member)
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self.tree = tree
+        self.count = sum(self.member)
+        self._top_bit = 1 << (n.bit_length() - 1) if n else 0
+        self.endResetModel()
+
+    def _add(self, pos, delta):
+        i = pos + 1
+        n = len(self.tree) - 1
+        while i <= n:
+            self.tree[i] += delta
+            i += i & -i
+        self.member[pos] = 1 if delta > 0 else 0
+        self.count += delta
+
+    def _rank(self, pos):
+        """
+        Quantas imagens deste modelo vêm antes da posição pos do índice.
+        """
+        total = 0
+        i = pos
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def _select(self, row):
+        """
+        Posição no índice da imagem da linha row (0 <= row < count).
+        """
+        pos = 0
+        remaining = row + 1
+        bit = self._top_bit
+        n = len(self.tree) - 1
+        while bit:
+            nxt = pos + bit
+            if nxt <= n and self.tree[nxt] < remaining:
+                pos = nxt
+                remaining -= self.tree[nxt]
+            bit >>= 1
+        return pos
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role in (Qt.DisplayRole, Qt.ToolTipRole) and index.isValid():
+            return self.name_at(index.row())
+        if role == Qt.DecorationRole and self.thumbnails is not None and index.isValid():
+            return self.thumbnails.pixmap(self.name_at(index.row()))
+        return None
+
+    def set_thumbnails(self, thumbnails):
+        """
+        Liga (ThumbnailCache) ou desliga (None) as miniaturas das linhas.
+        """
+        if self.thumbnails is not None:
+            self.thumbnails.ready.disconnect(self.on_thumbnail_ready)
+        self.thumbnails = thumbnails
+        if thumbnails is not None:
+            thumbnails.ready.connect(self.on_thumbnail_ready)
+        if self.count:
+            self.dataChanged.emit(self.index(0, 0), self.index(self.count - 1, 0), [Qt.DecorationRole])
+
+    def on_thumbnail_ready(self, name):
+        row = self.row_of(name)
+        if row >= 0:
+            index = self.index(row, 0)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.header
+        return section + 1
+
+    def name_at(self, row):
+        if 0 <= row < self.count:
+            return self.image_index.names[self._select(row)]
+        return None
+
+    def row_of(self, name):
+        """
+        Linha da imagem neste modelo, ou -1 se ela não estiver aqui.
+        """
+        pos = self.image_index.position.get(name)
+        if pos is None or not self.member[pos]:
+            return -1
+        return self._rank(pos)
+
+    def take(self, name):
+        row = self.row_of(name)
+        if row < 0:
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self._add(self.image_index.position[name], -1)
+        self.endRemoveRows()
+        return True
+
+    def insert(self, name):
+        pos = self.image_index.position.get(name)
+        if pos is None or self.member[pos]:
+            return False
+        row = self._rank(pos)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._add(pos, 1)
+        self.endInsertRows()
+        return True
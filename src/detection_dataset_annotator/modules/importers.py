@@ -0,0 +1,272 @@
+#!/usr/bin/python3
+import os
+import json
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from detection_dataset_annotator.modules.yolo_labels import format_yolo
+from detection_dataset_annotator.modules.project_paths import label_path_of
+from detection_dataset_annotator.modules.dataset_index import DatasetIndex
+from detection_dataset_annotator.modules.dirty_set import dirty_labels_of
+from detection_dataset_annotator.modules.dimension_index import DimensionIndex
+from detection_dataset_annotator.modules.write_queue import atomic_write_many
+
+_WHITESPACE = " \t\n\r"
+
+
+class _JsonStream:
+    """
+    Leitor incremental de um documento JSON: o texto é lido em blocos e
+    cada valor é decodificado com raw_decode assim que está completo.
+    """
+    def __init__(self, f, chunk_size=1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        data = self.f.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"invalid COCO JSON: expected {char!r} at offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                # um número no fim do bloco pode continuar no próximo
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill():
+                self.eof = True
+
+    def items(self):
+        """
+        Gera os elementos do array que começa na posição atual.
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"invalid COCO JSON: expected ',' or ']' at offset {self.pos}")
+
+
+def iter_coco(path, chunk_size=1 << 20):
+    """
+    Gera (chave, elemento) para cada elemento dos arrays de primeiro nível
+    de um arquivo COCO ("images", "annotations", "categories", ...), sem
+    carregar o documento inteiro. Valores que não são arrays são gerados
+    inteiros como (chave, valor).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JsonStream(f, chunk_size)
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            key = stream.value()
+            stream.expect(":")
+            if stream.peek() == "[":
+                for item in stream.items():
+                    yield key, item
+            else:
+                yield key, stream.value()
+            char = stream.peek()
+            stream.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"invalid COCO JSON: expected ',' or '}}' at offset {stream.pos}")
+
+
+def _as_numpy(values, dtype):
+    return np.frombuffer(values, dtype=dtype) if len(values) else np.zeros(0, dtype=dtype)
+
+
+def import_coco(dataset_path, coco_path, classes, class_map=None, overwrite=False, skip_crowd=False,
+                precision=6, max_workers=8, dry_run=False, max_examples=100, progress=None, chunk_size=1000):
+    """
+    Converte as anotações de um arquivo COCO em rótulos YOLO de labels/.
+
+    O arquivo é lido em fluxo; das anotações só ficam (imagem, categoria,
+    bbox) em arrays compactos, que são agrupados por imagem no fim. As
+    categorias são associadas a `classes` pelo nome (ou por class_map
+    {nome COCO: classe}); as não associadas são contadas no relatório.
+    Com classes=None as categorias COCO, em ordem de id, viram as classes.
+    Imagens ausentes de images/ são relatadas e ignoradas, e rótulos já
+    existentes só são substituídos com overwrite. Os rótulos são gravados
+    em lotes de chunk_size arquivos com atomic_write_many, no máximo
+    max_workers lotes em andamento, então a memória não cresce com o
+    tamanho do COCO. Não depende do config.json, então funciona antes ou
+    depois de criar o projeto. Retorna um relatório pronto para JSON.
+    """
+    class_map = class_map or {}
+    images = {}
+    categories = {}
+    ann_image = array("q")
+    ann_category = array("q")
+    ann_bbox = array("d")
+    crowd_skipped = 0
+    count = 0
+    for key, item in iter_coco(coco_path):
+        if key == "annotations":
+            count += 1
+            if skip_crowd and item.get("iscrowd"):
+                crowd_skipped += 1
+                continue
+            bbox = item.get("bbox")
+            if not bbox or len(bbox) != 4:
+                continue
+            ann_image.append(int(item["image_id"]))
+            ann_category.append(int(item["category_id"]))
+            ann_bbox.extend(float(v) for v in bbox)
+            if progress and count % 100000 == 0:
+                progress(count)
+        elif key == "images":
+            images[int(item["id"])] = (item["file_name"], item.get("width"), item.get("height"))
+        elif key == "categories":
+            categories[int(item["id"])] = item["name"]
+
+    if classes is None:
+        classes = [categories[cid] for cid in sorted(categories)]
+    # categoria COCO -> id de classe do projeto (-1 = sem correspondência)
+    class_ids = {name: i for i, name in enumerate(classes)}
+    category_class = {cid: class_ids.get(class_map.get(name, name), -1) for cid, name in categories.items()}
+    image_ids = _as_numpy(ann_image, np.int64)
+    category_ids = _as_numpy(ann_category, np.int64)
+    bboxes = _as_numpy(ann_bbox, np.float64).reshape(-1, 4)
+    used, inverse = np.unique(category_ids, return_inverse=True)
+    ann_class = np.array([category_class.get(c, -1) for c in used.tolist()], dtype=np.int64)[inverse]
+
+    unmapped = Counter()
+    for cid, n in zip(*np.unique(category_ids[ann_class < 0], return_counts=True)):
+        unmapped[categories.get(int(cid), f"id {int(cid)}")] += int(n)
+
+    keep = ann_class >= 0
+    image_ids, ann_class, bboxes = image_ids[keep], ann_class[keep], bboxes[keep]
+    order = np.argsort(image_ids, kind="stable")
+    image_ids, ann_class, bboxes = image_ids[order], ann_class[order], bboxes[order]
+    uniq, starts = np.unique(image_ids, return_index=True)
+    ends = np.append(starts[1:], len(image_ids))
+    groups = {int(i): (s, e) for i, s, e in zip(uniq, starts, ends)}
+
+    index = DatasetIndex.load(dataset_path)
+    dimensions = DimensionIndex.load(dataset_path)
+    missing = []
+    no_size = []
+    skipped_existing = 0
+    boxes_written = 0
+    labels_written = 0
+    write_errors = []
+    chunk = []
+    chunk_names = []
+    in_flight = deque()
+    has_project = os.path.exists(os.path.join(dataset_path, "config.json"))
+    dirty = dirty_labels_of(dataset_path) if has_project and not dry_run else None
+
+    def finish_oldest():
+        nonlocal labels_written
+        writes, names, future = in_flight.popleft()
+        errors = future.result()
+        failed = {path for path, _ in errors}
+        write_errors.extend(f"{path}: {error}" for path, error in errors)
+        labels_written += len(writes) - len(failed)
+        # rótulos importados entram no próximo commit do anotador
+        if dirty is not None:
+            dirty.update(name for (path, _), name in zip(writes, names) if path not in failed)
+
+    def submit(writes, names):
+        nonlocal labels_written
+        if dry_run:
+            labels_written += len(writes)
+            return
+        while len(in_flight) >= max(1, max_workers):
+            finish_oldest()
+        in_flight.append((writes, names, pool.submit(atomic_write_many, writes)))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        for image_id, (file_name, width, height) in images.items():
+            if image_id not in groups:
+                continue
+            img_name = os.path.normpath(file_name)
+            if not index.has_image(img_name):
+                missing.append(file_name)
+                continue
+            if index.has_label(img_name) and not overwrite:
+                skipped_existing += 1
+                continue
+            if not width or not height:
+                size = dimensions.size_of(img_name, index.image_stat(img_name))
+                if size is None:
+                    no_size.append(file_name)
+                    continue
+                width, height = size
+            s, e = groups[image_id]
+            x, y, w, h = bboxes[s:e].T
+            # recorta na imagem e descarta as caixas que ficaram sem área
+            x1, y1 = np.clip(x, 0, width), np.clip(y, 0, height)
+            x2, y2 = np.clip(x + w, 0, width), np.clip(y + h, 0, height)
+            valid = (x2 > x1) & (y2 > y1)
+            boxes = np.stack([(x1 + x2) / 2 / width, (y1 + y2) / 2 / height,
+                              (x2 - x1) / width, (y2 - y1) / height], axis=1)[valid]
+            boxes_written += len(boxes)
+            chunk.append((label_path_of(dataset_path, img_name), format_yolo(ann_class[s:e][valid], boxes, precision)))
+            chunk_names.append("labels/" + DatasetIndex.label_name(img_name).replace(os.sep, "/"))
+            if len(chunk) >= chunk_size:
+                submit(chunk, chunk_names)
+                chunk, chunk_names = [], []
+        if chunk:
+            submit(chunk, chunk_names)
+        while in_flight:
+            finish_oldest()
+    dimensions.save()
+
+    return {
+        "classes": list(classes),
+        "coco_images": len(images),
+        "coco_annotations": count,
+        "labels_written": labels_written,
+        "boxes_written": boxes_written,
+        "skipped_existing_labels": skipped_existing,
+        "skipped_crowd": crowd_skipped,
+        "unmapped_categories": dict(unmapped.most_common()),
+        "missing_images": {"count": len(missing), "examples": missing[:max_examples]},
+        "images_without_size": {"count": len(no_size), "examples": no_size[:max_examples]},
+        "write_errors": {"count": len(write_errors), "examples": write_errors[:max_examples]},
+        "dry_run": dry_run,
+    }
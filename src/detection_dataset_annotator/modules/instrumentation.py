@@ -0,0 +1,207 @@
+#!/usr/bin/python3
+import os
+import json
+import math
+import time
+import threading
+import functools
+from collections import deque
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+
+class Tracer:
+    """
+    Instrumentação opcional dos caminhos quentes.
+
+    Desligado (o padrão), span() devolve sempre o mesmo contexto vazio e
+    não mede nada. Depois de start(path), cada span vira um evento no
+    arquivo: uma linha JSON por evento se o caminho terminar em .jsonl,
+    senão um trace do Chrome (array de trace events, aberto em
+    chrome://tracing ou no Perfetto). As últimas `window` durações de cada
+    nome ficam na memória para summary() calcular p50/p95.
+    Pode ser usado de qualquer thread.
+    """
+    def __init__(self, window=500):
+        self.window = window
+        self.enabled = False
+        self.path = ""
+        self._file = None
+        self._chrome = False
+        self._first = True
+        self._threads = set()
+        self._durations = {}
+        self._counts = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._pid = os.getpid()
+
+    def start(self, path):
+        self.stop()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            self.path = path
+            self._chrome = not path.endswith(".jsonl")
+            self._file = open(path, "w", encoding="utf-8")
+            self._first = True
+            self._threads.clear()
+            self._durations.clear()
+            self._counts.clear()
+            self._counters.clear()
+            if self._chrome:
+                self._file.write("[\n")
+            self.enabled = True
+
+    def stop(self):
+        with self._lock:
+            self.enabled = False
+            if self._file is not None:
+                if self._chrome:
+                    self._file.write("\n]\n")
+                self._file.close()
+                self._file = None
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def span(self, name, **args):
+        """
+        Contexto que mede o bloco: with tracer.span("decode", image=nome): ...
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def record(self, name, start, end, args=None):
+        """
+        Registra um intervalo medido com time.perf_counter().
+        """
+        duration = end - start
+        with self._lock:
+            if not self.enabled:
+                return
+            durations = self._durations.get(name)
+            if durations is None:
+                durations = self._durations[name] = deque(maxlen=self.window)
+            durations.append(duration)
+            self._counts[name] = self._counts.get(name, 0) + 1
+            if self._chrome:
+                event = {"name": name, "ph": "X", "ts": round((start - self._t0) * 1e6, 1),
+                         "dur": round(duration * 1e6, 1), "pid": self._pid, "tid": self._thread_id()}
+                if args:
+                    event["args"] = args
+            else:
+                event = {"name": name, "ts_ms": round((start - self._t0) * 1e3, 3),
+                         "dur_ms": round(duration * 1e3, 3), "thread": threading.current_thread().name}
+                if args:
+                    event.update(args)
+            self._write(event)
+
+    def counter(self, name, **values):
+        """
+        Registra valores numéricos (ex.: bytes em memória) num instante.
+        """
+        with self._lock:
+            if not self.enabled:
+                return
+            self._counters[name] = values
+            now = time.perf_counter() - self._t0
+            if self._chrome:
+                event = {"name": name, "ph": "C", "ts": round(now * 1e6, 1), "pid": self._pid, "args": values}
+            else:
+                event = {"name": name, "ts_ms": round(now * 1e3, 3)}
+                event.update(values)
+            self._write(event)
+
+    def _thread_id(self):
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            # metadado do trace do Chrome: nome da thread na linha do tempo
+            self._threads.add(tid)
+            self._write({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid,
+                         "args": {"name": threading.current_thread().name}})
+        return tid
+
+    def _write(self, event):
+        line = json.dumps(event, ensure_ascii=False)
+        if self._chrome:
+            line = ("" if self._first else ",\n") + line
+        else:
+            line += "\n"
+        self._first = False
+        self._file.write(line)
+
+    def summary(self):
+        """
+        {nome: {"count", "p50_ms", "p95_ms"}} das durações recentes.
+        """
+        with self._lock:
+            items = [(name, sorted(d), self._counts[name]) for name, d in self._durations.items()]
+        result = {}
+        for name, durations, count in items:
+            result[name] = {"count": count,
+                            "p50_ms": _percentile(durations, 0.50) * 1e3,
+                            "p95_ms": _percentile(durations, 0.95) * 1e3}
+        return result
+
+    def counters(self):
+        with self._lock:
+            return {name: dict(values) for name, values in self._counters.items()}
+
+
+def _percentile(sorted_values, q):
+    # método do posto mais próximo
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+# instância única do processo, como o logging
+tracer = Tracer()
+
+
+def traced(name=None):
+    """
+    Decorador que mede cada chamada da função com tracer.span(name).
+    O wrapper repassa *args: não conecte a função decorada direto a um
+    sinal Qt com argumentos (o PyQt passaria os argumentos do sinal).
+    """
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with _Span(tracer, label, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
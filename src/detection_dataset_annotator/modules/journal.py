@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+import os
+import json
+
+
+class AnnotationJournal:
+    """
+    Diário append-only das aprovações feitas desde o último config.json.
+
+    Cada linha é um JSON {"key": "images_<user>", "image": ..., "value": ...}.
+    As linhas são escritas na hora, mas o fsync só é feito a cada
+    `batch_size` entradas ou quando sync() é chamado. Depois de salvar o
+    config.json completo o diário deve ser esvaziado com clear().
+    """
+    def __init__(self, path, batch_size=32):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.unsynced = 0
+        self._file = None
+        self._count = None
+
+    def __len__(self):
+        """
+        Número de entradas no diário (inclui as de sessões anteriores).
+        O arquivo só é lido na primeira chamada (ou em replay()); depois a
+        contagem é mantida por append() e zerada por clear().
+        """
+        if self._count is None:
+            if not os.path.exists(self.path):
+                self._count = 0
+            else:
+                with open(self.path, "rb") as f:
+                    self._count = sum(1 for line in f if line.strip())
+        return self._count
+
+    def append(self, key, image, value):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        line = json.dumps({"key": key, "image": image, "value": value}, ensure_ascii=False)
+        self._file.write(line + "\n")
+        self._file.flush()
+        self.unsynced += 1
+        if self._count is not None:
+            self._count += 1
+        if self.unsynced >= self.batch_size:
+            self.sync()
+
+    def sync(self):
+        if self._file is not None and self.unsynced:
+            os.fsync(self._file.fileno())
+            self.unsynced = 0
+
+    def keys(self):
+        """
+        Conjunto das chaves ("images_<user>") que aparecem no diário.
+        """
+        keys = set()
+        if not os.path.exists(self.path):
+            return keys
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    keys.add(json.loads(line).get("key"))
+                except json.JSONDecodeError:
+                    continue
+        return keys
+
+    def replay(self, config):
+        """
+        Aplica as entradas do diário sobre o dicionário config.
+        Uma última linha truncada (queda no meio da escrita) é ignorada.
+        Retorna o número de entradas aplicadas.
+        """
+        if not os.path.exists(self.path):
+            self._count = 0
+            return 0
+        count = 0
+        lines = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    lines += 1
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                key = entry.get("key")
+                if key not in config or not isinstance(config[key], dict):
+                    continue
+                config[key][entry["image"]] = entry["value"]
+                count += 1
+        self._count = lines
+        return count
+
+    def clear(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._count = 0
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
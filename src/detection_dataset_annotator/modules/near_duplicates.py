@@ -0,0 +1,283 @@
+#!/usr/bin/python3
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from detection_dataset_annotator.modules.project_paths import project_cache_dir
+from detection_dataset_annotator.modules.dataset_index import DatasetIndex
+
+ALGORITHMS = ("dhash", "phash")
+
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.reshape(-1).astype(np.uint8)).tobytes(), "big")
+
+
+def dhash(gray):
+    """
+    Hash de diferenças de 64 bits de uma imagem cinza (8, 9): cada bit diz
+    se um pixel é mais claro que o vizinho da direita.
+    """
+    gray = gray.astype(np.int16)
+    return _bits_to_int(gray[:, 1:] > gray[:, :-1])
+
+
+_DCT_32 = None
+
+
+def phash(gray):
+    """
+    Hash perceptual de 64 bits de uma imagem cinza (32, 32): compara as
+    8x8 frequências mais baixas da DCT com a sua mediana (sem o termo DC).
+    """
+    global _DCT_32
+    if _DCT_32 is None:
+        n = np.arange(32)
+        _DCT_32 = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / 64) * np.sqrt(2 / 32)
+        _DCT_32[0] /= np.sqrt(2)
+    low = (_DCT_32 @ gray.astype(np.float64) @ _DCT_32.T)[:8, :8]
+    return _bits_to_int(low > np.median(low.reshape(-1)[1:]))
+
+
+_HASH_INPUT = {"dhash": (9, 8, dhash), "phash": (32, 32, phash)}
+
+
+def _load_gray(path, width, height):
+    """
+    Decodifica a imagem já reduzida para (height, width) em tons de cinza.
+    """
+    from PyQt5.QtCore import QSize
+    from PyQt5.QtGui import QImage, QImageReader
+
+    reader = QImageReader(path)
+    reader.setAutoTransform(True)
+    reader.setScaledSize(QSize(width, height))
+    image = reader.read()
+    if image.isNull():
+        return None
+    if image.width() != width or image.height() != height:
+        image = image.scaled(width, height)
+    image = image.convertToFormat(QImage.Format_Grayscale8)
+    ptr = image.constBits()
+    ptr.setsize(image.bytesPerLine() * height)
+    return np.frombuffer(ptr, np.uint8).reshape(height, image.bytesPerLine())[:, :width].copy()
+
+
+def _hash_chunk(images_path, names, algorithm):
+    """
+    Trabalho de um processo: hash de um lote de imagens (None se ilegível).
+    """
+    width, height, func = _HASH_INPUT[algorithm]
+    results = []
+    for name in names:
+        gray = _load_gray(os.path.join(images_path, name), width, height)
+        results.append((name, None if gray is None else func(gray)))
+    return results
+
+
+class PerceptualHashIndex:
+    """
+    Hashes perceptuais das imagens do dataset em cache.
+
+    Fica em <dataset>/.annotator/<algoritmo>.json; cada entrada guarda o
+    tamanho e o mtime do arquivo e só é recalculada quando eles mudam,
+    então rodadas seguintes só decodificam as imagens novas.
+    """
+    VERSION = 1
+
+    def __init__(self, dataset_path, algorithm="dhash"):
+        if algorithm not in ALGORITHMS:
+            raise ValueError("unknown hash algorithm: " + algorithm)
+        self.dataset_path = dataset_path
+        self.algorithm = algorithm
+        self.cache_path = os.path.join(project_cache_dir(dataset_path), algorithm + ".json")
+        self.entries = {}
+        self.modified = False
+
+    @classmethod
+    def load(cls, dataset_path, algorithm="dhash"):
+        index = cls(dataset_path, algorithm)
+        if os.path.exists(index.cache_path):
+            try:
+                with open(index.cache_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == cls.VERSION:
+                    index.entries = data["images"]
+            except (ValueError, KeyError):
+                pass
+        return index
+
+    def update(self, image_stats, max_workers=None, chunk_size=256, progress=None):
+        """
+        Atualiza o índice para {imagem: (tamanho, mtime_ns)}, calculando num
+        pool de processos só os hashes que faltam. Retorna quantos calculou.
+        """
+        stale = [name for name, stat in image_stats.items()
+                 if tuple(self.entries.get(name, (None, None))[:2]) != tuple(stat)]
+        removed = [name for name in self.entries if name not in image_stats]
+        for name in removed:
+            del self.entries[name]
+
+        images_path = os.path.join(self.dataset_path, "images")
+        chunks = [stale[i:i + chunk_size] for i in range(0, len(stale), chunk_size)]
+        if chunks:
+            with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+                futures = [pool.submit(_hash_chunk, images_path, chunk, self.algorithm) for chunk in chunks]
+                for done, future in enumerate(futures, 1):
+                    for name, value in future.result():
+                        # guardado em hexadecimal: o JSON não tem inteiros de 64 bits
+                        self.entries[name] = list(image_stats[name]) + [None if value is None else f"{value:016x}"]
+                    if progress:
+                        progress(done, len(futures))
+        if stale or removed:
+            self.modified = True
+        return len(stale)
+
+    def hashes(self, names=None):
+        """
+        {imagem: hash inteiro} das imagens (todas ou só `names`) com hash.
+        """
+        names = self.entries if names is None else names
+        return {name: int(self.entries[name][2], 16) for name in names
+                if name in self.entries and self.entries[name][2] is not None}
+
+    def save(self):
+        if not self.modified:
+            return
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "images": self.entries}, f)
+        os.replace(tmp_path, self.cache_path)
+        self.modified = False
+
+
+_POPCOUNT_8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount64(values):
+    """
+    Número de bits 1 de cada elemento de um array uint64.
+    """
+    return _POPCOUNT_8[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def close_pairs(values, radius, bits=64):
+    """
+    Pares (i, j) de values (uint64, sem repetições) a até `radius` bits.
+
+    Multi-index hashing: o hash é cortado em radius+1 pedaços e, pelo
+    princípio da casa dos pombos, dois hashes próximos coincidem em pelo
+    menos um pedaço. Para cada pedaço os valores são ordenados pela chave
+    e só vizinhos com a mesma chave são comparados, tudo vetorizado,
+    em vez das n² comparações.
+    """
+    parts = radius + 1
+    edges = [round(i * bits / parts) for i in range(parts + 1)]
+    found_a, found_b = [], []
+    for start, end in zip(edges[:-1], edges[1:]):
+        keys = (values >> np.uint64(start)) & np.uint64((1 << (end - start)) - 1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        idx = np.arange(len(order))
+        k = 1
+        while len(idx):
+            # ordenado: se a chave de i difere da de i+k, difere da de i+k+1
+            idx = idx[idx + k < len(order)]
+            idx = idx[sorted_keys[idx] == sorted_keys[idx + k]]
+            a, b = order[idx], order[idx + k]
+            close = popcount64(values[a] ^ values[b]) <= radius
+            found_a.append(a[close])
+            found_b.append(b[close])
+            k += 1
+    if not found_a:
+        return np.zeros((0, 2), dtype=np.int64)
+    pairs = np.stack([np.concatenate(found_a), np.concatenate(found_b)], axis=1)
+    return np.unique(np.sort(pairs, axis=1), axis=0)
+
+
+def find_near_duplicates(hashes, max_distance=4):
+    """
+    Agrupa as imagens {imagem: hash} cujos hashes diferem em até
+    max_distance bits (fecho transitivo, via union-find). Retorna os
+    grupos com mais de uma imagem, cada um ordenado, o primeiro é o
+    representante.
+    """
+    names = sorted(hashes)
+    if not names:
+        return []
+    # hashes idênticos entram uma só vez no índice
+    values, inverse = np.unique(np.array([hashes[n] for n in names], dtype=np.uint64), return_inverse=True)
+    parent = list(range(len(values)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in close_pairs(values, max_distance).tolist():
+        a, b = find(a), find(b)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    groups = {}
+    for name, value_id in zip(names, inverse.tolist()):
+        groups.setdefault(find(value_id), []).append(name)
+    return sorted((g for g in groups.values() if len(g) > 1), key=lambda g: g[0])
+
+
+def collapse_duplicates(images, groups):
+    """
+    Troca cada grupo de quase duplicatas pelo seu representante.
+    Retorna (imagens restantes, {representante: [outras imagens do grupo]}).
+    """
+    members = {group[0]: group[1:] for group in groups}
+    dropped = {name for group in groups for name in group[1:]}
+    return [img for img in images if img not in dropped], members
+
+
+def expand_duplicates(images_per_user, members):
+    """
+    Põe as outras imagens de cada grupo com o usuário do seu representante.
+    """
+    for user, images in images_per_user.items():
+        expanded = []
+        for img in images:
+            expanded.append(img)
+            expanded.extend(members.get(img, ()))
+        images_per_user[user] = expanded
+    return images_per_user
+
+
+def near_duplicate_groups(dataset_path, images, dataset_index, valid_exts, algorithm="dhash", max_distance=4,
+                          max_workers=None, progress=None):
+    """
+    Atualiza o cache de hashes para as imagens do dataset (extensões em
+    valid_exts) e retorna os grupos de quase duplicatas entre `images`.
+    """
+    ext_set = {ext.lower() for ext in valid_exts}
+    stats = {name: stat for name, stat in dataset_index.images.items()
+             if os.path.splitext(name)[1].lower() in ext_set}
+    index = PerceptualHashIndex.load(dataset_path, algorithm)
+    index.update(stats, max_workers=max_workers, progress=progress)
+    index.save()
+    return find_near_duplicates(index.hashes(images), max_distance)
+
+
+def dedupe_images(dataset_path, images, valid_exts, mode, algorithm="dhash", max_distance=4,
+                  max_workers=None, progress=None):
+    """
+    Prepara a lista de imagens para a atribuição conforme o modo:
+      "exclude"   -> só o representante de cada grupo é atribuído;
+      "same-user" -> os representantes são atribuídos e depois
+                     expand_duplicates() põe o grupo com o mesmo usuário.
+    Retorna (imagens, {representante: outras}, grupos).
+    """
+    if mode not in ("exclude", "same-user"):
+        raise ValueError("unknown near-duplicate mode: " + mode)
+    groups = near_duplicate_groups(dataset_path, images, DatasetIndex.load(dataset_path), valid_exts,
+                                   algorithm, max_distance, max_workers, progress)
+    images, members = collapse_duplicates(images, groups)
+    return images, (members if mode == "same-user" else {}), groups
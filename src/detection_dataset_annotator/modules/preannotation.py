@@ -0,0 +1,343 @@
+#!/usr/bin/python3
+import os
+import json
+import hashlib
+import importlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from detection_dataset_annotator.modules.yolo_labels import YoloLabels, empty_labels
+from detection_dataset_annotator.modules.dataset_index import DatasetIndex
+from detection_dataset_annotator.modules.project_paths import proposals_path_of, discard_proposals
+from detection_dataset_annotator.modules.write_queue import atomic_write
+from detection_dataset_annotator.modules.project_store import open_project_store
+
+# classes: int (N,); boxes: (N, 4) com cx, cy, w, h normalizados; scores: (N,)
+Proposals = namedtuple("Proposals", ["classes", "boxes", "scores"])
+
+
+# -------------------------------
+# Detectores
+# -------------------------------
+class StubDetector:
+    """
+    Detector de teste, sem modelo: propõe de 1 a 3 caixas por imagem,
+    sempre as mesmas para o mesmo conteúdo.
+    """
+    input_size = 64
+
+    def __init__(self, num_classes=1):
+        self.num_classes = max(1, num_classes)
+
+    def __call__(self, images):
+        results = []
+        for image in images:
+            seed = int.from_bytes(hashlib.blake2b(image.tobytes(), digest_size=8).digest(), "big")
+            rng = np.random.default_rng(seed)
+            n = int(rng.integers(1, 4))
+            wh = rng.uniform(0.1, 0.4, size=(n, 2))
+            centers = rng.uniform(wh / 2, 1 - wh / 2)
+            results.append(Proposals(rng.integers(0, self.num_classes, size=n).astype(np.int32),
+                                     np.hstack([centers, wh]).astype(np.float32),
+                                     rng.uniform(0.3, 1.0, size=n).astype(np.float32)))
+        return results
+
+
+def _nms(boxes, scores, iou_threshold):
+    # supressão não máxima gulosa sobre caixas (x1, y1, x2, y2)
+    order = np.argsort(-scores)
+    keep = []
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    while len(order):
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        x1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        y1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        x2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        y2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        iou = inter / np.maximum(area[i] + area[rest] - inter, 1e-9)
+        order = rest[iou < iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+class OnnxDetector:
+    """
+    Modelo ONNX estilo YOLO executado na CPU pelo onnxruntime.
+
+    A entrada é (B, 3, S, S) em RGB 0-1 com letterbox; a saída pode ser
+    (B, N, 5+C) (cx, cy, w, h, objetividade, classes) ou (B, 4+C, N)
+    (cx, cy, w, h, classes), em pixels da entrada.
+    """
+    def __init__(self, model_path, input_size=640, conf_threshold=0.25, iou_threshold=0.45, threads=1):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError("onnxruntime is not installed: pip install onnxruntime")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads  # um processo por núcleo já paraleliza
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_size = input_size
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+
+    def _letterbox(self, image):
+        h, w = image.shape[:2]
+        s = self.input_size
+        scale = min(s / w, s / h)
+        nw, nh = max(1, round(w * scale)), max(1, round(h * scale))
+        # redimensionamento por vizinho mais próximo, suficiente para a detecção
+        ys = (np.arange(nh) / scale).astype(np.int64).clip(0, h - 1)
+        xs = (np.arange(nw) / scale).astype(np.int64).clip(0, w - 1)
+        canvas = np.full((s, s, 3), 114, dtype=np.uint8)
+        dx, dy = (s - nw) // 2, (s - nh) // 2
+        canvas[dy:dy + nh, dx:dx + nw] = image[ys][:, xs]
+        return canvas, scale, dx, dy
+
+    def __call__(self, images):
+        batch = []
+        geometry = []
+        for image in images:
+            canvas, scale, dx, dy = self._letterbox(image)
+            batch.append(canvas.transpose(2, 0, 1))
+            geometry.append((scale, dx, dy, image.shape[1], image.shape[0]))
+        output = self.session.run(None, {self.input_name: np.stack(batch).astype(np.float32) / 255.0})[0]
+        if output.shape[1] < output.shape[2]:
+            output = output.transpose(0, 2, 1)  # (B, 4+C, N) -> (B, N, 4+C)
+            has_objectness = False
+        else:
+            has_objectness = True
+
+        results = []
+        for pred, (scale, dx, dy, w, h) in zip(output, geometry):
+            class_scores = pred[:, 5:] * pred[:, 4:5] if has_objectness else pred[:, 4:]
+            classes = class_scores.argmax(axis=1)
+            scores = class_scores[np.arange(len(classes)), classes]
+            keep = scores >= self.conf_threshold
+            pred, classes, scores = pred[keep], classes[keep], scores[keep]
+            xyxy = np.stack([(pred[:, 0] - pred[:, 2] / 2 - dx) / scale, (pred[:, 1] - pred[:, 3] / 2 - dy) / scale,
+                             (pred[:, 0] + pred[:, 2] / 2 - dx) / scale, (pred[:, 1] + pred[:, 3] / 2 - dy) / scale],
+                            axis=1)
+            xyxy = np.clip(xyxy, 0, [w, h, w, h])
+            # NMS por classe: desloca as caixas de cada classe para não se sobreporem
+            offset = classes[:, None] * (max(w, h) + 1)
+            keep = _nms(xyxy + offset, scores, self.iou_threshold)
+            xyxy, classes, scores = xyxy[keep], classes[keep], scores[keep]
+            boxes = np.stack([(xyxy[:, 0] + xyxy[:, 2]) / 2 / w, (xyxy[:, 1] + xyxy[:, 3]) / 2 / h,
+                              (xyxy[:, 2] - xyxy[:, 0]) / w, (xyxy[:, 3] - xyxy[:, 1]) / h], axis=1)
+            results.append(Proposals(classes.astype(np.int32), boxes.astype(np.float32), scores.astype(np.float32)))
+        return results
+
+
+# opções do spec "onnx:" -> (argumento do OnnxDetector, tipo)
+ONNX_OPTIONS = {"size": ("input_size", int), "conf": ("conf_threshold", float), "iou": ("iou_threshold", float)}
+
+
+def parse_onnx_spec(target):
+    """
+    "<modelo.onnx>[,size=S][,conf=C][,iou=I]" -> (modelo, {argumento: valor}).
+    As opções são lidas do fim, então uma vírgula no caminho do modelo não
+    atrapalha; a última ocorrência de uma opção prevalece.
+    """
+    model, options = target, {}
+    while True:
+        head, sep, option = model.rpartition(",")
+        key, eq, value = option.partition("=")
+        if not sep or not eq or key not in ONNX_OPTIONS:
+            return model, options
+        name, cast = ONNX_OPTIONS[key]
+        try:
+            options.setdefault(name, cast(value))
+        except ValueError:
+            raise ValueError("invalid onnx option: " + option)
+        model = head
+
+
+def load_detector(spec, num_classes):
+    """
+    Cria o detector descrito por spec:
+      "stub"                -> StubDetector
+      "onnx:<modelo.onnx>"  -> OnnxDetector; aceita ",size=S", ",conf=C" e
+                               ",iou=I" depois do modelo (ver parse_onnx_spec)
+      "<módulo>:<nome>"     -> qualquer chamável images -> [Proposals, ...]
+                               (uma classe é instanciada sem argumentos)
+    """
+    if spec == "stub":
+        return StubDetector(num_classes)
+    kind, sep, target = spec.partition(":")
+    if not sep or not target:
+        raise ValueError("invalid detector: " + spec)
+    if kind == "onnx":
+        model, options = parse_onnx_spec(target)
+        return OnnxDetector(model, **options)
+    detector = getattr(importlib.import_module(kind), target)
+    return detector() if isinstance(detector, type) else detector
+
+
+# -------------------------------
+# Cache de propostas
+# -------------------------------
+def read_proposals(dataset_path, img_name, num_classes=None, stat=None, min_score=0.0):
+    """
+    Propostas em cache da imagem como YoloLabels (vazio se não houver).
+    Com stat (tamanho, mtime_ns), propostas de uma versão anterior da
+    imagem são ignoradas.
+    """
+    try:
+        with open(proposals_path_of(dataset_path, img_name), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return empty_labels()
+    if stat is not None and tuple(data.get("stat", ())) != tuple(stat):
+        return empty_labels()
+    classes = np.asarray(data["classes"], dtype=np.int32).reshape(-1)
+    boxes = np.asarray(data["boxes"], dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(data["scores"], dtype=np.float32).reshape(-1)
+    keep = (scores >= min_score) & (classes >= 0)
+    if num_classes is not None:
+        keep &= classes < num_classes
+    return YoloLabels(classes[keep], boxes[keep], [])
+
+
+def _write_proposals(dataset_path, img_name, stat, detector_spec, proposals):
+    path = proposals_path_of(dataset_path, img_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_write(path, json.dumps({
+        "stat": list(stat),
+        "detector": detector_spec,
+        "classes": proposals.classes.tolist(),
+        "boxes": np.round(proposals.boxes.astype(np.float64), 6).tolist(),
+        "scores": np.round(proposals.scores.astype(np.float64), 4).tolist(),
+    }))
+
+
+def _cached_detector(dataset_path, img_name, stat):
+    try:
+        with open(proposals_path_of(dataset_path, img_name), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data.get("detector") if tuple(data.get("stat", ())) == tuple(stat) else None
+
+
+# -------------------------------
+# Inferência em lotes num pool de processos
+# -------------------------------
+_worker_detector = None
+
+
+def _init_worker(detector_spec, num_classes):
+    global _worker_detector
+    _worker_detector = load_detector(detector_spec, num_classes)
+
+
+def _load_rgb(path, max_side=None):
+    """
+    Decodifica a imagem num array (H, W, 3) uint8, reduzida já na
+    decodificação quando max_side é dado.
+    """
+    from PyQt5.QtCore import Qt, QSize
+    from PyQt5.QtGui import QImage, QImageReader
+
+    reader = QImageReader(path)
+    reader.setAutoTransform(True)
+    size = reader.size()
+    if max_side and size.isValid() and max(size.width(), size.height()) > max_side:
+        reader.setScaledSize(size.scaled(QSize(max_side, max_side), Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return None
+    image = image.convertToFormat(QImage.Format_RGB888)
+    w, h = image.width(), image.height()
+    ptr = image.constBits()
+    ptr.setsize(image.bytesPerLine() * h)
+    return np.frombuffer(ptr, np.uint8).reshape(h, image.bytesPerLine())[:, :w * 3].reshape(h, w, 3).copy()
+
+
+def _detect_batch(dataset_path, names, num_classes):
+    """
+    Trabalho de um processo: decodifica um lote e roda o detector uma vez.
+    Retorna [(imagem, Proposals ou None), ...].
+    """
+    max_side = getattr(_worker_detector, "input_size", None)
+    images = []
+    loaded = []
+    for name in names:
+        image = _load_rgb(os.path.join(dataset_path, "images", name), max_side)
+        if image is not None:
+            images.append(image)
+            loaded.append(name)
+    results = dict.fromkeys(names)
+    if images:
+        for name, p in zip(loaded, _worker_detector(images)):
+            classes = np.asarray(p.classes, dtype=np.int32).reshape(-1)
+            keep = (classes >= 0) & (classes < num_classes)
+            results[name] = Proposals(classes[keep], np.asarray(p.boxes, np.float32).reshape(-1, 4)[keep],
+                                      np.asarray(p.scores, np.float32).reshape(-1)[keep])
+    return list(results.items())
+
+
+def preannotate(dataset_path, detector_spec, backend="json", users=None, batch_size=8, max_workers=None,
+                overwrite=False, progress=None):
+    """
+    Gera propostas para as imagens pendentes (images_<user> não
+    aprovadas) que ainda não têm rótulo em labels/.
+
+    As imagens são divididas em lotes de batch_size e cada lote roda uma
+    inferência num pool de processos, cada um com o seu detector. As
+    propostas vão para <dataset>/.annotator/proposals/<imagem>.json e
+    nunca para labels/. Imagens com propostas do mesmo detector e da
+    mesma versão do arquivo são puladas, a menos que overwrite.
+    Retorna {"images": ..., "skipped": ..., "failed": [...], "boxes": ...}.
+    """
+    store = open_project_store(dataset_path, backend=backend)
+    try:
+        num_classes = len(store.classes)
+        unknown = [u for u in (users or []) if u not in store.users()]
+        if unknown:
+            raise ValueError("unknown users: " + ", ".join(unknown))
+        todo = []
+        for user in (users or store.users()):
+            todo.extend(image for image, _ in store.images(user, approved=False))
+    finally:
+        store.close()
+
+    # carregado uma vez aqui para que um detector inválido falhe antes do pool
+    load_detector(detector_spec, num_classes)
+
+    index = DatasetIndex.load(dataset_path)
+    names = []
+    skipped = 0
+    for name in dict.fromkeys(todo):
+        stat = index.image_stat(name)
+        if stat is None or index.has_label(name):
+            skipped += 1
+        elif not overwrite and _cached_detector(dataset_path, name, stat) == detector_spec:
+            skipped += 1
+        else:
+            names.append(name)
+
+    batches = [names[i:i + batch_size] for i in range(0, len(names), batch_size)]
+    failed = []
+    boxes = 0
+    done = 0
+    if batches:
+        workers = max(1, min(max_workers or os.cpu_count(), len(batches)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(detector_spec, num_classes)) as pool:
+            futures = [pool.submit(_detect_batch, dataset_path, batch, num_classes) for batch in batches]
+            for future in futures:
+                for name, proposals in future.result():
+                    if proposals is None:
+                        failed.append(name)
+                        continue
+                    _write_proposals(dataset_path, name, index.image_stat(name), detector_spec, proposals)
+                    boxes += len(proposals.classes)
+                done += 1
+                if progress:
+                    progress(done, len(batches))
+    return {"images": len(names) - len(failed), "skipped": skipped, "failed": failed, "boxes": boxes}
@@ -0,0 +1,272 @@
+#!/usr/bin/python3
+import os
+import random
+import hashlib
+import datetime
+from bisect import bisect_right
+from itertools import accumulate
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+
+from detection_dataset_annotator.modules.project_store import (
+    USER_PREFIX, SqliteProjectStore, write_config_json, write_sharded_project, open_project_store)
+from detection_dataset_annotator.modules.dataset_index import DatasetIndex
+
+
+def _scan_one(images_path, rel, ext_set):
+    """
+    Varre um único diretório; retorna (imagens, subdiretórios), relativos a images/.
+    """
+    files = []
+    dirs = []
+    path = os.path.join(images_path, rel) if rel else images_path
+    with os.scandir(path) as entries:
+        for entry in entries:
+            name = os.path.join(rel, entry.name) if rel else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(name)
+            elif os.path.splitext(entry.name)[1].lower() in ext_set and entry.is_file():
+                files.append(name)
+    return files, dirs
+
+
+def iter_images(images_path, valid_exts, max_workers=8, progress=None):
+    """
+    Gera as imagens de images_path (recursivo) à medida que são encontradas,
+    com os.scandir, um diretório por tarefa num pool de threads.
+    progress(imagens, diretórios) é chamado a cada lote de diretórios concluído.
+    """
+    ext_set = {ext.lower() for ext in valid_exts}
+    n_images = 0
+    n_dirs = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        pending = {pool.submit(_scan_one, images_path, "", ext_set)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, dirs = future.result()
+                # enfileira os subdiretórios antes de entregar as imagens
+                pending.update(pool.submit(_scan_one, images_path, d, ext_set) for d in dirs)
+                n_images += len(files)
+                n_dirs += 1
+                yield from files
+            if progress:
+                progress(n_images, n_dirs)
+
+
+def scan_images(images_path, valid_exts, max_workers=8, progress=None):
+    """
+    Lista ordenada das imagens de images_path (ver iter_images).
+    """
+    images = list(iter_images(images_path, valid_exts, max_workers, progress))
+    # a ordem de término das threads não deve influenciar o projeto
+    images.sort()
+    return images
+
+
+def iter_manifest(manifest_path, images_path, valid_exts):
+    """
+    Gera as imagens de uma lista pré-calculada (um caminho por linha,
+    relativo a images/ ou absoluto dentro dele), sem varrer o disco.
+    """
+    ext_set = {ext.lower() for ext in valid_exts}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            name = line.strip()
+            if not name:
+                continue
+            if os.path.isabs(name):
+                name = os.path.relpath(name, images_path)
+            name = os.path.normpath(name)
+            if os.path.splitext(name)[1].lower() in ext_set:
+                yield name
+
+
+def distribute_images(all_images, users, proportions):
+    """
+    Distribui as imagens (embaralhadas) entre os usuários conforme as
+    proporções; as sobras vão uma a uma para cada usuário, em ordem.
+    """
+    all_images = list(all_images)
+    random.shuffle(all_images)
+    total_prop = sum(proportions)
+    images_per_user = {user: [] for user in users}
+    start_idx = 0
+    for user, prop in zip(users, proportions):
+        count = int(len(all_images) * prop / total_prop)
+        images_per_user[user] = all_images[start_idx:start_idx+count]
+        start_idx += count
+    # Ajustar possíveis imagens restantes
+    remaining = all_images[start_idx:]
+    for i, img in enumerate(remaining):
+        images_per_user[users[i % len(users)]].append(img)
+    return images_per_user
+
+
+class HashAssigner:
+    """
+    Atribuição determinística: cada imagem cai no balde de um usuário
+    conforme um hash estável do seu caminho relativo e da semente do
+    projeto. Não depende das outras imagens, então pode ser feita em
+    fluxo, durante a varredura, e dá o mesmo resultado em toda execução.
+    """
+    def __init__(self, users, proportions, seed):
+        total = float(sum(proportions))
+        if total <= 0:
+            raise ValueError("the sum of the proportions must be positive")
+        self.users = list(users)
+        self.proportions = list(proportions)
+        self.seed = str(seed)
+        self.cumulative = list(accumulate(p / total for p in proportions))
+
+    def fraction(self, img_name):
+        """
+        Hash do caminho (com "/" em qualquer sistema) mapeado em [0, 1).
+        """
+        key = f"{self.seed}\0{img_name.replace(os.sep, '/')}".encode("utf-8")
+        digest = hashlib.blake2b(key, digest_size=8).digest()
+        return int.from_bytes(digest, "big") / 2.0**64
+
+    def assign(self, img_name):
+        idx = bisect_right(self.cumulative, self.fraction(img_name))
+        return self.users[min(idx, len(self.users) - 1)]
+
+    def header(self):
+        """
+        Chaves gravadas no config.json para que novas imagens possam ser
+        atribuídas depois com as mesmas regras.
+        """
+        return {"assignment": "hash", "assignment_seed": self.seed,
+                "assignment_proportions": dict(zip(self.users, self.proportions))}
+
+    @classmethod
+    def from_header(cls, header):
+        """
+        Recria o HashAssigner de um projeto, ou None se ele não usa hash.
+        """
+        if header.get("assignment") != "hash":
+            return None
+        proportions = header["assignment_proportions"]
+        return cls(list(proportions), list(proportions.values()), header["assignment_seed"])
+
+
+def assign_by_hash(images, assigner):
+    """
+    Consome um iterável de imagens (ex.: iter_images) e retorna {usuário: [imagens]}.
+    """
+    images_per_user = {user: [] for user in assigner.users}
+    for img in images:
+        images_per_user[assigner.assign(img)].append(img)
+    return images_per_user
+
+
+def write_project(dataset_path, classes, classes_colors, images_per_user,
+                  sharded=False, backend="json", birth_date=None, extra_header=None):
+    """
+    Escreve labels/, config.json (ou manifesto + shards) e README.md do projeto.
+    extra_header são chaves adicionais do cabeçalho (ex.: HashAssigner.header()).
+    Retorna o dicionário de cabeçalho gravado.
+    """
+    os.makedirs(os.path.join(dataset_path, "labels"), exist_ok=True)
+
+    header = {
+        "classes": classes,
+        "classes_colors": classes_colors,
+        "birth_date": birth_date or datetime.datetime.now().isoformat(timespec="seconds")
+    }
+    header.update(extra_header or {})
+    from natsort import natsorted
+
+    assignments = {user: {img: False for img in natsorted(imgs)}
+                   for user, imgs in images_per_user.items()}
+
+    if sharded:
+        write_sharded_project(dataset_path, header, assignments)
+    else:
+        write_config_json(os.path.join(dataset_path, "config.json"), header,
+                          [(user, assignment.items()) for user, assignment in assignments.items()])
+        # Índice SQLite local (o config.json continua sendo o arquivo do Git)
+        if backend == "sqlite":
+            config_data = dict(header)
+            config_data.update((USER_PREFIX + user, a) for user, a in assignments.items())
+            SqliteProjectStore.create(dataset_path, config_data).close()
+
+    # Crio readme se nao existe
+    with open(os.path.join(dataset_path, "README.md"), "a"):
+        pass
+    return header
+
+
+def git_initial_commit(dataset_path, git_url, message, remote_name="origin", sharded=False):
+    """
+    Faz o commit inicial do projeto e envia para o repositório remoto.
+    Levanta GitCommandError em caso de falha.
+    """
+    from git import Repo
+
+    if not os.path.exists(os.path.join(dataset_path, ".git")):
+        repo = Repo.init(dataset_path)
+    else:
+        repo = Repo(dataset_path)
+    repo.git.add("labels")
+    repo.git.add("config.json")
+    repo.git.add("README.md")
+    if sharded:
+        repo.git.add("assignments")
+    repo.index.commit(message)
+
+    try:
+        origin = repo.remote(name=remote_name)
+        origin.set_url(git_url)
+    except ValueError:
+        origin = repo.create_remote(remote_name, git_url)
+
+    origin.push(refspec='master:master')
+
+
+def ingest_images(dataset_path, valid_exts, proportions=None, backend="json", dry_run=False):
+    """
+    Registra num projeto existente as imagens de images/ que ainda não foram
+    atribuídas a ninguém, sem tocar nas atribuições e aprovações existentes.
+
+    A listagem vem do DatasetIndex em cache (só diretórios alterados são
+    revarridos). Projetos criados com hash usam as mesmas regras; nos
+    demais as imagens novas são sorteadas conforme `proportions`
+    ({usuário: proporção}) ou, na falta delas, conforme o tamanho atual da
+    lista de cada usuário. Retorna {usuário: [imagens novas]}.
+    """
+    from natsort import natsorted
+
+    ext_set = {ext.lower() for ext in valid_exts}
+    store = open_project_store(dataset_path, backend=backend)
+    try:
+        index = DatasetIndex.load(dataset_path)
+        assigned = store.assigned_images()
+        new_images = sorted(name for name in index.images
+                            if os.path.splitext(name)[1].lower() in ext_set and name not in assigned)
+        if not new_images:
+            return {}
+
+        assigner = HashAssigner.from_header(store.header())
+        if proportions:
+            users = list(proportions)
+            if assigner is not None:
+                assigner = HashAssigner(users, list(proportions.values()), assigner.seed)
+        else:
+            users = store.users()
+            proportions = {user: store.count(user) or 1 for user in users}
+
+        if assigner is not None:
+            images_per_user = assign_by_hash(new_images, assigner)
+        else:
+            images_per_user = distribute_images(new_images, users, [proportions[u] for u in users])
+
+        if not dry_run:
+            for user, imgs in images_per_user.items():
+                if imgs:
+                    store.add_images(user, natsorted(imgs))
+            store.save()
+        return images_per_user
+    finally:
+        store.close()
@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+import os
+
+CACHE_DIRNAME = ".annotator"
+PROPOSALS_DIRNAME = "proposals"
+
+def label_path_of(dataset_path, img_name):
+    """
+    Retorna o caminho do arquivo YOLO .txt correspondente a uma imagem.
+    """
+    nome_base, _ = os.path.splitext(img_name)
+    return os.path.join(dataset_path, "labels", nome_base + ".txt")
+
+def project_cache_dir(dataset_path, *parts):
+    """
+    Retorna (e cria) um diretório de cache local dentro do dataset.
+    O diretório contém um .gitignore para nunca ser enviado ao Git.
+    """
+    base = os.path.join(dataset_path, CACHE_DIRNAME)
+    if not os.path.isdir(base):
+        os.makedirs(base, exist_ok=True)
+        with open(os.path.join(base, ".gitignore"), "w") as f:
+            f.write("*\n")
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def proposals_path_of(dataset_path, img_name):
+    """
+    Retorna o caminho do arquivo com as propostas do pré-anotador de uma imagem.
+    """
+    return os.path.join(dataset_path, CACHE_DIRNAME, PROPOSALS_DIRNAME, os.path.splitext(img_name)[0] + ".json")
+
+def discard_proposals(dataset_path, img_name):
+    """
+    Remove as propostas da imagem (depois de revisada e aprovada).
+    """
+    try:
+        os.remove(proposals_path_of(dataset_path, img_name))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,543 @@
+#!/usr/bin/python3
+import os
+import json
+import time
+import sqlite3
+
+from detection_dataset_annotator.modules.journal import AnnotationJournal
+from detection_dataset_annotator.modules.project_paths import project_cache_dir
+from detection_dataset_annotator.modules.write_queue import atomic_write
+
+USER_PREFIX = "images_"
+ASSIGNMENTS_DIR = "assignments"
+LAYOUT_SHARDED = "sharded"
+
+
+def config_users(config):
+    """
+    Lista os usuários de um dicionário no formato do config.json.
+    """
+    return [key[len(USER_PREFIX):] for key in config if key.startswith(USER_PREFIX)]
+
+
+def write_config_json(path, header, user_rows):
+    """
+    Escreve um config.json no formato do projeto sem montar o documento
+    inteiro na memória.
+
+    header é um dicionário com as chaves gerais (classes, cores, ...) e
+    user_rows uma lista de (user, iterável de (imagem, aprovado)).
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("{")
+        first = True
+        for key, value in header.items():
+            if key.startswith(USER_PREFIX):
+                continue
+            body = json.dumps(value, indent=4, ensure_ascii=False).replace("\n", "\n    ")
+            f.write(("\n" if first else ",\n") + f"    {json.dumps(key)}: {body}")
+            first = False
+        for user, rows in user_rows:
+            f.write(("\n" if first else ",\n") + f"    {json.dumps(USER_PREFIX + user)}: {{")
+            first = False
+            first_row = True
+            for image, approved in rows:
+                f.write(("\n" if first_row else ",\n") +
+                        f"        {json.dumps(image, ensure_ascii=False)}: {'true' if approved else 'false'}")
+                first_row = False
+            f.write("}" if first_row else "\n    }")
+        f.write("\n}" if not first else "}")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def shard_relpath(user):
+    """
+    Caminho, relativo ao dataset, do arquivo de atribuições do usuário.
+    """
+    return f"{ASSIGNMENTS_DIR}/{user}.json"
+
+
+def is_sharded_project(dataset_path):
+    """
+    True se o projeto guarda as atribuições num arquivo por usuário.
+    O config.json só é lido quando existe o diretório de atribuições.
+    """
+    if not os.path.isdir(os.path.join(dataset_path, ASSIGNMENTS_DIR)):
+        return False
+    with open(os.path.join(dataset_path, "config.json"), "r") as f:
+        return json.load(f).get("layout") == LAYOUT_SHARDED
+
+
+def write_assignment_json(path, assignment):
+    atomic_write(path, json.dumps(assignment, indent=4, ensure_ascii=False))
+
+
+def write_sharded_project(dataset_path, header, assignments):
+    """
+    Escreve um projeto em shards: o config.json vira um manifesto pequeno
+    (classes, cores, lista de usuários) e cada usuário tem o seu
+    assignments/<user>.json no formato {imagem: aprovado}.
+    """
+    os.makedirs(os.path.join(dataset_path, ASSIGNMENTS_DIR), exist_ok=True)
+    manifest = {k: v for k, v in header.items() if not k.startswith(USER_PREFIX)}
+    manifest["layout"] = LAYOUT_SHARDED
+    manifest["users"] = list(assignments)
+    for user, assignment in assignments.items():
+        write_assignment_json(os.path.join(dataset_path, shard_relpath(user)), assignment)
+    atomic_write(os.path.join(dataset_path, "config.json"), json.dumps(manifest, indent=4))
+
+
+class ProjectStore:
+    """
+    Interface comum aos backends que guardam as atribuições do projeto.
+    """
+    classes = []
+    classes_colors = []
+    sharded = False
+
+    def users(self):
+        raise NotImplementedError
+
+    def count(self, user, approved=None):
+        raise NotImplementedError
+
+    def images(self, user, approved=None, offset=0, limit=None):
+        """
+        Retorna [(imagem, aprovado), ...] do usuário, na ordem do projeto.
+        """
+        raise NotImplementedError
+
+    def set_approved(self, user, image, value=True):
+        raise NotImplementedError
+
+    def user_assignment(self, user):
+        return {image: approved for image, approved in self.images(user)}
+
+    def header(self):
+        """
+        Chaves gerais do projeto (classes, cores, regras de atribuição, ...).
+        """
+        return {"classes": self.classes, "classes_colors": self.classes_colors}
+
+    def assigned_images(self):
+        """
+        Conjunto de todas as imagens já atribuídas a algum usuário.
+        """
+        return {image for user in self.users() for image, _ in self.images(user)}
+
+    def add_images(self, user, images):
+        """
+        Acrescenta imagens novas (não aprovadas) ao fim da lista do usuário,
+        criando o usuário se preciso. Persistido no próximo save().
+        """
+        raise NotImplementedError
+
+    def sync(self):
+        pass
+
+    def save(self):
+        """
+        Consolida as alterações pendentes no config.json. Retorna True se ok.
+        """
+        return True
+
+    def mark_saved(self):
+        """
+        Informa que o config.json acabou de ser escrito por fora (ex.: commit).
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonProjectStore(ProjectStore):
+    """
+    Backend original: o config.json inteiro na memória, com as aprovações
+    registradas num AnnotationJournal até o próximo save().
+    """
+    def __init__(self, dataset_path, journal_batch_size=32):
+        self.config_path = os.path.join(dataset_path, "config.json")
+        with open(self.config_path, "r") as f:
+            self.config = json.load(f)
+        self.classes = self.config.get("classes", [])
+        self.classes_colors = self.config.get("classes_colors", [])
+        self.modified = False
+
+        # reaplica aprovações que não chegaram ao config.json (ex.: queda do programa)
+        self.journal = AnnotationJournal(os.path.join(project_cache_dir(dataset_path), "journal.jsonl"),
+                                         batch_size=journal_batch_size)
+        self.journal.replay(self.config)
+
+    def users(self):
+        return config_users(self.config)
+
+    def count(self, user, approved=None):
+        data = self.config.get(USER_PREFIX + user, {})
+        if approved is None:
+            return len(data)
+        return sum(1 for value in data.values() if bool(value) == approved)
+
+    def images(self, user, approved=None, offset=0, limit=None):
+        data = self.config.get(USER_PREFIX + user, {})
+        rows = [(img, value) for img, value in data.items() if approved is None or bool(value) == approved]
+        end = None if limit is None else offset + limit
+        return rows[offset:end]
+
+    def set_approved(self, user, image, value=True):
+        self.config[USER_PREFIX + user][image] = value
+        self.journal.append(USER_PREFIX + user, image, value)
+
+    def user_assignment(self, user):
+        return self.config.get(USER_PREFIX + user, {}).copy()
+
+    def header(self):
+        return {k: v for k, v in self.config.items() if not k.startswith(USER_PREFIX)}
+
+    def add_images(self, user, images):
+        data = self.config.setdefault(USER_PREFIX + user, {})
+        for image in images:
+            data.setdefault(image, False)
+        self.modified = True
+
+    def sync(self):
+        self.journal.sync()
+
+    def save(self):
+        if len(self.journal) == 0 and not self.modified:
+            return True
+        atomic_write(self.config_path, json.dumps(self.config, indent=4, ensure_ascii=False))
+        self.journal.clear()
+        self.modified = False
+        return True
+
+    def mark_saved(self):
+        self.journal.clear()
+
+    def close(self):
+        self.journal.close()
+
+
+class ShardedProjectStore(ProjectStore):
+    """
+    Backend de projetos em shards: o config.json é só o manifesto e as
+    atribuições de cada usuário ficam em assignments/<user>.json.
+
+    Os shards são lidos sob demanda, então um anotador só carrega (e só
+    reescreve no save) o próprio arquivo. As aprovações passam pelo mesmo
+    AnnotationJournal do backend json.
+    """
+    sharded = True
+
+    def __init__(self, dataset_path, journal_batch_size=32):
+        self.dataset_path = dataset_path
+        with open(os.path.join(dataset_path, "config.json"), "r") as f:
+            self.manifest = json.load(f)
+        self.classes = self.manifest.get("classes", [])
+        self.classes_colors = self.manifest.get("classes_colors", [])
+        self.config = {}
+        self.modified = set()
+        self.manifest_modified = False
+
+        self.journal = AnnotationJournal(os.path.join(project_cache_dir(dataset_path), "journal.jsonl"),
+                                         batch_size=journal_batch_size)
+        if len(self.journal):
+            # recuperação após queda: reaplica sobre os shards dos usuários que
+            # aparecem no diário e só esses são marcados para salvar
+            keys = self.journal.keys()
+            replayed = [user for user in self.users() if USER_PREFIX + user in keys]
+            for user in replayed:
+                self._shard(user)
+            self.journal.replay(self.config)
+            self.modified.update(replayed)
+
+    def _shard(self, user):
+        key = USER_PREFIX + user
+        if key not in self.config:
+            path = os.path.join(self.dataset_path, shard_relpath(user))
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    self.config[key] = json.load(f)
+            else:
+                self.config[key] = {}
+        return self.config[key]
+
+    def users(self):
+        return list(self.manifest.get("users", []))
+
+    def count(self, user, approved=None):
+        data = self._shard(user)
+        if approved is None:
+            return len(data)
+        return sum(1 for value in data.values() if bool(value) == approved)
+
+    def images(self, user, approved=None, offset=0, limit=None):
+        rows = [(img, value) for img, value in self._shard(user).items()
+                if approved is None or bool(value) == approved]
+        end = None if limit is None else offset + limit
+        return rows[offset:end]
+
+    def set_approved(self, user, image, value=True):
+        self._shard(user)[image] = value
+        self.modified.add(user)
+        self.journal.append(USER_PREFIX + user, image, value)
+
+    def user_assignment(self, user):
+        return self._shard(user).copy()
+
+    def header(self):
+        return {k: v for k, v in self.manifest.items() if k not in ("layout", "users")}
+
+    def add_images(self, user, images):
+        data = self._shard(user)
+        for image in images:
+            data.setdefault(image, False)
+        self.modified.add(user)
+        if user not in self.manifest.setdefault("users", []):
+            self.manifest["users"].append(user)
+            self.manifest_modified = True
+
+    def sync(self):
+        self.journal.sync()
+
+    def save(self):
+        if self.manifest_modified:
+            atomic_write(os.path.join(self.dataset_path, "config.json"), json.dumps(self.manifest, indent=4))
+            self.manifest_modified = False
+        if not self.modified:
+            return True
+        for user in self.modified:
+            write_assignment_json(os.path.join(self.dataset_path, shard_relpath(user)), self._shard(user))
+        self.modified.clear()
+        self.journal.clear()
+        return True
+
+    def mark_saved(self):
+        self.journal.clear()
+
+    def close(self):
+        self.journal.close()
+
+
+class SqliteProjectStore(ProjectStore):
+    """
+    Backend indexado em SQLite, em <dataset>/.annotator/project.db.
+
+    O config.json continua sendo o documento compartilhado pelo Git; o
+    banco é importado dele quando o arquivo muda e pode ser exportado de
+    volta com export_config. As consultas por usuário e estado usam o
+    índice (user, approved, position) e podem ser paginadas.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS images (
+            id         INTEGER PRIMARY KEY,
+            user       TEXT    NOT NULL,
+            image      TEXT    NOT NULL,
+            position   INTEGER NOT NULL,
+            approved   INTEGER NOT NULL DEFAULT 0,
+            created_at REAL,
+            updated_at REAL,
+            seen       INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (user, image)
+        );
+        CREATE INDEX IF NOT EXISTS idx_images_user_status ON images (user, approved, position);
+        CREATE INDEX IF NOT EXISTS idx_images_user_position ON images (user, position);
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.db = sqlite3.connect(db_path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.SCHEMA)
+        self.modified = False
+        self._load_meta()
+
+    @classmethod
+    def open(cls, dataset_path):
+        """
+        Abre o banco do dataset, reimportando o config.json se ele mudou
+        desde a última importação.
+        """
+        store = cls(os.path.join(project_cache_dir(dataset_path), "project.db"))
+        config_path = os.path.join(dataset_path, "config.json")
+        if store.get_meta("source_signature") != cls.file_signature(config_path):
+            with open(config_path, "r") as f:
+                store.import_config(json.load(f))
+            store.set_meta("source_signature", cls.file_signature(config_path))
+            store.db.commit()
+        return store
+
+    @classmethod
+    def create(cls, dataset_path, config_data):
+        """
+        Cria (ou recria) o banco do dataset a partir de um dicionário no
+        formato do config.json.
+        """
+        store = cls(os.path.join(project_cache_dir(dataset_path), "project.db"))
+        store.import_config(config_data, keep_local=False)
+        store.set_meta("source_signature", cls.file_signature(os.path.join(dataset_path, "config.json")))
+        store.db.commit()
+        return store
+
+    @staticmethod
+    def file_signature(path):
+        if not os.path.exists(path):
+            return ""
+        st = os.stat(path)
+        return f"{st.st_size}:{st.st_mtime_ns}"
+
+    def get_meta(self, key, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _load_meta(self):
+        self.classes = self.get_meta("classes", [])
+        self.classes_colors = self.get_meta("classes_colors", [])
+
+    def import_config(self, config, keep_local=True):
+        """
+        Importa um dicionário no formato do config.json. Vale o valor mais
+        novo: com keep_local, uma imagem aprovada (ou desaprovada) no banco
+        depois da última sincronização com o config.json mantém o valor
+        local, que ainda não foi enviado; as demais recebem o valor do
+        arquivo, inclusive desaprovações vindas do remoto.
+        """
+        now = time.time()
+        synced_at = self.get_meta("synced_at", 0) or 0
+        generation = (self.get_meta("generation", 0) or 0) + 1
+        header = {k: v for k, v in config.items() if not k.startswith(USER_PREFIX)}
+        for key, value in header.items():
+            self.set_meta(key, value)
+
+        # sem keep_local nenhuma linha conta como alterada localmente
+        pending_after = float(synced_at) if keep_local else float("inf")
+        sql = """
+            INSERT INTO images (user, image, position, approved, created_at, updated_at, seen)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user, image) DO UPDATE SET
+                position = excluded.position,
+                approved = CASE WHEN images.updated_at > ? THEN images.approved ELSE excluded.approved END,
+                seen     = excluded.seen
+        """
+        for user in config_users(config):
+            rows = ((user, img, pos, int(bool(value)), now, now, generation, pending_after)
+                    for pos, (img, value) in enumerate(config[USER_PREFIX + user].items()))
+            self.db.executemany(sql, rows)
+        self.db.execute("DELETE FROM images WHERE seen < ?", (generation,))
+        self.set_meta("generation", generation)
+        self.set_meta("users", config_users(config))
+        self.set_meta("synced_at", time.time())
+        self.db.commit()
+        self._load_meta()
+
+    def users(self):
+        return self.get_meta("users", [])
+
+    def count(self, user, approved=None):
+        if approved is None:
+            return self.db.execute("SELECT COUNT(*) FROM images WHERE user=?", (user,)).fetchone()[0]
+        return self.db.execute("SELECT COUNT(*) FROM images WHERE user=? AND approved=?",
+                               (user, int(approved))).fetchone()[0]
+
+    def images(self, user, approved=None, offset=0, limit=None):
+        sql = "SELECT image, approved FROM images WHERE user=?"
+        args = [user]
+        if approved is not None:
+            sql += " AND approved=?"
+            args.append(int(approved))
+        sql += " ORDER BY position LIMIT ? OFFSET ?"
+        args += [-1 if limit is None else limit, offset]
+        return [(image, bool(value)) for image, value in self.db.execute(sql, args)]
+
+    def page(self, user, approved, page, page_size=100):
+        """
+        Retorna a página `page` (a partir de 0) das imagens do usuário.
+        """
+        return self.images(user, approved, offset=page * page_size, limit=page_size)
+
+    def set_approved(self, user, image, value=True):
+        self.db.execute("UPDATE images SET approved=?, updated_at=? WHERE user=? AND image=?",
+                        (int(value), time.time(), user, image))
+        self.db.commit()
+
+    def header(self):
+        meta = {key: json.loads(value) for key, value in self.db.execute("SELECT key, value FROM meta")}
+        header = {"classes": self.classes, "classes_colors": self.classes_colors}
+        for key in sorted(meta):
+            if key not in header and key not in ("source_signature", "generation", "users", "synced_at"):
+                header[key] = meta[key]
+        return header
+
+    def assigned_images(self):
+        return {image for (image,) in self.db.execute("SELECT image FROM images")}
+
+    def add_images(self, user, images):
+        now = time.time()
+        start = self.db.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM images WHERE user=?",
+                                (user,)).fetchone()[0]
+        generation = self.get_meta("generation", 0) or 0
+        self.db.executemany(
+            "INSERT OR IGNORE INTO images (user, image, position, approved, created_at, updated_at, seen) "
+            "VALUES (?, ?, ?, 0, ?, ?, ?)",
+            ((user, image, start + i, now, now, generation) for i, image in enumerate(images)))
+        if user not in self.users():
+            self.set_meta("users", self.users() + [user])
+        self.db.commit()
+        self.modified = True
+
+    def save(self):
+        # só imagens acrescentadas precisam reescrever o config.json; as
+        # aprovações vão para ele no commit
+        if self.modified:
+            config_path = os.path.join(os.path.dirname(os.path.dirname(self.db_path)), "config.json")
+            self.export_config(config_path)
+            self.mark_saved()
+            self.modified = False
+        return True
+
+    def export_config(self, path, users=None):
+        """
+        Exporta o banco para o formato do config.json.
+        """
+        header = self.header()
+        users = self.users() if users is None else users
+
+        def rows(user):
+            cursor = self.db.execute("SELECT image, approved FROM images WHERE user=? ORDER BY position", (user,))
+            for image, approved in cursor:
+                yield image, bool(approved)
+
+        write_config_json(path, header, [(user, rows(user)) for user in users])
+
+    def mark_saved(self):
+        # o config.json agora tem os valores locais: nada mais está pendente
+        config_path = os.path.join(os.path.dirname(os.path.dirname(self.db_path)), "config.json")
+        self.set_meta("source_signature", self.file_signature(config_path))
+        self.set_meta("synced_at", time.time())
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+def open_project_store(dataset_path, backend="json", journal_batch_size=32):
+    """
+    Abre o ProjectStore do dataset conforme o backend ("json" ou "sqlite").
+    Projetos em shards usam sempre o ShardedProjectStore.
+    """
+    if is_sharded_project(dataset_path):
+        return ShardedProjectStore(dataset_path, journal_batch_size=journal_batch_size)
+    if backend == "sqlite":
+        return SqliteProjectStore.open(dataset_path)
+    return JsonProjectStore(dataset_path, journal_batch_size=journal_batch_size)
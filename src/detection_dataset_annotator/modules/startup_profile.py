@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+import sys
+import time
+import subprocess
+
+from PyQt5.QtCore import QObject, QEvent
+
+
+def import_times(module, top=15):
+    """
+    Importa `module` num interpretador novo com -X importtime e retorna os
+    `top` módulos mais caros como [(cumulativo_us, próprio_us, nome)].
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                          capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            own, cumulative = int(parts[0]), int(parts[1])
+        except (ValueError, IndexError):
+            continue  # cabeçalho
+        rows.append((cumulative, own, parts[2].strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+class StartupProfile(QObject):
+    """
+    Marcas de tempo da abertura do programa (--profile-startup), contadas
+    a partir de t0 (time.perf_counter() no início do módulo principal).
+
+    watch(window) marca a primeira pintura da janela e imprime o relatório,
+    seguido das importações mais caras medidas num interpretador novo.
+    """
+    def __init__(self, t0, module, parent=None):
+        super().__init__(parent)
+        self.t0 = t0
+        self.module = module
+        self.marks = []
+        self.window = None
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter() - self.t0))
+
+    def watch(self, window):
+        self.window = window
+        window.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if obj is self.window and event.type() == QEvent.Paint:
+            obj.removeEventFilter(self)
+            self.mark("first window paint")
+            self.report()
+        return False
+
+    def report(self, top=15, file=None):
+        file = file or sys.stderr
+        print("Startup profile (since the main module was imported):", file=file)
+        previous = 0.0
+        for name, elapsed in self.marks:
+            print(f"  {name:<24} {elapsed * 1000:9.1f} ms  (+{(elapsed - previous) * 1000:.1f} ms)", file=file)
+            previous = elapsed
+        print(f"Slowest imports of {self.module} (fresh interpreter, -X importtime):", file=file)
+        for cumulative, own, name in import_times(self.module, top):
+            print(f"  {cumulative / 1000:9.1f} ms cumulative {own / 1000:9.1f} ms self  {name}", file=file)
+        file.flush()
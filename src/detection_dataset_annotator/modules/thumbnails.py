@@ -0,0 +1,176 @@
+#!/usr/bin/python3
+import os
+import hashlib
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QSize, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+
+from detection_dataset_annotator.modules.image_cache import decode_image
+from detection_dataset_annotator.modules.project_paths import project_cache_dir, CACHE_DIRNAME
+
+
+def thumbnail_path_of(dataset_path, img_name, stat, size):
+    """
+    Caminho da miniatura em <dataset>/.annotator/thumbs/. O nome vem do
+    caminho da imagem, do seu (tamanho, mtime) e do lado da miniatura:
+    uma imagem alterada gera outro arquivo e nunca usa uma miniatura velha.
+    """
+    key = "\0".join([img_name.replace(os.sep, "/"), str(stat[0]), str(stat[1]), str(size)])
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+    return os.path.join(dataset_path, CACHE_DIRNAME, "thumbs", digest[:2], digest + ".jpg")
+
+
+def make_thumbnail(img_path, thumb_path, size, quality=85):
+    """
+    Decodifica a imagem já reduzida (QImageReader.setScaledSize) para
+    caber em size x size e grava a miniatura em JPEG (temporário +
+    os.replace). Retorna o QImage, nulo se a imagem não puder ser lida.
+    """
+    image, _ = decode_image(img_path, QSize(size, size))
+    if image.isNull():
+        return image
+    if image.width() > size or image.height() > size:
+        image = image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    image = image.convertToFormat(QImage.Format_RGB32)
+    os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+    tmp_path = thumb_path + ".tmp"
+    if image.save(tmp_path, "JPG", quality):
+        os.replace(tmp_path, thumb_path)
+    return image
+
+
+def _pixmap_bytes(pixmap):
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+class _ThumbnailSignals(QObject):
+    done = pyqtSignal(int, str, object)
+
+
+class _ThumbnailTask(QRunnable):
+    def __init__(self, generation, img_name, img_path, thumb_path, size, signals):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.generation = generation
+        self.img_name = img_name
+        self.img_path = img_path
+        self.thumb_path = thumb_path
+        self.size = size
+        self.signals = signals
+
+    def run(self):
+        image = QImage(self.thumb_path) if os.path.exists(self.thumb_path) else QImage()
+        if image.isNull():
+            image = make_thumbnail(self.img_path, self.thumb_path, self.size)
+        self.signals.done.emit(self.generation, self.img_name, image)
+
+
+class ThumbnailCache(QObject):
+    """
+    Miniaturas das imagens para as listas do anotador.
+
+    pixmap() nunca decodifica na thread da GUI: devolve a miniatura se ela
+    já estiver na memória e, senão, agenda num pool de threads a leitura
+    do cache em disco (ou a geração, se ela ainda não existir) e retorna
+    None; o sinal ready avisa quando ela chega. Como as views só pedem os
+    dados das linhas visíveis, só essas são geradas. Os pedidos mais novos
+    têm prioridade e os mais antigos que passam de max_pending são
+    cancelados, então rolar rápido uma lista longa não acumula trabalho.
+    """
+    ready = pyqtSignal(str)
+
+    def __init__(self, size=96, max_items=1000, max_pending=256, max_threads=2, parent=None):
+        super().__init__(parent)
+        self.size = size
+        self.max_items = max_items
+        self.max_pending = max_pending
+        self.dataset_path = ""
+        self.stat_of = None
+        self.total_bytes = 0
+
+        self._pixmaps = OrderedDict()
+        self._failed = set()
+        self._pending = OrderedDict()
+        self._generation = 0
+        self._priority = 0
+
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max(1, max_threads))
+        self._signals = _ThumbnailSignals()
+        self._signals.done.connect(self._on_done)
+
+    def set_dataset(self, dataset_path, stat_of):
+        """
+        stat_of(img_name) deve retornar o (tamanho, mtime) da imagem, ou None.
+        """
+        self.dataset_path = dataset_path
+        self.stat_of = stat_of
+        self.clear()
+        project_cache_dir(dataset_path, "thumbs")
+
+    def clear(self):
+        self.cancel()
+        self._generation += 1
+        self._pixmaps.clear()
+        self._failed.clear()
+        self.total_bytes = 0
+
+    def cancel(self):
+        """
+        Cancela as miniaturas agendadas que ainda não começaram.
+        """
+        for task in self._pending.values():
+            self._pool.tryTake(task)
+        self._pending.clear()
+
+    def pixmap(self, img_name):
+        pixmap = self._pixmaps.get(img_name)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(img_name)
+            return pixmap
+        if img_name not in self._failed and self.stat_of is not None:
+            self._request(img_name)
+        return None
+
+    def _request(self, img_name):
+        self._priority += 1
+        task = self._pending.get(img_name)
+        if task is not None:
+            # pedida de novo: volta para a frente da fila
+            if self._pool.tryTake(task):
+                self._pending.move_to_end(img_name)
+                self._pool.start(task, self._priority)
+            return
+        stat = self.stat_of(img_name)
+        if stat is None:
+            self._failed.add(img_name)
+            return
+        task = _ThumbnailTask(self._generation, img_name, os.path.join(self.dataset_path, "images", img_name),
+                              thumbnail_path_of(self.dataset_path, img_name, stat, self.size),
+                              self.size, self._signals)
+        self._pending[img_name] = task
+        self._pool.start(task, self._priority)
+        while len(self._pending) > self.max_pending:
+            _, old = self._pending.popitem(last=False)
+            self._pool.tryTake(old)
+
+    def _on_done(self, generation, img_name, image):
+        if generation != self._generation:
+            return
+        self._pending.pop(img_name, None)
+        if image.isNull():
+            self._failed.add(img_name)
+            return
+        pixmap = QPixmap.fromImage(image)
+        # a mesma miniatura pode chegar duas vezes: uma tarefa já em execução ao sair
+        # de _pending não é cancelada, e um novo pedido cria outra
+        previous = self._pixmaps.pop(img_name, None)
+        if previous is not None:
+            self.total_bytes -= _pixmap_bytes(previous)
+        self._pixmaps[img_name] = pixmap
+        self.total_bytes += _pixmap_bytes(pixmap)
+        while len(self._pixmaps) > self.max_items:
+            _, old = self._pixmaps.popitem(last=False)
+            self.total_bytes -= _pixmap_bytes(old)
+        self.ready.emit(img_name)
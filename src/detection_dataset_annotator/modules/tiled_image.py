@@ -0,0 +1,270 @@
+#!/usr/bin/python3
+import os
+import json
+import math
+import hashlib
+
+from PyQt5 import sip
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QRect, QRectF, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QImageIOHandler, QPainter, QPixmap, QPixmapCache
+from PyQt5.QtWidgets import QGraphicsItem
+
+from detection_dataset_annotator.modules.project_paths import project_cache_dir
+
+
+class TilePyramid:
+    """
+    Pirâmide de tiles em disco de uma imagem grande.
+
+    O nível 0 tem a resolução original e cada nível seguinte tem a metade
+    da resolução do anterior, até a imagem inteira caber em um tile.
+    Os tiles ficam em <dataset>/.annotator/tiles/<chave>/<nivel>/<tx>_<ty>.<ext>,
+    onde a chave depende do caminho, tamanho e mtime da imagem.
+    """
+    def __init__(self, dataset_path, img_name, width, height, tile_size=256, tile_format="jpg"):
+        self.img_path = os.path.join(dataset_path, "images", img_name)
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.tile_format = tile_format
+
+        st = os.stat(self.img_path)
+        key = f"{img_name}|{st.st_size}|{st.st_mtime_ns}|{tile_size}"
+        key = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        self.directory = project_cache_dir(dataset_path, "tiles", key)
+        self.meta_path = os.path.join(self.directory, "meta.json")
+
+        levels = 1
+        while max(width, height) > tile_size * (2 ** (levels - 1)):
+            levels += 1
+        self.levels = levels
+
+    def is_built(self):
+        return os.path.exists(self.meta_path)
+
+    def level_size(self, level):
+        scale = 2 ** level
+        return (max(1, math.ceil(self.width / scale)), max(1, math.ceil(self.height / scale)))
+
+    def tile_count(self, level):
+        lw, lh = self.level_size(level)
+        return (math.ceil(lw / self.tile_size), math.ceil(lh / self.tile_size))
+
+    def tile_path(self, level, tx, ty):
+        return os.path.join(self.directory, str(level), f"{tx}_{ty}.{self.tile_format}")
+
+    def build(self, progress=None, max_decode_bytes=1 << 30):
+        """
+        Gera todos os tiles; os níveis acima do 0 são gerados a partir do
+        nível anterior.
+
+        O nível 0 vem de uma única decodificação quando a imagem inteira
+        cabe em max_decode_bytes (qualquer formato). Acima disso só os
+        formatos com QImageIOHandler.ClipRect são lidos em faixas, cada uma
+        com até max_decode_bytes: no JPEG do Qt o decodificador para na
+        última linha da faixa e só ela fica na memória. Como um leitor não
+        pode continuar de onde parou, cada faixa decodifica de novo o início
+        do arquivo, mas o número de faixas é limitado pelo orçamento
+        (tamanho / max_decode_bytes). PNG, TIFF e os demais formatos sem
+        ClipRect decodificariam a imagem inteira a cada faixa, então imagens
+        desses formatos maiores que o orçamento levantam IOError.
+        """
+        T = self.tile_size
+        total = sum(nx * ny for nx, ny in (self.tile_count(l) for l in range(self.levels)))
+        done = 0
+
+        os.makedirs(os.path.join(self.directory, "0"), exist_ok=True)
+        row_bytes = self.width * 4
+        if row_bytes * self.height <= max_decode_bytes:
+            strip_h = self.height
+        elif QImageReader(self.img_path).supportsOption(QImageIOHandler.ClipRect):
+            strip_h = max(T, (max_decode_bytes // row_bytes) // T * T)
+        else:
+            raise IOError(f"{self.img_path}: {row_bytes * self.height >> 20} MB to decode, above the "
+                          f"{max_decode_bytes >> 20} MB budget, and the format cannot be read in strips")
+        for y0 in range(0, self.height, strip_h):
+            h = min(strip_h, self.height - y0)
+            reader = QImageReader(self.img_path)
+            if h < self.height:
+                reader.setClipRect(QRect(0, y0, self.width, h))
+            strip = reader.read()
+            if strip.isNull():
+                raise IOError(reader.errorString())
+            for ty in range(y0 // T, (y0 + h + T - 1) // T):
+                for tx in range(math.ceil(self.width / T)):
+                    tile = strip.copy(tx * T, ty * T - y0, min(T, self.width - tx * T), min(T, self.height - ty * T))
+                    tile.save(self.tile_path(0, tx, ty))
+                    done += 1
+            del strip
+            if progress:
+                progress(done, total)
+
+        for level in range(1, self.levels):
+            os.makedirs(os.path.join(self.directory, str(level)), exist_ok=True)
+            lw, lh = self.level_size(level)
+            nx, ny = self.tile_count(level)
+            for ty in range(ny):
+                for tx in range(nx):
+                    w = min(T, lw - tx * T)
+                    h = min(T, lh - ty * T)
+                    merged = QImage(w * 2, h * 2, QImage.Format_RGB32)
+                    merged.fill(Qt.black)
+                    painter = QPainter(merged)
+                    for dy in range(2):
+                        for dx in range(2):
+                            child = self.tile_path(level - 1, tx * 2 + dx, ty * 2 + dy)
+                            if os.path.exists(child):
+                                painter.drawImage(dx * T, dy * T, QImage(child))
+                    painter.end()
+                    merged.scaled(w, h, Qt.IgnoreAspectRatio, Qt.SmoothTransformation
+                                 ).save(self.tile_path(level, tx, ty))
+                    done += 1
+            if progress:
+                progress(done, total)
+
+        with open(self.meta_path, "w") as f:
+            json.dump({"width": self.width, "height": self.height,
+                       "tile_size": T, "levels": self.levels}, f)
+
+
+class _BuildSignals(QObject):
+    progress = pyqtSignal(str, int, int)
+    finished = pyqtSignal(str, bool)
+
+
+class PyramidBuildTask(QRunnable):
+    """
+    Constrói uma TilePyramid numa thread de trabalho.
+    """
+    def __init__(self, img_name, pyramid, max_decode_bytes=1 << 30):
+        super().__init__()
+        self.img_name = img_name
+        self.pyramid = pyramid
+        self.max_decode_bytes = max_decode_bytes
+        self.setAutoDelete(False)
+        self.signals = _BuildSignals()
+
+    def run(self):
+        try:
+            self.pyramid.build(lambda d, t: self.signals.progress.emit(self.img_name, d, t),
+                               max_decode_bytes=self.max_decode_bytes)
+            self.signals.finished.emit(self.img_name, True)
+        except (IOError, OSError):
+            self.signals.finished.emit(self.img_name, False)
+
+
+class _TileSignals(QObject):
+    loaded = pyqtSignal(str, object)
+
+
+class _TileLoadTask(QRunnable):
+    def __init__(self, path, signals):
+        super().__init__()
+        self.path = path
+        self.signals = signals
+
+    def run(self):
+        # QImage pode ser lido fora da thread da GUI; a QPixmap não
+        self.signals.loaded.emit(self.path, QImage(self.path))
+
+
+class TiledImageItem(QGraphicsItem):
+    """
+    Item gráfico que desenha uma TilePyramid já construída.
+
+    A cada paint é escolhido o nível da pirâmide conforme o zoom atual e só
+    os tiles que cruzam a região exposta são desenhados. paint() nunca lê o
+    disco: tiles fora do QPixmapCache são lidos num QThreadPool e, até
+    chegarem, a região é desenhada com o nível mais grosso já em cache (o
+    tile único do topo é pedido na criação do item). O item ocupa
+    (0, 0, largura, altura) em pixels originais.
+    """
+    def __init__(self, pyramid, pool=None, parent=None):
+        super().__init__(parent)
+        self.pyramid = pyramid
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+        self._rect = QRectF(0, 0, pyramid.width, pyramid.height)
+        self._pool = pool or QThreadPool.globalInstance()
+        self._pending = {}
+        self._signals = _TileSignals()
+        self._signals.loaded.connect(self._on_tile_loaded)
+        self.request_tile(pyramid.levels - 1, 0, 0)
+
+    def boundingRect(self):
+        return self._rect
+
+    def level_for(self, lod):
+        if lod <= 0:
+            return self.pyramid.levels - 1
+        level = int(math.floor(math.log2(1.0 / lod))) if lod < 1 else 0
+        return max(0, min(self.pyramid.levels - 1, level))
+
+    def cached_tile(self, level, tx, ty):
+        """
+        QPixmap do tile se ele já estiver no QPixmapCache, senão None.
+        """
+        pixmap = QPixmapCache.find(self.pyramid.tile_path(level, tx, ty))
+        if pixmap is None or pixmap.isNull():
+            return None
+        return pixmap
+
+    def request_tile(self, level, tx, ty):
+        path = self.pyramid.tile_path(level, tx, ty)
+        if path not in self._pending:
+            self._pending[path] = self.tile_rect(level, tx, ty)
+            self._pool.start(_TileLoadTask(path, self._signals))
+
+    def _on_tile_loaded(self, path, image):
+        rect = self._pending.pop(path, None)
+        if image.isNull() or sip.isdeleted(self):
+            return
+        QPixmapCache.insert(path, QPixmap.fromImage(image))
+        self.update(rect if rect is not None else self._rect)
+
+    def tile_rect(self, level, tx, ty):
+        span = self.pyramid.tile_size * 2 ** level
+        return QRectF(tx * span, ty * span, span, span).intersected(self._rect)
+
+    def draw_fallback(self, painter, level, tx, ty):
+        """
+        Desenha a área do tile (level, tx, ty) com o primeiro nível mais
+        grosso que estiver em cache.
+        """
+        target = self.tile_rect(level, tx, ty)
+        for coarse in range(level + 1, self.pyramid.levels):
+            shift = coarse - level
+            ctx, cty = tx >> shift, ty >> shift
+            pixmap = self.cached_tile(coarse, ctx, cty)
+            if pixmap is None:
+                continue
+            scale = 2 ** coarse
+            origin = self.tile_rect(coarse, ctx, cty)
+            source = QRectF((target.left() - origin.left()) / scale, (target.top() - origin.top()) / scale,
+                            target.width() / scale, target.height() / scale)
+            painter.drawPixmap(target, pixmap, source)
+            return
+
+    def paint(self, painter, option, widget=None):
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.level_for(lod)
+        scale = 2 ** level
+        T = self.pyramid.tile_size
+        span = T * scale
+
+        exposed = option.exposedRect.intersected(self._rect)
+        nx, ny = self.pyramid.tile_count(level)
+        tx0 = max(0, int(exposed.left() // span))
+        ty0 = max(0, int(exposed.top() // span))
+        tx1 = min(nx - 1, int(exposed.right() // span))
+        ty1 = min(ny - 1, int(exposed.bottom() // span))
+
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, lod < 1)
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                pixmap = self.cached_tile(level, tx, ty)
+                if pixmap is None:
+                    self.request_tile(level, tx, ty)
+                    self.draw_fallback(painter, level, tx, ty)
+                    continue
+                target = QRectF(tx * span, ty * span, pixmap.width() * scale, pixmap.height() * scale)
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
@@ -0,0 +1,172 @@
+#!/usr/bin/python3
+import os
+import threading
+
+
+def _fsync_directory(path):
+    # garante que a troca de nome (os.replace) também chegou ao disco
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_temp(path, data):
+    tmp_path = path + ".tmp"
+    if isinstance(data, bytes):
+        f = open(tmp_path, "wb")
+    else:
+        f = open(tmp_path, "w", encoding="utf-8")
+    with f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_path
+
+
+def atomic_write(path, data):
+    """
+    Escreve data (str ou bytes) num arquivo temporário do mesmo diretório,
+    faz o fsync e o troca pelo destino com os.replace: quem lê encontra o
+    arquivo antigo ou o novo inteiro, nunca um arquivo truncado.
+    """
+    os.replace(_write_temp(path, data), path)
+
+
+def atomic_write_many(items):
+    """
+    atomic_write de vários arquivos ((caminho, data), ...): cada temporário
+    recebe o seu fsync antes do os.replace, e cada diretório tocado recebe
+    um só fsync ao fim do lote. Retorna a lista de (caminho, erro) dos
+    arquivos que não puderam ser escritos; os demais são gravados.
+    """
+    errors = []
+    directories = set()
+    for path, data in items:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(_write_temp(path, data), path)
+            directories.add(os.path.dirname(path))
+        except OSError as e:
+            errors.append((path, e))
+    for directory in directories:
+        try:
+            _fsync_directory(directory)
+        except OSError:
+            pass
+    return errors
+
+
+class WriteBehindQueue:
+    """
+    Fila de escritas em segundo plano.
+
+    write() só guarda o conteúdo e retorna; uma thread junta as escritas
+    feitas em `batch_ms` num lote e o grava com atomic_write_many, com um
+    só fsync por diretório ao fim do lote. Escritas no mesmo caminho saem
+    na ordem em que foram pedidas (uma escrita ainda na fila é substituída
+    pela mais nova). flush() espera a fila esvaziar.
+    """
+    def __init__(self, batch_ms=200):
+        self.batch_ms = batch_ms
+        self._pending = {}
+        self._in_flight = {}
+        self._errors = []
+        self._flush_requested = False
+        self._closed = False
+        self._paused = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending) + len(self._in_flight)
+
+    def write(self, path, data):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write queue is closed")
+            self._pending.pop(path, None)
+            self._pending[path] = data
+            self._cond.notify_all()
+
+    def read_text(self, path):
+        """
+        Conteúdo atual do arquivo, contando as escritas ainda na fila.
+        Retorna None se ele não existir.
+        """
+        with self._cond:
+            for queue in (self._pending, self._in_flight):
+                if path in queue:
+                    return queue[path]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while (not self._pending or self._paused) and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # junta as escritas próximas num só lote
+                self._cond.wait_for(lambda: self._flush_requested or self._closed or self._paused,
+                                    timeout=self.batch_ms / 1000.0)
+                if self._paused and not self._closed:
+                    continue
+                batch, self._pending = self._pending, {}
+                self._in_flight = batch
+            errors = atomic_write_many(batch.items())
+            with self._cond:
+                self._in_flight = {}
+                self._errors.extend(errors)
+                self._cond.notify_all()
+
+    def pause(self):
+        """
+        Suspende a gravação (as escritas continuam sendo aceitas e guardadas)
+        e espera o lote em andamento terminar; pode ser chamado de qualquer
+        thread. Cada pause() pede um resume().
+        """
+        with self._cond:
+            self._paused += 1
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._in_flight)
+
+    def resume(self):
+        with self._cond:
+            self._paused = max(0, self._paused - 1)
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Espera todas as escritas pedidas até agora chegarem ao disco
+        (com a fila pausada, até o resume()).
+        Retorna a lista de (caminho, erro) das escritas que falharam.
+        """
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout=timeout)
+            self._flush_requested = False
+        return self.take_errors()
+
+    def take_errors(self):
+        with self._cond:
+            errors, self._errors = self._errors, []
+        return errors
+
+    def close(self):
+        errors = self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        return errors
@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+import io
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from detection_dataset_annotator.modules.dataset_index import scan_directory
+
+DEFAULT_PRECISION = 6
+
+# o numpy é importado dentro das funções: o anotador importa este módulo na
+# abertura, mas só precisa do numpy quando o primeiro rótulo é lido
+
+# classes: int32 (N,); boxes: float32 (N, 4) com cx, cy, w, h normalizados;
+# errors: [(linha, motivo), ...] das linhas rejeitadas (linhas a partir de 1)
+YoloLabels = namedtuple("YoloLabels", ["classes", "boxes", "errors"])
+
+# Rótulos de uma árvore inteira: as linhas do arquivo names[i] são
+# classes[offsets[i]:offsets[i+1]] e boxes[offsets[i]:offsets[i+1]];
+# errors: [(arquivo, linha, motivo), ...]
+YoloLabelSet = namedtuple("YoloLabelSet", ["names", "offsets", "classes", "boxes", "errors"])
+
+
+def empty_labels():
+    import numpy as np
+
+    return YoloLabels(np.zeros(0, dtype=np.int32), np.zeros((0, 4), dtype=np.float32), [])
+
+
+def labels_from_rows(classes, boxes):
+    """
+    Monta um YoloLabels a partir de sequências Python (ids e (cx, cy, w, h)).
+    """
+    import numpy as np
+
+    return YoloLabels(np.asarray(classes, dtype=np.int32).reshape(-1),
+                      np.asarray(boxes, dtype=np.float32).reshape(-1, 4), [])
+
+
+def _parse_lines(lines, num_classes=None):
+    """
+    Converte as linhas de texto numa matriz (N, 5) e valida todas de uma vez.
+
+    Retorna (data, índices das linhas aceitas, [(índice, motivo), ...]).
+    Linhas em branco são ignoradas sem erro.
+    """
+    import numpy as np
+
+    parts = [line.split() for line in lines]
+    errors = [(i, "expected 5 values") for i, p in enumerate(parts) if p and len(p) != 5]
+    rows = [i for i, p in enumerate(parts) if len(p) == 5]
+
+    try:
+        data = np.array([parts[i] for i in rows], dtype=np.float64).reshape(-1, 5)
+    except ValueError:
+        # só no caso raro de um token não numérico: localiza a linha culpada
+        values = []
+        accepted = []
+        for i in rows:
+            try:
+                values.append([float(v) for v in parts[i]])
+                accepted.append(i)
+            except ValueError:
+                errors.append((i, "non-numeric value"))
+        rows = accepted
+        data = np.array(values, dtype=np.float64).reshape(-1, 5)
+    rows = np.asarray(rows, dtype=np.int64)
+
+    cls = data[:, 0]
+    finite = np.isfinite(data).all(axis=1)
+    valid_cls = finite & (cls >= 0) & (cls == np.floor(cls))
+    if num_classes is not None:
+        valid_cls &= cls < num_classes
+    valid_size = finite & (data[:, 3] > 0) & (data[:, 4] > 0)
+
+    for reason, bad in (("non-finite value", ~finite),
+                        ("invalid class id", finite & ~valid_cls),
+                        ("non-positive box size", valid_cls & ~valid_size)):
+        errors.extend((int(i), reason) for i in rows[bad])
+
+    ok = valid_cls & valid_size
+    errors.sort()
+    return data[ok], rows[ok], errors
+
+
+def parse_yolo_text(text, num_classes=None):
+    """
+    Lê o conteúdo de um arquivo YOLO. Linhas malformadas, com id de classe
+    fora de [0, num_classes) ou com valores não finitos são rejeitadas e
+    listadas em errors.
+    """
+    import numpy as np
+
+    data, _, errors = _parse_lines(text.splitlines(), num_classes)
+    return YoloLabels(data[:, 0].astype(np.int32), data[:, 1:].astype(np.float32),
+                      [(i + 1, reason) for i, reason in errors])
+
+
+def read_yolo_file(label_path, num_classes=None):
+    """
+    Lê um arquivo YOLO .txt; um arquivo inexistente equivale a nenhum rótulo.
+    """
+    if not os.path.exists(label_path):
+        return empty_labels()
+    with open(label_path, "r") as f:
+        return parse_yolo_text(f.read(), num_classes)
+
+
+def _read_text(path):
+    with open(path, "r") as f:
+        return f.read()
+
+
+def read_yolo_files(labels_dir, names, num_classes=None, max_workers=8):
+    """
+    Lê os arquivos `names` (relativos a labels_dir) num único YoloLabelSet.
+
+    Os arquivos são lidos em paralelo e todas as linhas são convertidas e
+    validadas numa só passada vetorizada.
+    """
+    import numpy as np
+
+    names = list(names)
+    if max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            texts = list(pool.map(_read_text, (os.path.join(labels_dir, n) for n in names)))
+    else:
+        texts = [_read_text(os.path.join(labels_dir, n)) for n in names]
+
+    lines = []
+    file_of_line = []
+    line_start = np.zeros(len(names) + 1, dtype=np.int64)
+    for fid, text in enumerate(texts):
+        file_lines = text.splitlines()
+        lines.extend(file_lines)
+        file_of_line.append(np.full(len(file_lines), fid, dtype=np.int64))
+        line_start[fid + 1] = len(lines)
+    file_of_line = np.concatenate(file_of_line) if file_of_line else np.zeros(0, dtype=np.int64)
+
+    data, rows, errors = _parse_lines(lines, num_classes)
+    counts = np.bincount(file_of_line[rows], minlength=len(names))
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    errors = [(names[file_of_line[i]], int(i - line_start[file_of_line[i]]) + 1, reason)
+              for i, reason in errors]
+    return YoloLabelSet(names, offsets, data[:, 0].astype(np.int32), data[:, 1:].astype(np.float32), errors)
+
+
+def read_yolo_tree(labels_dir, num_classes=None, max_workers=8):
+    """
+    Lê todos os .txt de labels_dir (recursivo) num único YoloLabelSet.
+    """
+    files, _ = scan_directory(labels_dir)
+    names = sorted(name for name in files if name.endswith(".txt"))
+    return read_yolo_files(labels_dir, names, num_classes, max_workers)
+
+
+def format_yolo(classes, boxes, precision=DEFAULT_PRECISION):
+    """
+    Formata os rótulos no texto YOLO, com `precision` casas decimais.
+    """
+    import numpy as np
+
+    classes = np.asarray(classes).reshape(-1)
+    if len(classes) == 0:
+        return ""
+    buffer = io.StringIO()
+    fmt = "%d" + f" %.{precision}f" * 4
+    np.savetxt(buffer, np.column_stack([classes, np.asarray(boxes, dtype=np.float64).reshape(-1, 4)]),
+               fmt=fmt)
+    return buffer.getvalue()
+
+
+def write_yolo_file(label_path, classes, boxes, precision=DEFAULT_PRECISION):
+    content = format_yolo(classes, boxes, precision)
+    with open(label_path, "w") as f:
+        f.write(content)
+    return content
@@ -1,32 +1,50 @@
 #!/usr/bin/python3
 
+import time
+STARTUP_TIME = time.perf_counter()  # referência do --profile-startup
+
 import os
 import sys
 import json
 import subprocess
+import math
 import signal
-import copy
 import tempfile
 
 from PyQt5 import QtWidgets, QtCore, QtGui
-from git import Repo, GitCommandError
 #from natsort import natsorted
 
-from PyQt5.QtWidgets import ( QMainWindow, QGraphicsItem, QGraphicsSimpleTextItem, QProgressBar, 
+from PyQt5.QtWidgets import ( QMainWindow, QGraphicsItem, QProgressBar, 
     QApplication, QSizePolicy, QWidget, QAction, QFileDialog, QGraphicsScene, QLineEdit, 
     QGraphicsRectItem, QHBoxLayout, QVBoxLayout, QFormLayout, QGraphicsView, QSplitter, QMessageBox, 
-    QTableWidgetItem, QPushButton, QInputDialog, QLabel, QTableWidget, QAbstractItemView,
-    QHeaderView)
-from PyQt5.QtCore import Qt, QUrl, QRectF
-from PyQt5.QtGui import QDesktopServices, QIcon, QColor, QPen, QBrush, QPainter, QPixmap, QFont
+    QPushButton, QInputDialog, QLabel, QTableView, QAbstractItemView,
+    QHeaderView, QCheckBox)
+from PyQt5.QtCore import Qt, QUrl, QRectF, pyqtSignal
+from PyQt5.QtGui import ( QDesktopServices, QIcon, QColor, QPen, QBrush, QPainter, QPixmap, QFont, QTransform,
+    QImageReader, QImageIOHandler, QPixmapCache, QFontMetricsF)
 
 import detection_dataset_annotator.about as about
 import detection_dataset_annotator.modules.configure as configure 
 from detection_dataset_annotator.desktop import create_desktop_file
 from detection_dataset_annotator.desktop import create_desktop_directory
 from detection_dataset_annotator.desktop import create_desktop_menu
+from detection_dataset_annotator.desktop import ensure_desktop_integration
 from detection_dataset_annotator.modules.wabout  import show_about_window
 from detection_dataset_annotator.modules.resources import resource_path
+from detection_dataset_annotator.modules.startup_profile import StartupProfile
+from detection_dataset_annotator.modules.image_cache import ImageCache
+from detection_dataset_annotator.modules.yolo_labels import read_yolo_file, empty_labels, labels_from_rows, format_yolo
+from detection_dataset_annotator.modules.project_store import open_project_store, shard_relpath
+from detection_dataset_annotator.modules.image_list import ImageIndex, ImageListModel
+from detection_dataset_annotator.modules.thumbnails import ThumbnailCache
+from detection_dataset_annotator.modules.dataset_index import DatasetIndex
+from detection_dataset_annotator.modules.dimension_index import DimensionIndex
+from detection_dataset_annotator.modules.dirty_set import dirty_labels_of
+from detection_dataset_annotator.modules.write_queue import WriteBehindQueue, atomic_write
+from detection_dataset_annotator.modules.project_paths import project_cache_dir, label_path_of, discard_proposals
+from detection_dataset_annotator.modules.git_sync import GitSyncEngine
+from detection_dataset_annotator.modules.instrumentation import tracer, traced
+from detection_dataset_annotator.modules.tiled_image import TilePyramid, TiledImageItem, PyramidBuildTask
 
 CONFIG_PATH = os.path.join( os.path.expanduser("~"),
                             ".config",
@@ -69,95 +87,200 @@ DEFAULT_CONTENT={   "toolbar_configure": "Configure",
                     "name_git": "Git",
                     "changes_pushed": "Changes pushed!",
                     "no_save_config": "Could not save config.json:",
-                    "boundingbox_fontsize":18
+                    "no_save_approval": "Could not record the approval:",
+                    "journal_batch_size": 32,
+                    "journal_sync_ms": 2000,
+                    "project_backend": "json",
+                    "git_retry_seconds": 30,
+                    "git_max_retries": 5,
+                    "cancel_sync": "Cancel sync",
+                    "sync_running": "Synchronizing with the remote repository...",
+                    "sync_cancelled": "Synchronization cancelled.",
+                    "sync_retry": "Push failed; retrying in {seconds} s.",
+                    "sync_stash_kept": "Your uncommitted changes could not be restored after the update and were kept in the Git stash (see git stash list). Restore them with git stash pop after resolving the problem below.",
+                    "boundingbox_fontsize":18,
+                    "dense_scene_min_boxes": 200,
+                    "dense_label_min_pixels": 8,
+                    "box_pool_size": 2000,
+                    "image_cache_megabytes": 512,
+                    "image_cache_prefetch": 3,
+                    "image_cache_threads": 2,
+                    "show_thumbnails": False,
+                    "thumbnails": "Thumbnails",
+                    "thumbnail_size": 96,
+                    "thumbnail_memory_count": 1000,
+                    "thumbnail_threads": 2,
+                    "zoom_factor": 1.15,
+                    "tiled_min_megapixels": 100,
+                    "tile_size": 256,
+                    "tile_cache_megabytes": 128,
+                    "tile_decode_megabytes": 1024,
+                    "building_tiles": "Building tiles",
+                    "building_tiles_error": "Could not build the tiles of the image",
+                    "cache_status": "Cache hits: {hits} | misses: {misses}",
+                    "label_precision": 6,
+                    "write_behind_batch_ms": 200,
+                    "show_proposals": True,
+                    "proposal_min_score": 0.0,
+                    "proposals_loaded": "{count} proposed box(es) loaded; review and approve to save them",
+                    "no_save_label": "Could not save the label files:",
+                    "invalid_label_rows": "{count} invalid label line(s) ignored in {name}",
+                    "trace_file": "",
+                    "trace_status_ms": 1000,
+                    "trace_status_spans": ["load_image_and_boxes", "approve_image"],
+                    "trace_status": "{name}: p50 {p50:.0f} ms, p95 {p95:.0f} ms",
+                    "trace_pixmaps": "pixmaps: {megabytes:.0f} MB"
                 }
 
-configure.verify_default_config(CONFIG_PATH,default_content=DEFAULT_CONTENT)
+# preenchido com o arquivo do usuário por load_settings(), chamado em main():
+# importar o módulo não lê nem cria arquivos
+CONFIG=dict(DEFAULT_CONTENT)
 
-CONFIG=configure.load_config(CONFIG_PATH)
+def load_settings():
+    configure.verify_default_config(CONFIG_PATH,default_content=DEFAULT_CONTENT)
+    CONFIG.update(configure.load_config(CONFIG_PATH,default_content=DEFAULT_CONTENT))
 
 # -------------------------------
 # Bounding Box
 # -------------------------------
+class BoxStyle:
+    """
+    Recursos compartilhados por todas as BoundingBox: uma única fonte, um
+    QPen por cor e o rótulo de cada classe já desenhado numa QPixmap (por
+    faixa de zoom), para que centenas de caixas não criem objetos próprios.
+    """
+    LABEL_OFFSET = 18
+    _font = None
+    _metrics = None
+    _pens = {}
+    _label_sizes = {}
+    _label_pixmaps = {}
+    transparent_brush = QBrush(QColor(0, 0, 0, 0))
+
+    @classmethod
+    def font(cls):
+        if cls._font is None:
+            cls._font = QFont()
+            cls._font.setPointSize(CONFIG["boundingbox_fontsize"])
+            cls._font.setBold(True)
+            cls._metrics = QFontMetricsF(cls._font)
+        return cls._font
+
+    @classmethod
+    def pen(cls, color):
+        pen = cls._pens.get(color.rgba())
+        if pen is None:
+            pen = cls._pens[color.rgba()] = QPen(color, 2)
+        return pen
+
+    @classmethod
+    def label_size(cls, text):
+        size = cls._label_sizes.get(text)
+        if size is None:
+            cls.font()
+            size = cls._label_sizes[text] = QtCore.QSizeF(cls._metrics.horizontalAdvance(text) + 6,
+                                                          cls._metrics.height() + 2)
+        return size
+
+    @classmethod
+    def label_pixmap(cls, text, lod):
+        # potência de 2 mais próxima do zoom, para o texto continuar nítido
+        scale = 2.0 ** min(3, max(-2, round(math.log2(max(lod, 1e-6)))))
+        key = (text, scale)
+        pixmap = cls._label_pixmaps.get(key)
+        if pixmap is None:
+            size = cls.label_size(text)
+            pixmap = QPixmap(max(1, math.ceil(size.width()*scale)), max(1, math.ceil(size.height()*scale)))
+            pixmap.fill(QColor(255, 255, 255, 200))  # branco semi-transparente
+            painter = QPainter(pixmap)
+            painter.setRenderHint(QPainter.TextAntialiasing)
+            painter.scale(scale, scale)
+            painter.setFont(cls.font())
+            painter.setPen(Qt.black)  # texto preto
+            painter.drawText(QRectF(3, 1, size.width() - 3, size.height() - 1),
+                             Qt.AlignLeft | Qt.AlignTop, text)
+            painter.end()
+            cls._label_pixmaps[key] = pixmap
+        return pixmap
+
+
 class BoundingBox(QGraphicsRectItem):
     HANDLE_SIZE = 6
 
     def __init__(self, rect, class_name, color, parent=None):
-        super().__init__(rect)
+        super().__init__(rect, parent)
         self.setFlags(
             QGraphicsItem.ItemIsSelectable |
             QGraphicsItem.ItemIsMovable |
             QGraphicsItem.ItemSendsGeometryChanges
         )
         self.setAcceptHoverEvents(True)  # necessário para redimensionar
+        self.setBrush(BoxStyle.transparent_brush)
         self.resizing = False
         self.resize_direction = None  # "bottom_right", etc
+        self.over_handle = False
+        # em cenas densas o rótulo some quando fica pequeno demais na tela
+        self.dense = False
+        self.label_rect = QRectF()
+        self.handle_rect = QRectF()
+        self.set_class(class_name, color)
+
+    def reset(self, rect, class_name, color):
+        """
+        Prepara uma caixa reaproveitada para outra imagem.
+        """
+        self.setSelected(False)
+        self.setPos(0, 0)
+        self.resizing = False
+        self.over_handle = False
+        self.unsetCursor()
+        self.setRect(rect)
+        self.set_class(class_name, color)
 
+    def set_class(self, class_name, color):
+        self.prepareGeometryChange()
         self.class_name = class_name
-        self.color = color
-        
-        self.text_item = QGraphicsSimpleTextItem(class_name, self)
-        self.text_item.setBrush(QBrush(Qt.black))  # texto preto
-
-        font = QFont()
-        font.setPointSize(CONFIG["boundingbox_fontsize"]) 
-        font.setBold(True)
+        self.color = QColor(color)
+        self.label_size = BoxStyle.label_size(class_name)
+        self.setPen(BoxStyle.pen(self.color))
+        self.update_geometry()
 
-        self.text_item.setFont(font)
+    def setRect(self, rect):
+        super().setRect(rect)
+        self.update_geometry()
 
-
-        # fundo do texto
-        self.text_bg = QGraphicsRectItem(self)
-        self.text_bg.setBrush(QBrush(QColor(255, 255, 255, 200)))  # branco semi-transparente
-        self.text_bg.setPen(QPen(Qt.NoPen))  # sem borda
-
-        self.update_label_position()
-
-        self.setPen(QPen(color, 2))
-        self.setBrush(QBrush(QColor(0,0,0,0)))
-
-    def update_label_position(self):
+    def update_geometry(self):
+        # calculado só quando a caixa muda, não a cada evento do mouse
         rect = self.rect()
-
-        # posição do texto
-        text_x = rect.x()
-        text_y = rect.y() - 18
-
-        self.text_item.setPos(text_x + 3, text_y + 1)
-
-        # ajusta o fundo ao tamanho do texto
-        text_rect = self.text_item.boundingRect()
-        self.text_bg.setRect(
-            text_x,
-            text_y,
-            text_rect.width() + 6,
-            text_rect.height() + 2
-        )
-
-        # garante que o fundo fique atrás do texto
-        self.text_bg.setZValue(self.zValue())
-        self.text_item.setZValue(self.zValue() + 1)
+        self.label_rect = QRectF(rect.x(), rect.y() - BoxStyle.LABEL_OFFSET,
+                                 self.label_size.width(), self.label_size.height())
+        self.handle_rect = QRectF(  rect.right()-self.HANDLE_SIZE, 
+                                    rect.bottom()-self.HANDLE_SIZE,
+                                    self.HANDLE_SIZE*2, 
+                                    self.HANDLE_SIZE*2)
+        self.bounds = super().boundingRect().united(self.label_rect)
+
+    def boundingRect(self):
+        return self.bounds
+
+    def paint(self, painter, option, widget=None):
+        super().paint(painter, option, widget)
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if self.dense and lod * self.label_rect.height() < CONFIG["dense_label_min_pixels"]:
+            return
+        pixmap = BoxStyle.label_pixmap(self.class_name, lod)
+        painter.drawPixmap(self.label_rect, pixmap, QRectF(pixmap.rect()))
 
     def hoverMoveEvent(self, event):
         # Detecta se o mouse está próximo do canto inferior direito
-        rect = self.rect()
-        br_rect = QRectF(   rect.right()-self.HANDLE_SIZE, 
-                            rect.bottom()-self.HANDLE_SIZE,
-                            self.HANDLE_SIZE*2, 
-                            self.HANDLE_SIZE*2)
-        if br_rect.contains(event.pos()):
-            self.setCursor(Qt.SizeFDiagCursor)
-        else:
-            self.setCursor(Qt.ArrowCursor)
+        over = self.handle_rect.contains(event.pos())
+        if over != self.over_handle:
+            self.over_handle = over
+            self.setCursor(Qt.SizeFDiagCursor if over else Qt.ArrowCursor)
         super().hoverMoveEvent(event)
 
     def mousePressEvent(self, event):
-        rect = self.rect()
-        br_rect = QRectF(   rect.right()-self.HANDLE_SIZE, 
-                            rect.bottom()-self.HANDLE_SIZE,
-                            self.HANDLE_SIZE*2, 
-                            self.HANDLE_SIZE*2)
-        if br_rect.contains(event.pos()):
+        if self.handle_rect.contains(event.pos()):
             self.resizing = True
         else:
             super().mousePressEvent(event)
@@ -167,7 +290,6 @@ class BoundingBox(QGraphicsRectItem):
             rect = self.rect()
             rect.setBottomRight(event.pos())
             self.setRect(rect)
-            self.update_label_position()
         else:
             super().mouseMoveEvent(event)
 
@@ -187,6 +309,37 @@ class AnnotateScene(QGraphicsScene):
         self.temp_rect_item = None
         self.start_pos = None
         self.box_items = []
+        # caixas fora da cena, reaproveitadas na próxima imagem
+        self.box_pool = []
+        self.dense = False
+
+    def add_box(self, rect, class_name, color):
+        if self.box_pool:
+            box = self.box_pool.pop()
+            box.reset(rect, class_name, color)
+        else:
+            box = BoundingBox(rect, class_name, color)
+        box.dense = self.dense
+        self.addItem(box)
+        self.box_items.append(box)
+        return box
+
+    def remove_box(self, box):
+        self.removeItem(box)
+        if box in self.box_items:
+            self.box_items.remove(box)
+        if len(self.box_pool) < CONFIG["box_pool_size"]:
+            self.box_pool.append(box)
+
+    def release_boxes(self):
+        """
+        Tira todas as caixas da cena (antes de clear(), que as destruiria)
+        e as guarda para reuso.
+        """
+        for box in self.box_items:
+            self.removeItem(box)
+        self.box_pool.extend(self.box_items[:max(0, CONFIG["box_pool_size"] - len(self.box_pool))])
+        self.box_items = []
 
     def set_adding_class(self, class_name, color_name):
         self.adding_class = class_name
@@ -197,9 +350,7 @@ class AnnotateScene(QGraphicsScene):
             # Remove todos os boxes selecionados
             for item in self.selectedItems():
                 if isinstance(item, BoundingBox):
-                    self.removeItem(item)
-                    if item in self.box_items:
-                        self.box_items.remove(item)
+                    self.remove_box(item)
         else:
             super().keyPressEvent(event)
 
@@ -223,17 +374,35 @@ class AnnotateScene(QGraphicsScene):
         if self.temp_rect_item:
             rect = self.temp_rect_item.rect()
             if rect.width() > 5 and rect.height() > 5:
-                color = QColor(self.adding_color)
-                
-                box = BoundingBox(rect, self.adding_class, color)
-                self.addItem(box)
-                self.box_items.append(box)
+                self.add_box(rect, self.adding_class, QColor(self.adding_color))
             self.removeItem(self.temp_rect_item)
             self.temp_rect_item = None
             self.adding_class = None
         else:
             super().mouseReleaseEvent(event)
 
+# -------------------------------
+# View com zoom pela roda do mouse
+# -------------------------------
+class AnnotateView(QGraphicsView):
+    zoom_changed = pyqtSignal()
+
+    def __init__(self, scene, parent=None):
+        super().__init__(scene, parent)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120.0
+        if steps == 0:
+            return
+        factor = CONFIG["zoom_factor"] ** steps
+        self.scale(factor, factor)
+        self.zoom_changed.emit()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.zoom_changed.emit()
+
 # -------------------------------
 # Main App
 # -------------------------------
@@ -250,12 +419,58 @@ class AnnotateYoloApp(QMainWindow):
         
         self.dataset_path = ""
         self.repo = None
-        self.config = {}
+        self.sync_branch = ""
+        self.sync_head = None
+        self.store = None
+        self.dataset_index = None
+        self.dimension_index = None
+        self.dirty_labels = None
+        # rótulos gravados em segundo plano (temporário + os.replace)
+        self.label_writer = WriteBehindQueue(CONFIG["write_behind_batch_ms"])
         self.user = ""
         self.current_image = ""
+        self.image_size = QtCore.QSize()
+        self.pixmap_item = None
+        self.tiled_item = None
+        self.image_tiled = False
+        self.tile_tasks = {}
+        self.image_cache = ImageCache(  CONFIG["image_cache_megabytes"]*1024*1024,
+                                        prefetch=CONFIG["image_cache_prefetch"],
+                                        max_threads=CONFIG["image_cache_threads"],
+                                        parent=self)
+        self.image_cache.full_ready.connect(self.on_full_image_ready)
+        self.thumbnails = ThumbnailCache(   size=CONFIG["thumbnail_size"],
+                                            max_items=CONFIG["thumbnail_memory_count"],
+                                            max_threads=CONFIG["thumbnail_threads"],
+                                            parent=self)
+        self.git_sync = GitSyncEngine(  retry_seconds=CONFIG["git_retry_seconds"],
+                                        max_retries=CONFIG["git_max_retries"],
+                                        remote=CONFIG["git_remote"],
+                                        writer=self.label_writer,
+                                        stash_message=CONFIG["sync_stash_kept"],
+                                        parent=self)
+        QPixmapCache.setCacheLimit(max(QPixmapCache.cacheLimit(), CONFIG["tile_cache_megabytes"]*1024))
         self.create_toolbar()
         self.init_ui()
         self.init_progress_ui()
+        
+        # fsync periódico do diário de aprovações
+        self.journal_timer = QtCore.QTimer(self)
+        self.journal_timer.timeout.connect(self.sync_store)
+        self.journal_timer.start(CONFIG["journal_sync_ms"])
+        
+        self.git_sync.started.connect(self.on_sync_started)
+        self.git_sync.progress.connect(self.on_sync_progress)
+        self.git_sync.finished.connect(self.on_sync_finished)
+        self.git_sync.cancelled.connect(self.on_sync_cancelled)
+        self.git_sync.retry_scheduled.connect(self.on_sync_retry_scheduled)
+        
+        # resumo da instrumentação (--trace ou trace_file) na status bar
+        self.perf_timer = QtCore.QTimer(self)
+        self.perf_timer.timeout.connect(self.update_perf_status)
+        if tracer.enabled:
+            self.lbl_perf.show()
+            self.perf_timer.start(CONFIG["trace_status_ms"])
 
     def create_toolbar(self):
         # Toolbar exemplo (você pode adicionar actions depois)
@@ -355,32 +570,44 @@ class AnnotateYoloApp(QMainWindow):
         self.btn_update_dataset.hide()
         left_panel_layout.addWidget(self.btn_update_dataset)
 
-
+        self.chk_thumbnails = QCheckBox(CONFIG["thumbnails"])
+        left_panel_layout.addWidget(self.chk_thumbnails)
 
         left_panel_layout.addWidget(QLabel(CONFIG["to_annotate"]))
-        self.table_todo = QTableWidget(0,1)
+        self.model_todo = ImageListModel("Image", self)
+        self.table_todo = QTableView()
+        self.table_todo.setModel(self.model_todo)
         self.table_todo.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.table_todo.setSelectionBehavior(QAbstractItemView.SelectItems)  # célula por célula
         self.table_todo.setSelectionMode(QAbstractItemView.ExtendedSelection)  # múltiplas seleções
         #self.table_todo.setTextElideMode(QtCore.Qt.ElideNone)  # evita cortar texto visualmente
         self.table_todo.setDragEnabled(False)
-        self.table_todo.setHorizontalHeaderLabels(["Image"])
         self.table_todo.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.table_todo.itemSelectionChanged.connect(self.display_selected_image)
+        self.table_todo.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)  # sem medir cada linha
+        self.table_todo.selectionModel().selectionChanged.connect(
+            lambda *args, t=self.table_todo: self.display_selected_image(t))
         left_panel_layout.addWidget(self.table_todo)
 
         left_panel_layout.addWidget(QLabel(CONFIG["annotated"]))
-        self.table_done = QTableWidget(0,1)
+        self.model_done = ImageListModel("Image", self)
+        self.table_done = QTableView()
+        self.table_done.setModel(self.model_done)
         self.table_done.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.table_done.setSelectionBehavior(QAbstractItemView.SelectItems)  # célula por célula
         self.table_done.setSelectionMode(QAbstractItemView.ExtendedSelection)  # múltiplas seleções
         #self.table_done.setTextElideMode(QtCore.Qt.ElideNone)  # evita cortar texto visualmente
         self.table_done.setDragEnabled(False)
-        self.table_done.setHorizontalHeaderLabels(["Image"])
         self.table_done.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.table_done.itemSelectionChanged.connect(self.display_selected_image)
+        self.table_done.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)  # sem medir cada linha
+        self.table_done.selectionModel().selectionChanged.connect(
+            lambda *args, t=self.table_done: self.display_selected_image(t))
         left_panel_layout.addWidget(self.table_done)
 
+        # tira de miniaturas: as mesmas tabelas com linhas altas e ícones
+        self.list_row_height = self.table_todo.verticalHeader().defaultSectionSize()
+        self.chk_thumbnails.toggled.connect(self.set_thumbnails_visible)
+        self.chk_thumbnails.setChecked(CONFIG["show_thumbnails"])
+
         self.btn_commit = QPushButton(CONFIG["commit_and_push"])
         self.btn_commit.setIcon(QIcon(resource_path('icons', 'go-next.png'))) 
         self.btn_commit.clicked.connect(self.commit_push)
@@ -404,8 +631,9 @@ class AnnotateYoloApp(QMainWindow):
         right_panel_layout.addWidget(self.lbl_current_image)
 
         self.scene = AnnotateScene()
-        self.view = QGraphicsView(self.scene)
+        self.view = AnnotateView(self.scene)
         self.view.setRenderHint(QPainter.Antialiasing)
+        self.view.zoom_changed.connect(self.on_view_zoom_changed)
         right_panel_layout.addWidget(self.view)
 
         self.class_buttons_layout = QHBoxLayout()
@@ -427,9 +655,122 @@ class AnnotateYoloApp(QMainWindow):
         self.progress.setValue(0)  # exemplo: 40%
         self.progress.setFormat("%v/%m")  
         
+        # Estatísticas do cache de imagens
+        self.lbl_cache = QLabel("")
+        
+        # Latências p50/p95 da instrumentação
+        self.lbl_perf = QLabel("")
+        self.lbl_perf.hide()
+        
+        # Progresso da sincronização Git
+        self.sync_progress = QProgressBar()
+        self.sync_progress.setMaximumWidth(200)
+        self.sync_progress.setFormat("%p%")
+        self.sync_progress.hide()
+        self.btn_cancel_sync = QPushButton(CONFIG["cancel_sync"])
+        self.btn_cancel_sync.clicked.connect(self.git_sync.cancel)
+        self.btn_cancel_sync.hide()
+        
         # Adicionar na status bar
+        self.statusBar().addPermanentWidget(self.sync_progress)
+        self.statusBar().addPermanentWidget(self.btn_cancel_sync)
+        self.statusBar().addPermanentWidget(self.lbl_cache)
+        self.statusBar().addPermanentWidget(self.lbl_perf)
         self.statusBar().addPermanentWidget(self.progress)
+    
+    def head_commit(self):
+        try:
+            return self.repo.head.commit.hexsha
+        except ValueError:
+            # repositório ainda sem commits
+            return None
+
+    def on_sync_started(self, kind):
+        # o dataset só é recarregado se a sincronização trouxer commits novos
+        self.sync_head = self.head_commit()
+        self.btn_update_dataset.setEnabled(False)
+        self.btn_commit.setEnabled(False)
+        self.sync_progress.setRange(0, 0)
+        self.sync_progress.show()
+        self.btn_cancel_sync.show()
+        self.statusBar().showMessage(CONFIG["sync_running"])
+
+    def on_sync_progress(self, name, cur, total):
+        if total > 0:
+            self.sync_progress.setRange(0, total)
+            self.sync_progress.setValue(min(cur, total))
+        self.statusBar().showMessage(f"{name}: {cur}/{total}" if total else name)
+
+    def end_sync_ui(self):
+        self.sync_progress.hide()
+        self.btn_cancel_sync.hide()
+        self.btn_update_dataset.setEnabled(True)
+        self.btn_commit.setEnabled(True)
+        self.statusBar().clearMessage()
+
+    def on_sync_finished(self, kind, ok, message):
+        self.end_sync_ui()
+        if ok:
+            if self.head_commit() != self.sync_head:
+                self.reload_dataset()
+            if kind == "pull":
+                QMessageBox.information(self, CONFIG["name_git"], CONFIG["repository_updated"]+f" '{self.sync_branch}'.")
+            else:
+                QMessageBox.information(self, CONFIG["name_git"], CONFIG["changes_pushed"]+f"\n{message}")
+        elif self.git_sync.has_pending_retry():
+            # erro transitório: o push será repetido sozinho
+            return
+        elif kind == "pull":
+            QMessageBox.warning(self, CONFIG["error_git"], CONFIG["pull_conflict"] + "\n\n" + message)
+        else:
+            QMessageBox.warning(self, CONFIG["error_git"], CONFIG["conflict_detected_git"] + f"\n{message}")
+
+    def on_sync_cancelled(self, kind):
+        self.end_sync_ui()
+        self.statusBar().showMessage(CONFIG["sync_cancelled"], 5000)
+
+    def on_sync_retry_scheduled(self, seconds):
+        self.statusBar().showMessage(CONFIG["sync_retry"].format(seconds=seconds))
+
+    def update_cache_status(self):
+        self.lbl_cache.setText(CONFIG["cache_status"].format(**self.image_cache.stats()))
         
+    def set_thumbnails_visible(self, visible):
+        size = CONFIG["thumbnail_size"]
+        for table, model in ((self.table_todo, self.model_todo), (self.table_done, self.model_done)):
+            table.setIconSize(QtCore.QSize(size, size) if visible else QtCore.QSize())
+            table.verticalHeader().setDefaultSectionSize(size + 4 if visible else self.list_row_height)
+            model.set_thumbnails(self.thumbnails if visible else None)
+        if not visible:
+            self.thumbnails.cancel()
+
+    def pixmap_memory(self):
+        """
+        Bytes das imagens em memória: cache de decodificação, pixmap
+        exibida e miniaturas (os tiles ficam no QPixmapCache, limitado
+        por tile_cache_megabytes).
+        """
+        displayed = 0
+        if self.pixmap_item is not None:
+            pixmap = self.pixmap_item.pixmap()
+            displayed = pixmap.width() * pixmap.height() * pixmap.depth() // 8
+        return {"image_cache": self.image_cache.total_bytes,
+                "displayed": displayed,
+                "thumbnails": self.thumbnails.total_bytes}
+
+    def update_perf_status(self):
+        memory = self.pixmap_memory()
+        tracer.counter("pixmap_memory", **memory)
+        tracer.flush()
+        summary = tracer.summary()
+        parts = [CONFIG["trace_status"].format(name=name, p50=summary[name]["p50_ms"], p95=summary[name]["p95_ms"])
+                 for name in CONFIG["trace_status_spans"] if name in summary]
+        parts.append(CONFIG["trace_pixmaps"].format(megabytes=sum(memory.values()) / (1024 * 1024)))
+        self.lbl_perf.setText(" | ".join(parts))
+        self.lbl_perf.setToolTip("\n".join(
+            CONFIG["trace_status"].format(name=name, p50=s["p50_ms"], p95=s["p95_ms"]) + f" (n={s['count']})"
+            for name, s in sorted(summary.items())))
+
     def change_selected_box_class(self, new_class):       
         try:
             cls_id = self.classes.index(new_class)
@@ -439,12 +780,7 @@ class AnnotateYoloApp(QMainWindow):
         
         for box in self.scene.selectedItems():
             if isinstance(box, BoundingBox):
-                box.class_name = new_class
-                box.text_item.setText(new_class)
-                # Atualiza cor
-                box.color = QColor(self.classes_colors[cls_id])
-                box.setPen(QPen(box.color, 2))
-                box.text_item.setBrush(QBrush(box.color))
+                box.set_class(new_class, QColor(self.classes_colors[cls_id]))
 
     # -------------------------------
     # Dataset / User
@@ -452,13 +788,13 @@ class AnnotateYoloApp(QMainWindow):
     def select_dataset(self):
         folder = QFileDialog.getExistingDirectory(self,CONFIG["select_dataset_folder"])
         if folder:
+            # salva o diário do dataset anterior antes de trocar
+            self.save_config()
             self.dataset_path = folder
             
-            
-            
             self.load_config()
 
-            users = [key.replace("images_","") for key in self.config if key.startswith("images_")]
+            users = self.store.users() if self.store else []
             if not users:
                 QMessageBox.warning(self,CONFIG["error"],CONFIG["config_no_found"])
                 return
@@ -469,6 +805,9 @@ class AnnotateYoloApp(QMainWindow):
             self.lbl_dataset.setText(folder)
             self.lbl_user.setText(user)
 
+            self.image_cache.set_dataset(folder, has_label=self.dataset_index.has_label,
+                                         num_classes=len(self.classes))
+            self.thumbnails.set_dataset(self.dataset_path, self.dataset_index.image_stat)
             self.init_git()            
             self.populate_tables()
             self.create_class_buttons()
@@ -479,19 +818,29 @@ class AnnotateYoloApp(QMainWindow):
 
 
     def update_dataset(self):
-        self.setEnabled(False)
         self.init_git()
         
+        # o pull roda em segundo plano; on_sync_finished recarrega as tabelas
         self.pull_remote()
-        
+
+    def reload_dataset(self):
+        # o pull pode ter alterado o config.json, imagens e rótulos
+        self.load_config()
+        if self.store is None:
+            return
+        self.image_cache.set_dataset(self.dataset_path, has_label=self.dataset_index.has_label,
+                                     num_classes=len(self.classes))
+        self.thumbnails.set_dataset(self.dataset_path, self.dataset_index.image_stat)
         self.populate_tables()
         self.create_class_buttons()
-        self.setEnabled(True)
 
     # -------------------------------
     # Git
     # -------------------------------
     def init_git(self):
+        # GitPython só é importado quando um dataset é aberto
+        from git import Repo, GitCommandError
+
         try:
             if not os.path.exists(os.path.join(self.dataset_path,".git")):
                 self.repo = Repo.init(self.dataset_path)
@@ -505,11 +854,14 @@ class AnnotateYoloApp(QMainWindow):
         except GitCommandError as e:
             QMessageBox.warning(self,CONFIG["error_git"],str(e))
 
+    @traced()
     def pull_remote(self):
         """
         Atualiza o repositório local com o conteúdo do remoto,
         modificando os arquivos da pasta de trabalho para refletir o remoto.
         """
+        from git import GitCommandError
+
         if not hasattr(self, "repo") or self.repo is None:
             QMessageBox.warning(self, CONFIG["error_git"], CONFIG["uninitialized"])
             return
@@ -526,8 +878,8 @@ class AnnotateYoloApp(QMainWindow):
                 )
                 return
 
-            # Garante que há pelo menos um remoto
-            if not self.repo.remotes:
+            # Garante que o remoto configurado existe
+            if CONFIG["git_remote"] not in [remote.name for remote in self.repo.remotes]:
                 QMessageBox.warning(
                     self,
                     CONFIG["error_git"],
@@ -535,27 +887,29 @@ class AnnotateYoloApp(QMainWindow):
                 )
                 return
 
-            # Pull do remoto com rebase para atualizar o working tree
-            try:
-                self.repo.git.pull("--rebase", "origin", branch.name)
-                QMessageBox.information(self, CONFIG["name_git"], CONFIG["repository_updated"]+f" '{branch.name}'.")
-            except GitCommandError as e:
-                QMessageBox.warning(
-                    self,
-                    CONFIG["error_git"],
-                    CONFIG["pull_conflict"] + "\n\n" + str(e)
-                )
+            # Pull do remoto com rebase, em segundo plano
+            self.sync_branch = branch.name
+            self.git_sync.set_repository(self.dataset_path)
+            self.git_sync.pull(branch.name)
 
         except GitCommandError as e:
             QMessageBox.warning(self, CONFIG["error_git"], str(e))
 
 
     def commit_push(self):
+        from git import GitCommandError
+
         self.setEnabled(False)
         if not self.repo:
             self.setEnabled(True)
             return
 
+        with tracer.span("commit_flush_writes"):
+            flushed = self.flush_writes()
+        if not flushed:
+            self.setEnabled(True)
+            return
+
         try:
             # 0. Verifica se HEAD está detached
             try:
@@ -569,28 +923,41 @@ class AnnotateYoloApp(QMainWindow):
                 )
                 return
 
-            # 1. Buscar a versão remota do config.json
-            try:
-                remote_file = self.repo.git.show(f"origin/{branch.name}:config.json")
-                remote_config = json.loads(remote_file)
-            except GitCommandError:
-                remote_config = copy.deepcopy(self.config)
-                #remote_config = {}  # caso não exista ainda no remoto
-
-            # 2. Mescla apenas a chave do usuário
-            key_user = f"images_{self.user}"
-            if key_user in self.config:
-                remote_config[key_user] = self.config[key_user].copy()
-
-            # 3. Salva o config.json mesclado
-            config_path = os.path.join(self.dataset_path, "config.json")
-            with open(config_path, "w", encoding="utf-8") as f:
-                json.dump(remote_config, f, indent=4, ensure_ascii=False)
-
-            # 4. Adiciona arquivos ao índice
-            self.repo.git.add("labels")
-            self.repo.git.add("config.json")
-            self.repo.git.add("README.md")
+            if self.store.sharded:
+                # 1-3. Projeto em shards: só o arquivo do próprio usuário muda
+                self.store.save()
+                commit_files = ["README.md"]
+                if self.user in self.store.users():
+                    commit_files.append(shard_relpath(self.user))
+            else:
+                # 1. Buscar a versão remota do config.json
+                try:
+                    with tracer.span("git_show_config"):
+                        remote_file = self.repo.git.show(f"{CONFIG['git_remote']}/{branch.name}:config.json")
+                    remote_config = json.loads(remote_file)
+                except GitCommandError:
+                    # caso não exista ainda no remoto, parte do config.json local
+                    with open(os.path.join(self.dataset_path, "config.json"), "r") as f:
+                        remote_config = json.load(f)
+
+                # 2. Mescla apenas a chave do usuário
+                key_user = f"images_{self.user}"
+                if self.user in self.store.users():
+                    remote_config[key_user] = self.store.user_assignment(self.user)
+
+                # 3. Salva o config.json mesclado
+                config_path = os.path.join(self.dataset_path, "config.json")
+                with tracer.span("commit_merge_config"):
+                    atomic_write(config_path, json.dumps(remote_config, indent=4, ensure_ascii=False))
+                
+                # o config.json agora contém todas as aprovações pendentes
+                self.store.mark_saved()
+                commit_files = ["config.json", "README.md"]
+
+            # 4. Adiciona ao índice só os rótulos alterados
+            with tracer.span("git_add", files=len(self.dirty_labels) + len(commit_files)):
+                self.dirty_labels.stage(self.repo, os.path.join(project_cache_dir(self.dataset_path), "pathspec.txt"),
+                                        extra=commit_files)
 
             # 4.1 Pede a mensagem de commit ao usuário
             default_msg = CONFIG["update_annotations_by"] + f" {self.user}"
@@ -611,32 +978,13 @@ class AnnotateYoloApp(QMainWindow):
                 return
 
             # 4.2 Faz commit com a mensagem
-            self.repo.index.commit(commit_msg)
+            with tracer.span("git_commit"):
+                self.repo.index.commit(commit_msg)
+            self.dirty_labels.clear()
 
-            # 5. Pull --rebase para sincronizar com remoto
-            try:
-                self.repo.git.pull("--rebase", "origin", branch.name)
-            except GitCommandError as e:
-                self.setEnabled(True)
-                QMessageBox.warning(
-                    self,
-                    CONFIG["error_git"],
-                    CONFIG["conflict_detected_git"] + f"\n{str(e)}"
-                )
-                return  # aborta push até conflito ser resolvido
-
-            # 6. Push após sincronizar
-            output_messages = []
-            for remote in self.repo.remotes:
-                try:
-                    msg = remote.push(refspec=f"{branch.name}:{branch.name}", set_upstream=True)
-                    output_messages.append(str(msg))
-                except GitCommandError as e:
-                    msg = remote.push(refspec=f"{branch.name}:{branch.name}")
-                    output_messages.append(str(msg))
-                    QMessageBox.warning(self, CONFIG["error_git"], str(e))
-
-            QMessageBox.information(self, CONFIG["name_git"], "\n".join(output_messages))
+            # 5-6. Pull --rebase e push em segundo plano; a anotação continua
+            self.git_sync.set_repository(self.dataset_path)
+            self.git_sync.push(branch.name)
 
         except GitCommandError as e:
             QMessageBox.warning(self, CONFIG["error_git"], str(e))
@@ -651,49 +999,108 @@ class AnnotateYoloApp(QMainWindow):
         if not os.path.exists(config_path):
             QMessageBox.warning(self,CONFIG["error"],"config.json "+CONFIG["not_found"])
             return
-        with open(config_path,"r") as f:
-            self.config = json.load(f)
-        self.classes = self.config.get("classes",[])
-        self.classes_colors = self.config.get("classes_colors",[])
+        self.flush_writes()
+        if self.store is not None:
+            self.store.close()
+        # o backend json reaplica o diário de aprovações (ex.: queda do programa)
+        self.store = open_project_store(self.dataset_path,
+                                        backend=CONFIG["project_backend"],
+                                        journal_batch_size=CONFIG["journal_batch_size"])
+        self.classes = self.store.classes
+        self.classes_colors = self.store.classes_colors
+        
+        # uma varredura de images/ e labels/ em vez de um stat por imagem
+        self.dataset_index = DatasetIndex.load(self.dataset_path)
+        if self.dimension_index is not None:
+            self.dimension_index.save()
+        self.dimension_index = DimensionIndex.load(self.dataset_path)
+
+        # rótulos escritos e ainda não enviados num commit
+        self.dirty_labels = dirty_labels_of(self.dataset_path)
 
+    @traced()
     def save_config(self):
-        config_path = os.path.join(self.dataset_path, "config.json")
+        """
+        Consolida as aprovações pendentes no config.json.
+        """
+        if self.store is None:
+            return True
         try:
-            with open(config_path, "w") as f:
-                json.dump(self.config, f, indent=4, ensure_ascii=False)
+            return self.store.save()
         except Exception as e:
             QMessageBox.warning(self, CONFIG["error"], CONFIG["no_save_config"] + f"\n{e}")
+            return False
+
+    def record_approval(self, img_name, value=True):
+        """
+        Registra a aprovação no store (diário no backend json) em vez de
+        reescrever o config.json.
+        """
+        try:
+            self.store.set_approved(self.user, img_name, value)
+        except Exception as e:
+            QMessageBox.warning(self, CONFIG["error"], CONFIG["no_save_approval"] + f"\n{e}")
+
+    def sync_store(self):
+        if self.store is not None:
+            try:
+                self.store.sync()
+            except OSError:
+                pass
+        self.report_write_errors(self.label_writer.take_errors())
+
+    def flush_writes(self):
+        """
+        Espera os rótulos na fila chegarem ao disco. Retorna False se algum falhou.
+        """
+        return self.report_write_errors(self.label_writer.flush())
+
+    def report_write_errors(self, errors):
+        if not errors:
+            return True
+        details = "\n".join(f"{path}: {e}" for path, e in errors[:10])
+        QMessageBox.warning(self, CONFIG["error"], CONFIG["no_save_label"] + f"\n{details}")
+        return False
+
+    def closeEvent(self, event):
+        self.git_sync.cancel()
+        self.git_sync.wait()
+        self.report_write_errors(self.label_writer.close())
+        self.save_config()
+        if self.store is not None:
+            self.store.close()
+        if self.dimension_index is not None:
+            self.dimension_index.save()
+        tracer.stop()
+        super().closeEvent(event)
 
     # -------------------------------
     # Tables
     # -------------------------------
+    @traced()
     def populate_tables(self):
-        self.table_todo.setRowCount(0)
-        self.table_done.setRowCount(0)
-        
-        user_data_images = self.config.get(f"images_{self.user}", {})
-        
-        #user_images = natsorted(user_images)
+        user_data_images = self.store.images(self.user)
 
         self.progress.setMaximum(len(user_data_images))   # valor inicial
 
-        for img_name in user_data_images:
-            approved = user_data_images[img_name]
+        approved_names = set()
+        existing = []
+        for img_name, approved in user_data_images:
             
-            img_path = os.path.join(self.dataset_path, "images", img_name)
-            if not os.path.exists(img_path):
+            if not self.dataset_index.has_image(img_name):
                 continue
+            existing.append(img_name)
+            if approved:
+                approved_names.add(img_name)
 
-            # procura o txt correspondente
-            nome_base, _ = os.path.splitext(img_name)
-            label_path = os.path.join(self.dataset_path, "labels", nome_base + ".txt")
-
-            table = self.table_todo if not approved else self.table_done
-            row = table.rowCount()
-            table.insertRow(row)
-            table.setItem(row, 0, QTableWidgetItem(img_name))
+        # ordem natural calculada uma única vez; os modelos guardam só posições
+        image_index = ImageIndex(existing)
+        todo = [i for i, name in enumerate(image_index.names) if name not in approved_names]
+        done = [i for i, name in enumerate(image_index.names) if name in approved_names]
+        self.model_todo.set_images(image_index, todo)
+        self.model_done.set_images(image_index, done)
 
-        self.progress.setValue(self.table_done.rowCount())
+        self.progress.setValue(self.model_done.rowCount())
 
 
     # -------------------------------
@@ -739,49 +1146,162 @@ class AnnotateYoloApp(QMainWindow):
     # -------------------------------
     # Display image
     # -------------------------------
-    def display_selected_image(self):
-        sender = self.sender()
-        items = sender.selectedItems()
-        if not items: 
+    def display_selected_image(self, sender):
+        indexes = sender.selectionModel().selectedIndexes()
+        if not indexes: 
             return
 
-        img_name = items[0].text()
+        model = sender.model()
+        row = indexes[0].row()
+        img_name = model.name_at(row)
         self.current_image = img_name
         self.load_image_and_boxes(img_name)
         self.lbl_current_image.setText(self.current_image)
         
+        # pré-carrega as vizinhas na direção da navegação
+        self.image_cache.prefetch_around(row, model.name_at)
+        self.update_cache_status()
+        
         if sender is self.table_todo:
             self.table_done.clearSelection()
         elif sender is self.table_done:
             self.table_todo.clearSelection()
 
+    @traced()
     def load_image_and_boxes(self,img_name):
+        self.scene.release_boxes()
         self.scene.clear()
-        self.scene.box_items = []
+        self.pixmap_item = None
+        self.tiled_item = None
+        self.image_cache.set_preview_size(self.preview_size())
+        
         img_path = os.path.join(self.dataset_path,"images",img_name)
-        pixmap = QPixmap(img_path)
-        self.pixmap_item = self.scene.addPixmap(pixmap)
-        self.view.fitInView(self.pixmap_item,Qt.KeepAspectRatio)
+        # tamanho lido só do cabeçalho (em cache no índice de dimensões)
+        dims = self.dimension_index.size_of(img_name, self.dataset_index.image_stat(img_name))
+        size = QtCore.QSize(*dims) if dims else QImageReader(img_path).size()
+        tiled = size.isValid() and size.width()*size.height() >= CONFIG["tiled_min_megapixels"]*1e6
+        self.image_tiled = tiled
+        
+        if tiled:
+            # Imagens gigantes: nunca viram uma única QPixmap
+            self.image_size = size
+            labels = empty_labels()
+            if self.dataset_index.has_label(img_name):
+                with tracer.span("label_parse"):
+                    labels = read_yolo_file(label_path_of(self.dataset_path, img_name), len(self.classes))
+            pyramid = TilePyramid(  self.dataset_path, img_name, size.width(), size.height(),
+                                    tile_size=CONFIG["tile_size"])
+            if pyramid.is_built():
+                self.set_tiled_item(pyramid)
+            else:
+                reader = QImageReader(img_path)
+                if reader.supportsOption(QImageIOHandler.ScaledSize):
+                    entry = self.image_cache.get(img_name)
+                    self.pixmap_item = self.scene.addPixmap(QPixmap())
+                    self.pixmap_item.setTransformationMode(Qt.SmoothTransformation)
+                    self.set_pixmap_image(entry.image)
+                self.start_tile_build(img_name, pyramid)
+        else:
+            entry = self.image_cache.get(img_name)
+            # A cena fica sempre em pixels da imagem original, mesmo quando
+            # a pixmap exibida é uma pré-visualização reduzida.
+            self.image_size = entry.size
+            labels = entry.labels
+            self.pixmap_item = self.scene.addPixmap(QPixmap())
+            self.pixmap_item.setTransformationMode(Qt.SmoothTransformation)
+            self.set_pixmap_image(entry.image)
+        
+        w,h = self.image_size.width(), self.image_size.height()
+        self.scene.setSceneRect(QRectF(0, 0, w, h))
+        self.view.fitInView(self.scene.sceneRect(),Qt.KeepAspectRatio)
+        # decodificação completa só se a pré-visualização já ficar ampliada na tela
+        self.refine_current_image()
+
+        # Sem rótulo ainda: mostra as propostas do pré-anotador como caixas editáveis
+        if CONFIG["show_proposals"] and not self.dataset_index.has_label(img_name):
+            # o pré-anotador (e o numpy) só é importado quando é usado
+            from detection_dataset_annotator.modules.preannotation import read_proposals
+
+            proposals = read_proposals( self.dataset_path, img_name, len(self.classes),
+                                        stat=self.dataset_index.image_stat(img_name),
+                                        min_score=CONFIG["proposal_min_score"])
+            if len(proposals.classes):
+                labels = proposals
+                self.statusBar().showMessage(CONFIG["proposals_loaded"].format(count=len(proposals.classes)), 5000)
+
+        # Load YOLO labels (já lidos e validados junto com a imagem)
+        if labels.errors:
+            self.statusBar().showMessage(CONFIG["invalid_label_rows"].format(count=len(labels.errors),
+                                                                             name=img_name), 5000)
+        self.scene.dense = len(labels.classes) >= CONFIG["dense_scene_min_boxes"]
+        colors = [QColor(c) for c in self.classes_colors]
+        with tracer.span("scene_build", boxes=len(labels.classes)):
+            for cls_id, (cx, cy, bw, bh) in zip(labels.classes.tolist(), labels.boxes.tolist()):
+                x = (cx-bw/2)*w
+                y = (cy-bh/2)*h
+                rect = QRectF(x,y,bw*w,bh*h)
+                self.scene.add_box(rect, self.classes[cls_id], colors[cls_id])
+
+    def preview_size(self):
+        ratio = self.view.devicePixelRatioF()
+        size = self.view.viewport().size()
+        return QtCore.QSize(max(1, int(size.width()*ratio)), max(1, int(size.height()*ratio)))
+
+    def set_pixmap_image(self, image):
+        self.pixmap_item.setPixmap(QPixmap.fromImage(image))
+        sx = self.image_size.width() / max(1, image.width())
+        sy = self.image_size.height() / max(1, image.height())
+        self.pixmap_item.setTransform(QTransform.fromScale(sx, sy))
+
+    def set_tiled_item(self, pyramid):
+        if self.pixmap_item is not None:
+            self.scene.removeItem(self.pixmap_item)
+            self.pixmap_item = None
+        self.tiled_item = TiledImageItem(pyramid)
+        self.tiled_item.setZValue(-1)
+        self.scene.addItem(self.tiled_item)
+
+    def start_tile_build(self, img_name, pyramid):
+        if img_name in self.tile_tasks:
+            return
+        task = PyramidBuildTask(img_name, pyramid, CONFIG["tile_decode_megabytes"]*1024*1024)
+        task.signals.progress.connect(self.on_tile_build_progress)
+        task.signals.finished.connect(self.on_tile_build_finished)
+        self.tile_tasks[img_name] = task
+        QtCore.QThreadPool.globalInstance().start(task)
+
+    def on_tile_build_progress(self, img_name, done, total):
+        self.statusBar().showMessage(CONFIG["building_tiles"]+f" {img_name}: {done}/{total}")
+
+    def on_tile_build_finished(self, img_name, ok):
+        task = self.tile_tasks.pop(img_name, None)
+        self.statusBar().clearMessage()
+        if not ok:
+            QMessageBox.warning(self, CONFIG["error"], CONFIG["building_tiles_error"]+f"\n{img_name}")
+            return
+        if task is not None and img_name == self.current_image and self.tiled_item is None:
+            self.set_tiled_item(task.pyramid)
+
+    def preview_is_upscaled(self):
+        # verdadeiro se cada pixel da pré-visualização ocupa mais de um pixel na tela
+        if self.pixmap_item is None or self.image_tiled:
+            return False
+        on_screen = self.view.transform().m11() * self.image_size.width() * self.view.devicePixelRatioF()
+        return on_screen > self.pixmap_item.pixmap().width() + 1
+
+    def refine_current_image(self):
+        if not self.current_image or not self.preview_is_upscaled():
+            return
+        if self.image_cache.request_full(self.current_image):
+            entry = self.image_cache.get(self.current_image)
+            self.set_pixmap_image(entry.image)
 
-        # Load YOLO labels
-        nome_base, _ = os.path.splitext(img_name)
-        label_path = os.path.join(self.dataset_path, "labels", nome_base + ".txt")
-        if os.path.exists(label_path):
-            w,h = pixmap.width(), pixmap.height()
-            with open(label_path,"r") as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if len(parts)!=5: continue
-                    cls_id, cx, cy, bw, bh = parts
-                    cls_id = int(cls_id)
-                    cx,cy,bw,bh = float(cx),float(cy),float(bw),float(bh)
-                    x = (cx-bw/2)*w
-                    y = (cy-bh/2)*h
-                    rect = QRectF(x,y,bw*w,bh*h)
-                    color = QColor(self.classes_colors[cls_id])
-                    box = BoundingBox(rect,self.classes[cls_id],color)
-                    self.scene.addItem(box)
-                    self.scene.box_items.append(box)
+    def on_view_zoom_changed(self):
+        self.refine_current_image()
+
+    def on_full_image_ready(self, img_name):
+        if img_name == self.current_image:
+            self.refine_current_image()
 
     # -------------------------------
     # Start adding box
@@ -795,6 +1315,7 @@ class AnnotateYoloApp(QMainWindow):
     # -------------------------------
     # Approve image
     # -------------------------------
+    @traced()
     def approve_image(self):
         if not self.current_image:
             return
@@ -802,53 +1323,65 @@ class AnnotateYoloApp(QMainWindow):
         nome_base, _ = os.path.splitext(self.current_image)
         label_path = os.path.join(self.dataset_path, "labels", nome_base + ".txt")
         
-        os.makedirs(os.path.dirname(label_path), exist_ok=True)
+        if not self.dataset_index.has_label_dir(self.current_image):
+            os.makedirs(os.path.dirname(label_path), exist_ok=True)
         
         if self.scene.box_items:
-            w = self.pixmap_item.pixmap().width()
-            h = self.pixmap_item.pixmap().height()
-            with open(label_path, "w") as f:
-                for box in self.scene.box_items:
-                    # Usa as coordenadas em cena (posição + rect do item)
-                    rect = box.sceneBoundingRect()
-                    x = rect.x()
-                    y = rect.y()
-                    bw_px = rect.width()
-                    bh_px = rect.height()
-
-                    cx = (x + bw_px / 2) / w
-                    cy = (y + bh_px / 2) / h
-                    bw = bw_px / w
-                    bh = bh_px / h
-
-                    cls_id = self.classes.index(box.class_name)
-                    f.write(f"{cls_id} {cx} {cy} {bw} {bh}\n")
+            # tamanho original, independente da resolução exibida
+            w = self.image_size.width()
+            h = self.image_size.height()
+            cls_ids = []
+            boxes = []
+            for box in self.scene.box_items:
+                # Usa as coordenadas em cena (posição + rect do item), sem a
+                # largura da caneta, para que reaprovar não aumente a caixa
+                rect = box.mapRectToScene(box.rect())
+                x = rect.x()
+                y = rect.y()
+                bw_px = rect.width()
+                bh_px = rect.height()
+
+                cx = (x + bw_px / 2) / w
+                cy = (y + bh_px / 2) / h
+                bw = bw_px / w
+                bh = bh_px / h
+
+                cls_ids.append(self.classes.index(box.class_name))
+                boxes.append((cx, cy, bw, bh))
+            labels = labels_from_rows(cls_ids, boxes)
+            content = format_yolo(labels.classes, labels.boxes, CONFIG["label_precision"])
+
+            # rótulo idêntico ao do disco: nada a escrever nem a enviar
+            unchanged = False
+            if self.dataset_index.has_label(self.current_image):
+                unchanged = self.label_writer.read_text(label_path) == content
+            if not unchanged:
+                # o clique não espera o disco: a escrita vai para a fila
+                self.label_writer.write(label_path, content)
+                self.dataset_index.set_label(self.current_image)
+                rel_path = os.path.relpath(label_path, self.dataset_path).replace(os.sep, "/")
+                self.dirty_labels.add(rel_path)
+            self.image_cache.update_labels(self.current_image, labels)
+
+        # imagem revisada: as propostas já viraram (ou não) rótulos
+        discard_proposals(self.dataset_path, self.current_image)
         
         # Update tables
-        items = self.table_todo.findItems(self.current_image, Qt.MatchExactly)
-        if items:
-            row = items[0].row()
-            self.table_todo.removeRow(row)
-            row_done = self.table_done.rowCount()
-            self.table_done.insertRow(row_done)
-            self.table_done.setItem(row_done, 0, QTableWidgetItem(self.current_image))
+        if self.model_todo.take(self.current_image):
+            self.model_done.insert(self.current_image)
 
         # Atualiza config
-        self.config[f"images_{self.user}"][self.current_image] = True
-        self.save_config()
+        self.record_approval(self.current_image, True)
         
         # Atualiza progresso
-        self.progress.setValue(self.table_done.rowCount())
+        self.progress.setValue(self.model_done.rowCount())
         
 # -------------------------------
 # Main
 # -------------------------------
 def main():
     signal.signal(signal.SIGINT, signal.SIG_DFL)
-    
-    create_desktop_directory()    
-    create_desktop_menu()
-    create_desktop_file(os.path.join("~",".local","share","applications"))
+    load_settings()
     
     for n in range(len(sys.argv)):
         if sys.argv[n] == "--autostart":
@@ -862,10 +1395,28 @@ def main():
             create_desktop_file(os.path.join("~",".local","share","applications"), overwrite=True)
             return
     
+    # atalhos do menu só na primeira execução de cada versão
+    ensure_desktop_integration()
+    
+    # instrumentação opcional: --trace arquivo.json (Chrome) ou arquivo.jsonl
+    trace_path = CONFIG["trace_file"]
+    if "--trace" in sys.argv[:-1]:
+        trace_path = sys.argv[sys.argv.index("--trace") + 1]
+    if trace_path:
+        tracer.start(os.path.expanduser(trace_path))
+    
+    profile = None
+    if "--profile-startup" in sys.argv:
+        profile = StartupProfile(STARTUP_TIME, about.__package__ + ".program_annotator")
+        profile.mark("imports")
+    
     app = QApplication(sys.argv)
     app.setApplicationName(about.__program_name__) 
     
     window = AnnotateYoloApp()
+    if profile is not None:
+        profile.mark("main window created")
+        profile.watch(window)
     window.show()
     sys.exit(app.exec_())
 
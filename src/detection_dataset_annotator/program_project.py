@@ -1,30 +1,36 @@
 #!/usr/bin/python3
 
+import time
+STARTUP_TIME = time.perf_counter()  # referência do --profile-startup
+
 import os
 import sys
 import json
 import random
 import subprocess
 import signal
-
-from natsort import natsorted
+import argparse
 
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, 
-    QLabel, QLineEdit, QFileDialog, QSizePolicy, QMessageBox, 
-    QMainWindow, QAction)
-from PyQt5.QtCore import Qt, QUrl, QDateTime, QSize
+    QLabel, QLineEdit, QFileDialog, QSizePolicy, QMessageBox, QCheckBox, 
+    QMainWindow, QAction, QProgressDialog)
+from PyQt5.QtCore import Qt, QUrl, QDateTime, QSize, QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt5.QtGui import QDesktopServices, QIcon
-    
-from git import Repo, GitCommandError
 
 import detection_dataset_annotator.about as about
 import detection_dataset_annotator.modules.configure as configure 
 from detection_dataset_annotator.desktop import create_desktop_file
 from detection_dataset_annotator.desktop import create_desktop_directory
 from detection_dataset_annotator.desktop import create_desktop_menu
+from detection_dataset_annotator.desktop import ensure_desktop_integration
 from detection_dataset_annotator.modules.wabout  import show_about_window
 from detection_dataset_annotator.modules.resources import resource_path
+from detection_dataset_annotator.modules.startup_profile import StartupProfile
+from detection_dataset_annotator.modules.dataset_index import DatasetIndex
+from detection_dataset_annotator.modules.project_builder import (
+    scan_images, iter_images, iter_manifest, distribute_images, HashAssigner, assign_by_hash,
+    write_project, git_initial_commit, ingest_images)
 
 CONFIG_PATH = os.path.join( os.path.expanduser("~"),
                             ".config",
@@ -72,13 +78,29 @@ DEFAULT_CONTENT={   "toolbar_configure": "Configure",
                     "git_msg_title": "Git",
                     "git_msg_text": "Initial commit submitted to remote repository!",
                     "git_msg_error": "Git error",
-                    "git_msg_error_text": "Error sending to Git:"
+                    "git_msg_error_text": "Error sending to Git:",
+                    "project_backend": "json",
+                    "sharded_assignments": "One assignment file per user",
+                    "sharded_assignments_tooltip": "Write config.json as a small manifest and each user's images to assignments/<user>.json, so commits only touch the annotator's own file.",
+                    "sharded_assignments_default": False,
+                    "scan_workers": 8,
+                    "assignment_mode": "random",
+                    "assignment_seed": "",
+                    "near_duplicates": "off",
+                    "near_duplicate_hash": "dhash",
+                    "near_duplicate_distance": 4,
+                    "near_duplicates_progress": "Looking for near-duplicate images...",
+                    "near_duplicates_error": "Error while looking for near-duplicate images:"
                 }
 
 
-configure.verify_default_config(CONFIG_PATH,default_content=DEFAULT_CONTENT)
+# preenchido com o arquivo do usuário por load_settings(), chamado em main():
+# importar o módulo não lê nem cria arquivos
+CONFIG=dict(DEFAULT_CONTENT)
 
-CONFIG=configure.load_config(CONFIG_PATH)
+def load_settings():
+    configure.verify_default_config(CONFIG_PATH,default_content=DEFAULT_CONTENT)
+    CONFIG.update(configure.load_config(CONFIG_PATH,default_content=DEFAULT_CONTENT))
 
 
 
@@ -87,7 +109,41 @@ def random_hex_color():
     g = random.randint(0, 255)
     b = random.randint(0, 255)
     return f"#{r:02X}{g:02X}{b:02X}"
-    
+
+
+class _DedupeSignals(QObject):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object, str)  # (imagens, membros) ou None, mensagem de erro
+
+
+class DedupeTask(QRunnable):
+    """
+    Executa dedupe_images numa thread de trabalho, para que o cálculo dos
+    hashes não trave a janela.
+    """
+    def __init__(self, dataset_path, images, valid_exts):
+        super().__init__()
+        self.dataset_path = dataset_path
+        self.images = images
+        self.valid_exts = valid_exts
+        self.setAutoDelete(False)
+        self.signals = _DedupeSignals()
+
+    def run(self):
+        # near_duplicates (e o numpy) só é importado quando as quase duplicatas são procuradas
+        from detection_dataset_annotator.modules.near_duplicates import dedupe_images
+
+        try:
+            images, members, _ = dedupe_images( self.dataset_path, self.images, self.valid_exts,
+                                                CONFIG["near_duplicates"],
+                                                algorithm=CONFIG["near_duplicate_hash"],
+                                                max_distance=CONFIG["near_duplicate_distance"],
+                                                progress=self.signals.progress.emit)
+            self.signals.finished.emit((images, members), "")
+        except (OSError, ValueError) as e:
+            self.signals.finished.emit(None, str(e))
+
+
 class CreateProjectApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -100,6 +156,9 @@ class CreateProjectApp(QMainWindow):
         self.setWindowIcon(QIcon(self.icon_path)) 
         
         self.dataset_path = ""
+        self.dedupe_task = None
+        self.dedupe_dialog = None
+        self.pending_project = None
         self.create_toolbar()
         self.init_ui()
         
@@ -225,6 +284,12 @@ class CreateProjectApp(QMainWindow):
         self.input_git_url.setToolTip(CONFIG["git_repository_url_tooltip"])
         layout.addWidget(self.input_git_url)
         
+        # Atribuições num arquivo por usuário
+        self.chk_sharded = QCheckBox(CONFIG["sharded_assignments"])
+        self.chk_sharded.setToolTip(CONFIG["sharded_assignments_tooltip"])
+        self.chk_sharded.setChecked(CONFIG["sharded_assignments_default"])
+        layout.addWidget(self.chk_sharded)
+        
         # Botão criar projeto (só ativa no final)
         self.btn_create = QPushButton(CONFIG["create_project"])
         self.btn_create.setIcon(QIcon(resource_path('icons', 'new_file.png'))) 
@@ -271,24 +336,18 @@ class CreateProjectApp(QMainWindow):
     # Criar projeto
     # --------------------------
     def create_project(self):
+        if self.dedupe_task is not None:
+            return
         if not self.dataset_path:
             QMessageBox.warning(self, CONFIG["error"], CONFIG["select_the_dataset_folder"]) 
             return
         
         images_path = os.path.join(self.dataset_path, "images")
-        labels_path = os.path.join(self.dataset_path, "labels")
-        config_path = os.path.join(self.dataset_path, "config.json")
-        readme_path = os.path.join(self.dataset_path, "README.md")
         
         # Verifica se existem imagens
         valid_exts = CONFIG["valid_image_exts"]
         
-        all_images = [
-            os.path.relpath(os.path.join(root, f), images_path)
-            for root, dirs, files in os.walk(images_path)
-            for f in files
-            if any(f.lower().endswith(ext) for ext in valid_exts)
-        ]
+        all_images = scan_images(images_path, valid_exts, max_workers=CONFIG["scan_workers"])
 
         if not all_images:
             QMessageBox.warning(self, CONFIG["error"], CONFIG["no_image_file"])
@@ -331,76 +390,494 @@ class CreateProjectApp(QMainWindow):
             QMessageBox.warning(self, CONFIG["error"], CONFIG["add_one_class"])
             return
         
-        # Criar labels se não existir
-        os.makedirs(labels_path, exist_ok=True)
-        
-        # Distribuir imagens conforme proporção
-        random.shuffle(all_images)
-        total_prop = sum(proportions)
-        images_per_user = {user: [] for user in users}
-        start_idx = 0
-        for user, prop in zip(users, proportions):
-            count = int(len(all_images) * prop / total_prop)
-            images_per_user[user] = all_images[start_idx:start_idx+count]
-            start_idx += count
-        # Ajustar possíveis imagens restantes
-        remaining = all_images[start_idx:]
-        for i, img in enumerate(remaining):
-            images_per_user[users[i % len(users)]].append(img)
-        
-        # Criar config.json
-        config_data = {
-            "classes": classes,
-            "classes_colors": classes_colors,
-            "birth_date": QDateTime.currentDateTime().toString(Qt.ISODate)
-        }
-        for user, imgs in images_per_user.items():
-            imgs = natsorted(imgs)
-            config_data[f"images_{user}"] = {img: False for img in imgs}
-        
-        with open(config_path, "w") as f:
-            json.dump(config_data, f, indent=4)
+        # Quase duplicatas: excluídas ou mantidas juntas com um só usuário
+        self.pending_project = (users, proportions, classes, classes_colors)
+        if CONFIG["near_duplicates"] != "off":
+            self.start_dedupe(all_images, valid_exts)
+            return
+        self.write_new_project(all_images, {})
+
+    def start_dedupe(self, all_images, valid_exts):
+        self.btn_create.setEnabled(False)
+        self.dedupe_dialog = QProgressDialog(CONFIG["near_duplicates_progress"], None, 0, 0, self)
+        self.dedupe_dialog.setWindowModality(Qt.WindowModal)
+        self.dedupe_dialog.setMinimumDuration(0)
+        self.dedupe_dialog.show()
+        self.dedupe_task = DedupeTask(self.dataset_path, all_images, valid_exts)
+        self.dedupe_task.signals.progress.connect(self.on_dedupe_progress)
+        self.dedupe_task.signals.finished.connect(self.on_dedupe_finished)
+        QThreadPool.globalInstance().start(self.dedupe_task)
+
+    def on_dedupe_progress(self, done, total):
+        if self.dedupe_dialog is not None and total > 0:
+            self.dedupe_dialog.setMaximum(total)
+            self.dedupe_dialog.setValue(min(done, total))
+
+    def on_dedupe_finished(self, result, error):
+        self.dedupe_task = None
+        self.dedupe_dialog.close()
+        self.dedupe_dialog = None
+        self.btn_create.setEnabled(True)
+        if result is None:
+            QMessageBox.warning(self, CONFIG["error"], CONFIG["near_duplicates_error"]+f"\n{error}")
+            return
+        self.write_new_project(*result)
+
+    def write_new_project(self, all_images, members):
+        users, proportions, classes, classes_colors = self.pending_project
+        self.pending_project = None
+
+        # Distribuir imagens conforme proporção e escrever o projeto
+        extra_header = None
+        if CONFIG["assignment_mode"] == "hash":
+            assigner = HashAssigner(users, proportions, CONFIG["assignment_seed"] or random.randrange(2**32))
+            images_per_user = assign_by_hash(all_images, assigner)
+            extra_header = assigner.header()
+        else:
+            images_per_user = distribute_images(all_images, users, proportions)
+        if members:
+            from detection_dataset_annotator.modules.near_duplicates import expand_duplicates
+
+            expand_duplicates(images_per_user, members)
+        sharded = self.chk_sharded.isChecked()
+        write_project(  self.dataset_path, classes, classes_colors, images_per_user,
+                        sharded=sharded, backend=CONFIG["project_backend"],
+                        birth_date=QDateTime.currentDateTime().toString(Qt.ISODate),
+                        extra_header=extra_header)
         
         QMessageBox.information(self, CONFIG["success"], CONFIG["project_created"])
         
-        # Crio readme se nao existe
-        with open(readme_path, 'a'):
-            pass 
-        
         # Commit inicial no Git
         git_url = self.input_git_url.text().strip()
         if git_url:
+            from git import GitCommandError
+
             try:
-                if not os.path.exists(os.path.join(self.dataset_path, ".git")):
-                    repo = Repo.init(self.dataset_path)
-                else:
-                    repo = Repo(self.dataset_path)
-                repo.git.add("labels")
-                repo.git.add("config.json")
-                repo.git.add("README.md")
-                repo.index.commit(CONFIG["git_initial_commit"])
-                
-                origin = None
-                try:
-                    origin = repo.remote(name=CONFIG["git_remote"])
-                    origin.set_url(git_url)
-                except ValueError:
-                    origin = repo.create_remote(CONFIG["git_remote"], git_url)
-                
-                origin.push(refspec='master:master')
+                git_initial_commit( self.dataset_path, git_url, CONFIG["git_initial_commit"],
+                                    remote_name=CONFIG["git_remote"], sharded=sharded)
                 QMessageBox.information(self, CONFIG["git_msg_title"], CONFIG["git_msg_text"])
             except GitCommandError as e:
                 QMessageBox.warning(self, CONFIG["git_msg_error"], CONFIG["git_msg_error_text"]+f"\n{str(e)}")
         
         self.close()
 
+# --------------------------
+# Modo linha de comando
+# --------------------------
+def parse_user_arg(text):
+    name, _, prop = text.partition(":")
+    return name, int(prop) if prop else 1
+
+def parse_class_arg(text):
+    name, _, color = text.partition(":")
+    return name, color
+
+def load_spec(path):
+    """
+    Lê um arquivo JSON com "users" ({nome: proporção} ou [nome, ...]),
+    "classes" ({nome: cor} ou [nome, ...]) e, opcionalmente, "sharded", "seed" e "git_url".
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    users = spec.get("users", {})
+    if isinstance(users, list):
+        users = {user: 1 for user in users}
+    classes = spec.get("classes", {})
+    if isinstance(classes, list):
+        classes = {name: "" for name in classes}
+    return users, classes, spec
+
+def create_project_cli(argv):
+    from detection_dataset_annotator.modules.near_duplicates import dedupe_images, expand_duplicates, ALGORITHMS
+
+    parser = argparse.ArgumentParser(
+        prog=about.__program_project__+" create",
+        description="Create an annotation project without a display.")
+    parser.add_argument("dataset", help="dataset directory containing images/")
+    parser.add_argument("--spec", help="JSON file with users, classes and options")
+    parser.add_argument("--user", action="append", default=[], metavar="NAME[:PROPORTION]")
+    parser.add_argument("--class", dest="classes", action="append", default=[], metavar="NAME[:COLOR]")
+    parser.add_argument("--manifest", help="file with one image path per line (skips the scan)")
+    parser.add_argument("--workers", type=int, default=CONFIG["scan_workers"], help="scan threads")
+    parser.add_argument("--sharded", action="store_true", help="one assignment file per user")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default=CONFIG["project_backend"])
+    parser.add_argument("--assignment", choices=["random", "hash"], default=CONFIG["assignment_mode"],
+                        help="random shuffle, or a reproducible hash of each path streamed from the scan")
+    parser.add_argument("--seed", help="project seed for --assignment hash (random if omitted)")
+    parser.add_argument("--near-duplicates", choices=["off", "exclude", "same-user"],
+                        default=CONFIG["near_duplicates"],
+                        help="leave near-duplicate images out, or give each group to a single user")
+    parser.add_argument("--hash", choices=ALGORITHMS, default=CONFIG["near_duplicate_hash"],
+                        help="perceptual hash for --near-duplicates")
+    parser.add_argument("--distance", type=int, default=CONFIG["near_duplicate_distance"],
+                        help="max differing hash bits between near duplicates")
+    parser.add_argument("--git-url", default="", help="push the initial commit to this remote")
+    parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    args = parser.parse_args(argv)
+
+    def log(text, end="\n"):
+        if not args.quiet:
+            print(text, end=end, file=sys.stderr, flush=True)
+
+    users, classes, spec = load_spec(args.spec) if args.spec else ({}, {}, {})
+    try:
+        users.update(parse_user_arg(u) for u in args.user)
+    except ValueError:
+        parser.error(CONFIG["invalid_proportion_in_line"]+" --user")
+    classes.update(parse_class_arg(c) for c in args.classes)
+    sharded = args.sharded or bool(spec.get("sharded", False))
+    git_url = args.git_url or spec.get("git_url", "")
+
+    if not users:
+        parser.error(CONFIG["add_one_user"])
+    if not classes:
+        parser.error(CONFIG["add_one_class"])
+
+    images_path = os.path.join(args.dataset, "images")
+    valid_exts = CONFIG["valid_image_exts"]
+    if args.manifest:
+        images = iter_manifest(args.manifest, images_path, valid_exts)
+    else:
+        if not os.path.isdir(images_path):
+            parser.error(f"{images_path} "+"not found")
+        images = iter_images(
+            images_path, valid_exts, max_workers=args.workers,
+            progress=lambda n_img, n_dir: log(f"\rScanning: {n_img} images in {n_dir} directories", end=""))
+
+    members = {}
+    if args.near_duplicates != "off":
+        images = sorted(images)
+        log("")
+        images, members, groups = dedupe_images(
+            args.dataset, images, valid_exts, args.near_duplicates, algorithm=args.hash,
+            max_distance=args.distance, progress=lambda done, total: log(f"\rHashing: {done}/{total} batches", end=""))
+        log(f"\n{len(groups)} near-duplicate groups, {sum(len(g) - 1 for g in groups)} images "
+            + ("excluded" if args.near_duplicates == "exclude" else "kept with their group"))
+
+    extra_header = None
+    if args.assignment == "hash":
+        # cada imagem é atribuída assim que a varredura a encontra
+        seed = args.seed if args.seed is not None else spec.get("seed", random.randrange(2**32))
+        assigner = HashAssigner(list(users), list(users.values()), seed)
+        images_per_user = assign_by_hash(images, assigner)
+        extra_header = assigner.header()
+        log("")
+    else:
+        all_images = sorted(images)
+        log("")
+        images_per_user = distribute_images(all_images, list(users), list(users.values()))
+    expand_duplicates(images_per_user, members)
+    if not any(images_per_user.values()):
+        log(CONFIG["no_image_file"])
+        return 1
+
+    write_project(  args.dataset, list(classes), [c or random_hex_color() for c in classes.values()],
+                    images_per_user, sharded=sharded, backend=args.backend, extra_header=extra_header)
+    for user, imgs in images_per_user.items():
+        log(f"  {user}: {len(imgs)}")
+    log(CONFIG["project_created"])
+
+    if git_url:
+        from git import GitCommandError
+
+        try:
+            git_initial_commit( args.dataset, git_url, CONFIG["git_initial_commit"],
+                                remote_name=CONFIG["git_remote"], sharded=sharded)
+            log(CONFIG["git_msg_text"])
+        except GitCommandError as e:
+            log(CONFIG["git_msg_error_text"]+f"\n{str(e)}")
+            return 1
+    return 0
+
+def ingest_project_cli(argv):
+    parser = argparse.ArgumentParser(
+        prog=about.__program_project__+" ingest",
+        description="Assign the images added to images/ since the project was created, "
+                    "keeping all existing assignments and approvals.")
+    parser.add_argument("dataset", help="dataset directory of an existing project")
+    parser.add_argument("--user", action="append", default=[], metavar="NAME[:PROPORTION]",
+                        help="proportions for the new images (default: current list sizes)")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default=CONFIG["project_backend"])
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be added")
+    parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(os.path.join(args.dataset, "config.json")):
+        parser.error(os.path.join(args.dataset, "config.json")+" not found")
+    try:
+        proportions = dict(parse_user_arg(u) for u in args.user)
+    except ValueError:
+        parser.error(CONFIG["invalid_proportion_in_line"]+" --user")
+
+    images_per_user = ingest_images(args.dataset, CONFIG["valid_image_exts"], proportions=proportions,
+                                    backend=args.backend, dry_run=args.dry_run)
+    if not args.quiet:
+        total = sum(len(imgs) for imgs in images_per_user.values())
+        print(f"{total} new images" + (" (dry run)" if args.dry_run else ""), file=sys.stderr)
+        for user, imgs in images_per_user.items():
+            print(f"  {user}: +{len(imgs)}", file=sys.stderr)
+    return 0
+
+def stats_project_cli(argv, validate=False):
+    from detection_dataset_annotator.modules.dataset_stats import compute_stats, validation_failed
+
+    command = "validate" if validate else "stats"
+    parser = argparse.ArgumentParser(
+        prog=about.__program_project__+" "+command,
+        description="Validate the labels of a project (exit code 1 on problems)." if validate else
+                    "Print label statistics and problems of a project as JSON.")
+    parser.add_argument("dataset", help="dataset directory of an existing project")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default=CONFIG["project_backend"])
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--iou", type=float, default=0.9, help="IoU above which same-class boxes are duplicates")
+    parser.add_argument("--min-box-pixels", type=float, default=2, help="smaller boxes are degenerate")
+    parser.add_argument("--max-examples", type=int, default=100, help="examples listed per problem")
+    parser.add_argument("--output", help="write the JSON to this file instead of stdout")
+    parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(os.path.join(args.dataset, "config.json")):
+        parser.error(os.path.join(args.dataset, "config.json")+" not found")
+
+    def progress(done, total):
+        if not args.quiet:
+            print(f"\rAnalyzing: {done}/{total} batches", end="", file=sys.stderr, flush=True)
+
+    stats = compute_stats(  args.dataset, CONFIG["valid_image_exts"], backend=args.backend,
+                            max_workers=args.workers, iou_threshold=args.iou,
+                            min_box_pixels=args.min_box_pixels, max_examples=args.max_examples,
+                            progress=progress)
+    if not args.quiet:
+        print("", file=sys.stderr)
+    if validate:
+        stats = {key: stats[key] for key in ("dataset", "images", "label_files", "boxes", "issues")}
+        stats["valid"] = not validation_failed(stats)
+
+    text = json.dumps(stats, indent=4, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if validate and not stats["valid"] else 0
+
+def export_project_cli(argv):
+    from detection_dataset_annotator.modules.exporters import export_coco, export_voc
+
+    parser = argparse.ArgumentParser(
+        prog=about.__program_project__+" export",
+        description="Export the labels of the images listed in the project as COCO JSON or Pascal VOC XML.")
+    parser.add_argument("dataset", help="dataset directory of an existing project")
+    parser.add_argument("--format", choices=["coco", "voc"], required=True)
+    parser.add_argument("--output", required=True,
+                        help="JSON file (coco) or directory for the XML files (voc)")
+    parser.add_argument("--user", action="append", default=None, metavar="NAME",
+                        help="export only the images of this user (repeatable)")
+    parser.add_argument("--class", dest="classes", action="append", default=None, metavar="NAME",
+                        help="export only the boxes of this class (repeatable)")
+    state = parser.add_mutually_exclusive_group()
+    state.add_argument("--all", dest="state", action="store_const", const="all",
+                       help="export approved and pending images")
+    state.add_argument("--pending", dest="state", action="store_const", const="pending",
+                       help="export only pending images")
+    parser.set_defaults(state="approved")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default=CONFIG["project_backend"])
+    parser.add_argument("--workers", type=int, default=None,
+                        help="threads (coco) or processes (voc); default: all cores")
+    parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(os.path.join(args.dataset, "config.json")):
+        parser.error(os.path.join(args.dataset, "config.json")+" not found")
+    approved = {"approved": True, "pending": False, "all": None}[args.state]
+
+    def progress(done, total):
+        if not args.quiet:
+            print(f"\rExporting: {done}/{total}", end="", file=sys.stderr, flush=True)
+
+    try:
+        if args.format == "coco":
+            n_images, n_boxes = export_coco(args.dataset, args.output, CONFIG["valid_image_exts"],
+                                            backend=args.backend, users=args.user, approved=approved,
+                                            classes=args.classes, max_workers=args.workers or os.cpu_count(),
+                                            progress=progress)
+            summary = f"{n_images} images, {n_boxes} boxes"
+        else:
+            n_files = export_voc(args.dataset, args.output, CONFIG["valid_image_exts"],
+                                 backend=args.backend, users=args.user, approved=approved,
+                                 classes=args.classes, max_workers=args.workers, progress=progress)
+            summary = f"{n_files} XML files"
+    except ValueError as e:
+        parser.error(str(e))
+    if not args.quiet:
+        print(f"\n{summary} -> {args.output}", file=sys.stderr)
+    return 0
+
+def import_project_cli(argv):
+    from detection_dataset_annotator.modules.importers import import_coco
+
+    parser = argparse.ArgumentParser(
+        prog=about.__program_project__+" import",
+        description="Write YOLO labels in labels/ from a COCO annotation file, read as a stream. "
+                    "Works before or after the project is created.")
+    parser.add_argument("dataset", help="dataset directory (with images/)")
+    parser.add_argument("--coco", required=True, help="COCO JSON annotation file")
+    parser.add_argument("--class", dest="classes", action="append", default=None, metavar="NAME",
+                        help="class list when there is no config.json yet (default: the COCO categories)")
+    parser.add_argument("--map", action="append", default=[], metavar="COCO_NAME=CLASS",
+                        help="map a COCO category onto a project class with another name")
+    parser.add_argument("--overwrite", action="store_true", help="replace existing label files")
+    parser.add_argument("--skip-crowd", action="store_true", help="ignore annotations with iscrowd=1")
+    parser.add_argument("--workers", type=int, default=8, help="threads writing the label files")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be written")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(os.path.join(args.dataset, "images")):
+        parser.error(os.path.join(args.dataset, "images")+" not found")
+    class_map = {}
+    for item in args.map:
+        src, sep, dst = item.partition("=")
+        if not sep or not src or not dst:
+            parser.error("invalid --map "+item)
+        class_map[src] = dst
+
+    classes = args.classes
+    config_path = os.path.join(args.dataset, "config.json")
+    if os.path.exists(config_path):
+        with open(config_path, "r", encoding="utf-8") as f:
+            classes = json.load(f)["classes"]
+
+    def progress(count):
+        if not args.quiet:
+            print(f"\rReading: {count} annotations", end="", file=sys.stderr, flush=True)
+
+    report = import_coco(args.dataset, args.coco, classes, class_map=class_map, overwrite=args.overwrite,
+                         skip_crowd=args.skip_crowd,
+                         max_workers=args.workers, dry_run=args.dry_run, progress=progress)
+    if not args.quiet:
+        print(f"\n{report['labels_written']} label files, {report['boxes_written']} boxes"
+              + (" (dry run)" if args.dry_run else ""), file=sys.stderr)
+
+    text = json.dumps(report, indent=4, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if report["write_errors"]["count"] else 0
+
+def preannotate_project_cli(argv):
+    from detection_dataset_annotator.modules.preannotation import preannotate
+
+    parser = argparse.ArgumentParser(
+        prog=about.__program_project__+" preannotate",
+        description="Run a detector over the pending images without labels and cache its boxes as "
+                    "proposals that the annotator shows as editable boxes (labels/ is not touched).")
+    parser.add_argument("dataset", help="dataset directory of an existing project")
+    parser.add_argument("--detector", required=True, metavar="SPEC",
+                        help="'stub', 'onnx:MODEL.onnx' (needs onnxruntime) or 'MODULE:CALLABLE'")
+    parser.add_argument("--input-size", type=int, default=None, metavar="PIXELS",
+                        help="ONNX model input side (default: 640)")
+    parser.add_argument("--conf", type=float, default=None, help="ONNX confidence threshold (default: 0.25)")
+    parser.add_argument("--iou", type=float, default=None, help="ONNX NMS IoU threshold (default: 0.45)")
+    parser.add_argument("--user", action="append", default=None, metavar="NAME",
+                        help="only the pending images of this user (repeatable)")
+    parser.add_argument("--batch", type=int, default=8, help="images per inference call")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--overwrite", action="store_true", help="recompute proposals already cached")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default=CONFIG["project_backend"])
+    parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(os.path.join(args.dataset, "config.json")):
+        parser.error(os.path.join(args.dataset, "config.json")+" not found")
+
+    detector = args.detector
+    onnx_options = {"size": args.input_size, "conf": args.conf, "iou": args.iou}
+    if any(value is not None for value in onnx_options.values()):
+        if not detector.startswith("onnx:"):
+            parser.error("--input-size, --conf and --iou only apply to an 'onnx:' detector")
+        if args.input_size is not None and args.input_size <= 0:
+            parser.error("--input-size must be positive")
+        # as opções vão no spec: ele é o que chega aos processos e identifica o detector no cache
+        detector += "".join(f",{key}={value}" for key, value in onnx_options.items() if value is not None)
+
+    def progress(done, total):
+        if not args.quiet:
+            print(f"\rDetecting: {done}/{total} batches", end="", file=sys.stderr, flush=True)
+
+    try:
+        result = preannotate(args.dataset, detector, backend=args.backend, users=args.user,
+                             batch_size=max(1, args.batch), max_workers=args.workers,
+                             overwrite=args.overwrite, progress=progress)
+    except (ValueError, ImportError, RuntimeError) as e:
+        parser.error(str(e))
+    if not args.quiet:
+        print(f"\n{result['images']} images, {result['boxes']} proposals, "
+              f"{result['skipped']} skipped, {len(result['failed'])} unreadable", file=sys.stderr)
+    return 0
+
+def duplicates_project_cli(argv):
+    from detection_dataset_annotator.modules.near_duplicates import near_duplicate_groups, ALGORITHMS
+
+    parser = argparse.ArgumentParser(
+        prog=about.__program_project__+" duplicates",
+        description="List groups of near-duplicate images in images/ as JSON. "
+                    "Hashes are cached in .annotator/, so later runs only decode new images.")
+    parser.add_argument("dataset", help="dataset directory containing images/")
+    parser.add_argument("--hash", choices=ALGORITHMS, default=CONFIG["near_duplicate_hash"])
+    parser.add_argument("--distance", type=int, default=CONFIG["near_duplicate_distance"],
+                        help="max differing hash bits between near duplicates")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--output", help="write the JSON to this file instead of stdout")
+    parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    args = parser.parse_args(argv)
+
+    images_path = os.path.join(args.dataset, "images")
+    if not os.path.isdir(images_path):
+        parser.error(f"{images_path} "+"not found")
+
+    def progress(done, total):
+        if not args.quiet:
+            print(f"\rHashing: {done}/{total} batches", end="", file=sys.stderr, flush=True)
+
+    images = scan_images(images_path, CONFIG["valid_image_exts"], max_workers=CONFIG["scan_workers"])
+    groups = near_duplicate_groups( args.dataset, images, DatasetIndex.load(args.dataset),
+                                    CONFIG["valid_image_exts"], algorithm=args.hash,
+                                    max_distance=args.distance, max_workers=args.workers, progress=progress)
+    if not args.quiet:
+        print("", file=sys.stderr)
+    text = json.dumps({"images": len(images), "hash": args.hash, "distance": args.distance,
+                       "groups": len(groups), "duplicates": sum(len(g) - 1 for g in groups),
+                       "clusters": groups}, indent=4, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
 def main():
     signal.signal(signal.SIGINT, signal.SIG_DFL)
+    load_settings()
     
-    create_desktop_directory()    
-    create_desktop_menu()
-    create_desktop_file(os.path.join("~",".local","share","applications"), 
-                        program_name = about.__program_project__)
+    # modo sem interface gráfica: detection-dataset-project create|ingest|stats|validate|export|import|preannotate|duplicates ...
+    if len(sys.argv) > 1 and sys.argv[1] == "create":
+        sys.exit(create_project_cli(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "ingest":
+        sys.exit(ingest_project_cli(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] in ("stats", "validate"):
+        sys.exit(stats_project_cli(sys.argv[2:], validate=sys.argv[1] == "validate"))
+    if len(sys.argv) > 1 and sys.argv[1] == "export":
+        sys.exit(export_project_cli(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "import":
+        sys.exit(import_project_cli(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "preannotate":
+        sys.exit(preannotate_project_cli(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "duplicates":
+        sys.exit(duplicates_project_cli(sys.argv[2:]))
     
     for n in range(len(sys.argv)):
         if sys.argv[n] == "--autostart":
@@ -418,10 +895,21 @@ def main():
                                 program_name = about.__program_project__)
             return
     
+    # atalhos do menu só na primeira execução de cada versão
+    ensure_desktop_integration(about.__program_project__)
+    
+    profile = None
+    if "--profile-startup" in sys.argv:
+        profile = StartupProfile(STARTUP_TIME, about.__package__ + ".program_project")
+        profile.mark("imports")
+    
     app = QApplication(sys.argv)
     app.setApplicationName(about.__program_project__) 
     
     window = CreateProjectApp()
+    if profile is not None:
+        profile.mark("main window created")
+        profile.watch(window)
     window.show()
     sys.exit(app.exec_())
     
@@ -48,9 +48,13 @@ keywords = ["dataset", "annotator", "yolo"]
 dependencies = [
     "PyQt5",
     "GitPython",
-    "natsort"
+    "natsort",
+    "numpy"
 ]
 
+[project.optional-dependencies]
+onnx = ["onnxruntime"]
+
 [project.urls]
 "Bug Reports" = "{__url_bugs__}"
 "Funding" = "{__url_funding__}"